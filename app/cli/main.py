@@ -1,33 +1,118 @@
-import os
-from datetime import datetime
+import signal
+import sys
+from typing import Any, List
 
 import typer
-from pymongo import MongoClient
-
-from app.services import (
-    add_patient,
-    list_patients,
-    add_appointment,
-    list_appointments,
-    add_template,
-    list_templates,
-    schedule_reminders,
-    dispatch_due_reminders,
-    process_replies,
-    generate_reminders_report,
-    show_appointment_history,
-)
-from app.utils.classification import classify_reply_intent
+
+# Commands import their services (and pymongo) when they run, not at module
+# import, so `--help` and short cron invocations start quickly. Keep module
+# level imports here to the standard library and typer; tests/test_startup.py
+# enforces it.
 
 app = typer.Typer(
     name="reminderctl",
     help="Appointment Reminder Workflow Engine CLI"
 )
 
+@app.callback()
+def main(ctx: typer.Context):
+    """Appointment Reminder Workflow Engine CLI"""
+    # Buffered events must reach the database before the command exits.
+    ctx.call_on_close(_close_event_sinks)
+
+def _close_event_sinks():
+    # Only commands that emitted events have loaded the event service.
+    event_service = sys.modules.get("app.services.event_service")
+    if event_service is not None:
+        event_service.close_event_sinks()
+
+def __getattr__(name: str) -> Any:
+    # Re-exported for callers that import it from the CLI module.
+    if name == "classify_reply_intent":
+        from app.utils.classification import classify_reply_intent
+
+        return classify_reply_intent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # MongoDB connection
-def get_db():
-    client = MongoClient(os.getenv("MONGO_URL", "mongodb://mongo:27017"))
-    return client[os.getenv("DB_NAME", "reminder_dev")]
+_indexes_ensured = False
+
+def get_db(ensure: bool = True):
+    from pymongo.errors import PyMongoError
+
+    from app.config.settings import get_settings
+    from app.db.indexes import ensure_indexes
+    from app.db.mongodb import get_database
+
+    global _indexes_ensured
+    db = get_database()
+    if ensure and not _indexes_ensured and get_settings().ensure_indexes:
+        try:
+            ensure_indexes(db)
+            _indexes_ensured = True
+        except PyMongoError as exc:
+            typer.echo(f"⚠️  Could not ensure indexes: {exc}", err=True)
+    return db
+
+# Database commands
+db_app = typer.Typer()
+app.add_typer(db_app, name="db")
+
+@db_app.command("init-indexes")
+def db_init_indexes():
+    """Create all collection indexes (idempotent)"""
+    from pymongo.errors import PyMongoError
+
+    from app.db.indexes import ensure_indexes
+
+    db = get_db(ensure=False)
+    try:
+        names = ensure_indexes(db)
+    except PyMongoError as exc:
+        typer.echo(f"❌ Index creation failed: {exc}")
+        raise typer.Exit(1)
+    for name in names:
+        typer.echo(f"  ✅ {name}")
+    typer.echo(f"🗂️  {len(names)} indexes in place")
+
+@db_app.command("backfill-events")
+def db_backfill_events():
+    """Add appointment_id and seq to events written before they existed"""
+    from app.services.event_service import backfill_event_keys
+
+    db = get_db()
+    updated = backfill_event_keys(db)
+    typer.echo(f"✅ Backfilled {updated} events")
+
+@db_app.command("backfill-partitions")
+def db_backfill_partitions(
+    repartition: bool = typer.Option(False, "--all", help="Recompute every reminder's partition (after changing DISPATCH_PARTITIONS; stop dispatchers first)")
+):
+    """Assign dispatch partitions to reminders scheduled before partitioning"""
+    from app.config.settings import get_settings
+    from app.services.partition_service import backfill_reminder_partitions
+
+    db = get_db()
+    updated = backfill_reminder_partitions(db, get_settings().dispatch_partitions, typer.echo, repartition=repartition)
+    typer.echo(f"✅ Partitioned {updated} reminders")
+
+@db_app.command("explain")
+def db_explain():
+    """Verify that no service query falls back to a collection scan"""
+    from app.db.indexes import explain_queries
+
+    db = get_db()
+    collscans = 0
+    for description, stages in explain_queries(db):
+        if "COLLSCAN" in stages or any(stage.startswith("ERROR") for stage in stages):
+            collscans += 1
+            typer.echo(f"  ❌ {description}: {' > '.join(stages)}")
+        else:
+            typer.echo(f"  ✅ {description}: {' > '.join(stages)}")
+    if collscans:
+        typer.echo(f"❌ {collscans} queries without a usable index")
+        raise typer.Exit(1)
+    typer.echo("✅ All service queries use an index")
 
 # Patients commands
 patients_app = typer.Typer()
@@ -40,14 +125,35 @@ def patients_add(
     tz: str = typer.Option(..., "--tz", help="IANA timezone")
 ):
     """Add a new patient"""
+    from app.services.patient_service import add_patient
+
     db = get_db()
     add_patient(db, name, phone, tz, typer.echo)
 
+@patients_app.command("import")
+def patients_import(
+    file_path: str = typer.Argument(..., help="CSV or JSONL file with name, phone, tz (and optionally id)"),
+    reject_file: str = typer.Option(None, "--reject-file", help="Where to write rejected rows (default: FILE.rejects.EXT)"),
+    chunk_size: int = typer.Option(1000, "--chunk-size", min=1, help="Rows validated and written per bulk round trip"),
+    verbose: bool = typer.Option(False, "--verbose", "-v", help="Print a line per rejected row")
+):
+    """Bulk-create patients from a CSV or JSONL file"""
+    from app.services.import_service import import_patients
+
+    db = get_db()
+    import_patients(db, file_path, typer.echo, reject_path=reject_file, chunk_size=chunk_size, verbose=verbose)
+
 @patients_app.command("list")
-def patients_list():
-    """List all patients"""
+def patients_list(
+    limit: int = typer.Option(50, "--limit", min=0, help="Patients per page (0 = all)"),
+    after: str = typer.Option(None, "--after", help="Continue after this patient id"),
+    format: str = typer.Option("text", "--format", "-f", help="Output format: text, jsonl")
+):
+    """List patients"""
+    from app.services.patient_service import list_patients
+
     db = get_db()
-    list_patients(db, typer.echo)
+    list_patients(db, typer.echo, limit=limit, after=after, format=format)
 
 # Appointments commands
 appointments_app = typer.Typer()
@@ -61,14 +167,62 @@ def appointments_add(
     location: str = typer.Option(..., "--location", help="Appointment location")
 ):
     """Add a new appointment"""
+    from app.services.appointment_service import add_appointment
+
     db = get_db()
     add_appointment(db, patient_id, start_at, provider, location, typer.echo)
 
+@appointments_app.command("reschedule")
+def appointments_reschedule(
+    appointment_id: str = typer.Option(..., "--id", help="Appointment ID"),
+    start_at: str = typer.Option(..., "--start-at", help="New appointment time (ISO format)")
+):
+    """Move an appointment and re-time its reminders"""
+    from app.services.appointment_service import reschedule_appointment
+
+    db = get_db()
+    reschedule_appointment(db, appointment_id, start_at, typer.echo)
+
+@appointments_app.command("import")
+def appointments_import(
+    file_path: str = typer.Argument(..., help="CSV or JSONL file with patient_id, start_at, provider, location (and optionally id)"),
+    reject_file: str = typer.Option(None, "--reject-file", help="Where to write rejected rows (default: FILE.rejects.EXT)"),
+    chunk_size: int = typer.Option(1000, "--chunk-size", min=1, help="Rows validated and written per bulk round trip"),
+    verbose: bool = typer.Option(False, "--verbose", "-v", help="Print a line per rejected row")
+):
+    """Bulk-create appointments from a CSV or JSONL file"""
+    from app.services.import_service import import_appointments
+
+    db = get_db()
+    import_appointments(db, file_path, typer.echo, reject_path=reject_file, chunk_size=chunk_size, verbose=verbose)
+
 @appointments_app.command("list")
-def appointments_list():
-    """List all appointments"""
+def appointments_list(
+    limit: int = typer.Option(50, "--limit", min=0, help="Appointments per page (0 = all)"),
+    after: str = typer.Option(None, "--after", help="Continue after this appointment id"),
+    status: str = typer.Option(None, "--status", help="Only appointments with this status"),
+    provider: str = typer.Option(None, "--provider", help="Only appointments with this provider"),
+    patient_id: str = typer.Option(None, "--patient-id", help="Only this patient's appointments"),
+    from_date: str = typer.Option(None, "--from", help="Starting on or after this date (YYYY-MM-DD)"),
+    to_date: str = typer.Option(None, "--to", help="Starting on or before this date (YYYY-MM-DD)"),
+    format: str = typer.Option("text", "--format", "-f", help="Output format: text, jsonl")
+):
+    """List appointments"""
+    from app.services.appointment_service import list_appointments
+
     db = get_db()
-    list_appointments(db, typer.echo)
+    list_appointments(
+        db,
+        typer.echo,
+        limit=limit,
+        after=after,
+        status=status,
+        provider=provider,
+        patient_id=patient_id,
+        from_date=from_date,
+        to_date=to_date,
+        format=format,
+    )
 
 # Templates commands
 templates_app = typer.Typer()
@@ -80,102 +234,206 @@ def templates_add(
     body: str = typer.Option(..., "--body", help="Template body")
 ):
     """Add a new template"""
+    from app.services.template_service import add_template
+
     db = get_db()
     add_template(db, name, body, typer.echo)
 
+@templates_app.command("update")
+def templates_update(
+    name: str = typer.Option(..., "--name", help="Template name"),
+    body: str = typer.Option(..., "--body", help="New template body")
+):
+    """Update an existing template"""
+    from app.services.template_service import update_template
+
+    db = get_db()
+    update_template(db, name, body, typer.echo)
+
 @templates_app.command("list")
-def templates_list():
-    """List all templates"""
+def templates_list(
+    limit: int = typer.Option(20, "--limit", min=0, help="Templates per page (0 = all)"),
+    after: str = typer.Option(None, "--after", help="Continue after this template id"),
+    format: str = typer.Option("text", "--format", "-f", help="Output format: text, jsonl")
+):
+    """List templates"""
+    from app.services.template_service import list_templates
+
     db = get_db()
-    list_templates(db, typer.echo)
+    list_templates(db, typer.echo, limit=limit, after=after, format=format)
 
 # Workflow commands
 @app.command()
 def schedule(
     from_date: str = typer.Option(..., "--from", help="Start date (YYYY-MM-DD)"),
     to_date: str = typer.Option(..., "--to", help="End date (YYYY-MM-DD)"),
-    offsets: str = typer.Option("7,2", "--offsets", help="Comma-separated offset days")
+    offsets: str = typer.Option("7,2", "--offsets", help="Comma-separated offset days"),
+    batch_size: int = typer.Option(1000, "--batch-size", min=1, help="Appointments per bulk write")
 ):
     """Schedule reminders"""
+    from app.services.reminder_service import schedule_reminders
+
     db = get_db()
-    schedule_reminders(db, from_date, to_date, offsets, typer.echo)
+    schedule_reminders(db, from_date, to_date, offsets, typer.echo, batch_size=batch_size)
 
 @app.command()
 def dispatch(
-    now: bool = typer.Option(False, "--now", help="Dispatch due reminders immediately")
+    now: bool = typer.Option(False, "--now", help="Dispatch due reminders immediately"),
+    workers: int = typer.Option(1, "--workers", min=1, help="Concurrent dispatch workers"),
+    batch_size: int = typer.Option(100, "--batch-size", min=1, help="Reminders handed to a worker at a time")
 ):
     """Dispatch due reminders"""
     if now:
+        from app.services.reminder_service import dispatch_due_reminders
+
         db = get_db()
-        dispatch_due_reminders(db, typer.echo)
+        dispatch_due_reminders(db, typer.echo, workers=workers, batch_size=batch_size)
     else:
         typer.echo("ℹ️  Use --now to dispatch due reminders")
 
-def classify_reply_intent(message: str) -> str:
-    """Simple rule-based classifier for reply intent"""
-    message_lower = message.lower()
-    
-    confirm_patterns = [
-        'yes', 'yeah', 'yep', 'confirm', 'confirmed', 'ok', 'okay', 'sure',
-        'definitely', 'will be there', 'see you', 'attending', 'accept'
-    ]
-    
-    cancel_patterns = [
-        'no', 'nope', 'cancel', 'cancelled', 'canceled', 'stop', 'end',
-        "can't make it", 'cannot come', 'not coming', 'unable to attend',
-        'emergency', 'sick', 'ill'
-    ]
-    
-    reschedule_patterns = [
-        'reschedule', 'move', 'change', 'different time', 'another time',
-        'different day', 'not available'
-    ]
-    
-    # Check patterns
-    confirm_matches = sum(1 for pattern in confirm_patterns if pattern in message_lower)
-    cancel_matches = sum(1 for pattern in cancel_patterns if pattern in message_lower)
-    reschedule_matches = sum(1 for pattern in reschedule_patterns if pattern in message_lower)
-    
-    if confirm_matches > cancel_matches and confirm_matches > reschedule_matches:
-        return "confirmed"
-    elif cancel_matches > confirm_matches and cancel_matches > reschedule_matches:
-        return "cancel"
-    elif reschedule_matches > confirm_matches and reschedule_matches > cancel_matches:
-        return "reschedule"
-    else:
-        return "unknown"
+@app.command()
+def serve(
+    workers: int = typer.Option(1, "--workers", min=1, help="Concurrent dispatch workers"),
+    batch_size: int = typer.Option(100, "--batch-size", min=1, help="Reminders handed to a worker at a time"),
+    max_idle: float = typer.Option(60.0, "--max-idle", help="Longest sleep between due-time checks (seconds)"),
+    poll_interval: float = typer.Option(1.0, "--poll-interval", help="Check interval when change streams are unavailable (seconds)")
+):
+    """Run the dispatcher as a long-lived daemon"""
+    from app.services.daemon_service import serve_dispatcher
+
+    def handle_sigterm(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    db = get_db()
+    try:
+        serve_dispatcher(
+            db,
+            typer.echo,
+            workers=workers,
+            batch_size=batch_size,
+            max_idle_seconds=max_idle,
+            poll_interval_seconds=poll_interval,
+        )
+    except KeyboardInterrupt:
+        pass
+
+sms_app = typer.Typer()
+app.add_typer(sms_app, name="sms")
+
+@sms_app.command("stub")
+def sms_stub(
+    host: str = typer.Option("127.0.0.1", "--host", help="Interface to listen on"),
+    port: int = typer.Option(8025, "--port", help="Port to listen on"),
+    latency_ms: float = typer.Option(50.0, "--latency-ms", help="Delay added to every request"),
+    jitter_ms: float = typer.Option(0.0, "--jitter-ms", help="Random extra delay, up to this much"),
+    failure_rate: float = typer.Option(0.0, "--failure-rate", min=0.0, max=1.0, help="Probability each message fails"),
+    max_batch_size: int = typer.Option(100, "--max-batch-size", min=1, help="Most messages accepted per request"),
+    rate: float = typer.Option(0.0, "--rate", help="Messages/second before answering 429 (0 = unlimited)")
+):
+    """Run a local stub SMS provider for load tests (use with SMS_PROVIDER=http)"""
+    from app.sms.stub_server import run_stub_provider
+
+    try:
+        run_stub_provider(
+            typer.echo,
+            host=host,
+            port=port,
+            latency=latency_ms / 1000,
+            jitter=jitter_ms / 1000,
+            failure_rate=failure_rate,
+            max_batch_size=max_batch_size,
+            rate_per_second=rate,
+        )
+    except KeyboardInterrupt:
+        pass
+
+dlq_app = typer.Typer()
+app.add_typer(dlq_app, name="dlq")
+
+@dlq_app.command("list")
+def dlq_list(
+    limit: int = typer.Option(50, "--limit", min=1, help="Most dead letters to show"),
+    include_replayed: bool = typer.Option(False, "--include-replayed", help="Also show replayed dead letters")
+):
+    """List reminders that failed permanently"""
+    from app.services.dead_letter_service import list_dead_letters
+
+    db = get_db()
+    list_dead_letters(db, typer.echo, limit=limit, include_replayed=include_replayed)
+
+@dlq_app.command("replay")
+def dlq_replay(
+    ids: List[str] = typer.Option(None, "--id", help="Dead letter id to replay (repeatable)"),
+    replay_all: bool = typer.Option(False, "--all", help="Replay every pending dead letter")
+):
+    """Queue dead-lettered reminders for another round of attempts"""
+    from app.services.dead_letter_service import replay_dead_letters
+
+    db = get_db()
+    replay_dead_letters(db, typer.echo, ids=ids, replay_all=replay_all)
 
 @app.command()
 def replies(
     file_path: str = typer.Argument(..., help="CSV file path"),
-    classify: bool = typer.Option(True, "--classify/--no-classify", help="Classify replies and update status")
+    classify: bool = typer.Option(True, "--classify/--no-classify", help="Classify replies and update status"),
+    chunk_size: int = typer.Option(1000, "--chunk-size", min=1, help="Rows resolved and written per bulk round trip"),
+    verbose: bool = typer.Option(True, "--verbose/--quiet", help="Print a line per row"),
+    resume: bool = typer.Option(True, "--resume/--no-resume", help="Continue an interrupted import of the same file")
 ):
     """Import and process replies from CSV"""
+    from app.services.reply_service import process_replies
+
     try:
         db = get_db()
-        process_replies(db, file_path, classify, typer.echo)
+        process_replies(
+            db, file_path, classify, typer.echo, chunk_size=chunk_size, verbose=verbose, resume=resume
+        )
     except Exception as e:
         typer.echo(f"❌ Error processing CSV: {str(e)}")
 
 @app.command()
 def report(
-    type: str = typer.Argument("reminders", help="Report type: reminders"),
+    type: str = typer.Argument("reminders", help="Report type: reminders, stats"),
     from_date: str = typer.Option(..., "--from", help="Start date (YYYY-MM-DD)"),
     to_date: str = typer.Option(..., "--to", help="End date (YYYY-MM-DD)"),
-    output: str = typer.Option(None, "--output", "-o", help="Output CSV file path")
+    output: str = typer.Option(None, "--output", "-o", help="Output file path"),
+    format: str = typer.Option("csv", "--format", "-f", help="Output format: csv, csv.gz, parquet, arrow"),
+    verbose: bool = typer.Option(False, "--verbose", "-v", help="Print a line per reminder"),
+    by: str = typer.Option(None, "--by", help="stats: also split by provider or location"),
+    rebuild: bool = typer.Option(False, "--rebuild", help="stats: recompute rollups from reminders first (pause dispatch)")
 ):
     """Generate reports"""
     if type == "reminders":
+        from app.services.report_service import generate_reminders_report
+
         db = get_db()
-        generate_reminders_report(db, from_date, to_date, output, typer.echo)
+        generate_reminders_report(db, from_date, to_date, output, typer.echo, verbose=verbose, format=format)
+    elif type == "stats":
+        from app.services.stats_service import rebuild_rollups, show_delivery_stats
+
+        if by not in (None, "provider", "location"):
+            typer.echo("❌ --by must be provider or location")
+            raise typer.Exit(1)
+        db = get_db()
+        if rebuild:
+            rebuild_rollups(db, from_date, to_date, typer.echo)
+        show_delivery_stats(db, from_date, to_date, typer.echo, group_by=by)
+    else:
+        typer.echo(f"❌ Unknown report type: {type}")
+        raise typer.Exit(1)
 
 @app.command()
 def history(
-    appointment: str = typer.Option(..., "--appointment", help="Appointment ID")
+    appointment: str = typer.Option(..., "--appointment", help="Appointment ID"),
+    limit: int = typer.Option(50, "--limit", min=1, help="Events per page"),
+    after: str = typer.Option(None, "--after", help="Continue after this event cursor (SEQ:ID)")
 ):
     """View appointment history"""
+    from app.services.history_service import show_appointment_history
+
     db = get_db()
-    show_appointment_history(db, appointment, typer.echo)
+    show_appointment_history(db, appointment, typer.echo, limit=limit, after=after)
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -0,0 +1,157 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+def _env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return float(value)
+
+
+def _env_bool(name: str, default: Optional[bool]) -> Optional[bool]:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Runtime configuration, read from the environment (and ``.env``)."""
+
+    mongo_url: str = "mongodb://mongo:27017"
+    db_name: str = "reminder_dev"
+    mongo_app_name: str = "reminderctl"
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_max_idle_time_ms: Optional[int] = None
+    mongo_server_selection_timeout_ms: int = 5000
+    mongo_connect_timeout_ms: int = 5000
+    mongo_socket_timeout_ms: Optional[int] = None
+    # Comma-separated wire compressors in preference order, e.g. "zstd,snappy".
+    # zstd and snappy need the optional ``zstandard``/``python-snappy`` packages.
+    mongo_compressors: str = ""
+    mongo_write_concern: str = "1"
+    mongo_write_journal: Optional[bool] = None
+    mongo_read_preference: str = "primary"
+    ensure_indexes: bool = True
+    # "async" buffers events and writes them from a background thread;
+    # "sync" writes each emitted batch immediately (used by tests).
+    event_sink_mode: str = "async"
+    event_sink_batch_size: int = 500
+    event_sink_flush_interval_ms: int = 1000
+    # "simulated" (no network) or "http" (see app/sms/http_provider.py).
+    sms_provider: str = "simulated"
+    sms_provider_url: str = "http://localhost:8025"
+    sms_provider_api_key: str = ""
+    # Messages per provider request; 1 for providers without multi-recipient sends.
+    sms_batch_size: int = 1
+    # Provider throughput limit in messages/second; 0 means unlimited.
+    sms_rate_per_second: float = 0
+    # Per destination number: sustained messages/minute (0 = unlimited) and burst.
+    sms_phone_rate_per_minute: float = 0
+    sms_phone_burst: int = 1
+    # Messages/second across all providers; 0 means unlimited.
+    dispatch_rate_per_second: float = 0
+    # "local" enforces rate limits per process; "mongo" shares them between
+    # processes through the rate_limits collection.
+    rate_limit_backend: str = "local"
+    # Tokens leased per round trip with the mongo backend; 0 = a tenth of the rate.
+    rate_limit_lease_size: int = 0
+    sms_max_connections: int = 20
+    sms_timeout_ms: int = 10000
+    sms_simulated_failure_rate: float = 0.2
+    # Failed sends are retried with exponential backoff and full jitter until
+    # they have used this many attempts, then dead-lettered.
+    retry_max_attempts: int = 5
+    retry_base_delay_seconds: float = 60
+    retry_max_delay_seconds: float = 3600
+    # How long a dispatcher owns the reminders it claimed before they are
+    # considered abandoned and handed to another worker. Renewed while sending.
+    dispatch_lease_seconds: float = 300
+    # Reminders are hashed into this many partitions, split between running
+    # `serve` instances. Changing it needs `db backfill-partitions --all`.
+    dispatch_partitions: int = 64
+    # A `serve` instance whose heartbeat is older than this has left the group.
+    dispatch_member_ttl_seconds: float = 15
+    dispatch_heartbeat_seconds: float = 5
+    # Patients are only texted between these local times ("HH:MM"); equal
+    # values, the default, allow any time. Set e.g. 09:00 and 20:00 to keep
+    # quiet hours. With spread, reminders are spread over the window instead
+    # of sent at the appointment's time of day.
+    send_window_start: str = "00:00"
+    send_window_end: str = "00:00"
+    send_window_spread: bool = False
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        defaults = cls()
+        return cls(
+            mongo_url=os.getenv("MONGO_URL", defaults.mongo_url),
+            db_name=os.getenv("DB_NAME", defaults.db_name),
+            mongo_app_name=os.getenv("MONGO_APP_NAME", defaults.mongo_app_name),
+            mongo_max_pool_size=_env_int("MONGO_MAX_POOL_SIZE", defaults.mongo_max_pool_size),
+            mongo_min_pool_size=_env_int("MONGO_MIN_POOL_SIZE", defaults.mongo_min_pool_size),
+            mongo_max_idle_time_ms=_env_int("MONGO_MAX_IDLE_TIME_MS", defaults.mongo_max_idle_time_ms),
+            mongo_server_selection_timeout_ms=_env_int(
+                "MONGO_SERVER_SELECTION_TIMEOUT_MS", defaults.mongo_server_selection_timeout_ms
+            ),
+            mongo_connect_timeout_ms=_env_int("MONGO_CONNECT_TIMEOUT_MS", defaults.mongo_connect_timeout_ms),
+            mongo_socket_timeout_ms=_env_int("MONGO_SOCKET_TIMEOUT_MS", defaults.mongo_socket_timeout_ms),
+            mongo_compressors=os.getenv("MONGO_COMPRESSORS", defaults.mongo_compressors),
+            mongo_write_concern=os.getenv("MONGO_WRITE_CONCERN", defaults.mongo_write_concern),
+            mongo_write_journal=_env_bool("MONGO_WRITE_JOURNAL", defaults.mongo_write_journal),
+            mongo_read_preference=os.getenv("MONGO_READ_PREFERENCE", defaults.mongo_read_preference),
+            ensure_indexes=_env_bool("ENSURE_INDEXES", defaults.ensure_indexes),
+            event_sink_mode=os.getenv("EVENT_SINK_MODE", defaults.event_sink_mode),
+            event_sink_batch_size=_env_int("EVENT_SINK_BATCH_SIZE", defaults.event_sink_batch_size),
+            event_sink_flush_interval_ms=_env_int(
+                "EVENT_SINK_FLUSH_INTERVAL_MS", defaults.event_sink_flush_interval_ms
+            ),
+            sms_provider=os.getenv("SMS_PROVIDER", defaults.sms_provider),
+            sms_provider_url=os.getenv("SMS_PROVIDER_URL", defaults.sms_provider_url),
+            sms_provider_api_key=os.getenv("SMS_PROVIDER_API_KEY", defaults.sms_provider_api_key),
+            sms_batch_size=_env_int("SMS_BATCH_SIZE", defaults.sms_batch_size),
+            sms_rate_per_second=_env_float("SMS_RATE_PER_SECOND", defaults.sms_rate_per_second),
+            sms_phone_rate_per_minute=_env_float("SMS_PHONE_RATE_PER_MINUTE", defaults.sms_phone_rate_per_minute),
+            sms_phone_burst=_env_int("SMS_PHONE_BURST", defaults.sms_phone_burst),
+            dispatch_rate_per_second=_env_float("DISPATCH_RATE_PER_SECOND", defaults.dispatch_rate_per_second),
+            rate_limit_backend=os.getenv("RATE_LIMIT_BACKEND", defaults.rate_limit_backend),
+            rate_limit_lease_size=_env_int("RATE_LIMIT_LEASE_SIZE", defaults.rate_limit_lease_size),
+            sms_max_connections=_env_int("SMS_MAX_CONNECTIONS", defaults.sms_max_connections),
+            sms_timeout_ms=_env_int("SMS_TIMEOUT_MS", defaults.sms_timeout_ms),
+            sms_simulated_failure_rate=_env_float(
+                "SMS_SIMULATED_FAILURE_RATE", defaults.sms_simulated_failure_rate
+            ),
+            retry_max_attempts=_env_int("RETRY_MAX_ATTEMPTS", defaults.retry_max_attempts),
+            retry_base_delay_seconds=_env_float("RETRY_BASE_DELAY_SECONDS", defaults.retry_base_delay_seconds),
+            retry_max_delay_seconds=_env_float("RETRY_MAX_DELAY_SECONDS", defaults.retry_max_delay_seconds),
+            dispatch_lease_seconds=_env_float("DISPATCH_LEASE_SECONDS", defaults.dispatch_lease_seconds),
+            dispatch_partitions=_env_int("DISPATCH_PARTITIONS", defaults.dispatch_partitions),
+            dispatch_member_ttl_seconds=_env_float(
+                "DISPATCH_MEMBER_TTL_SECONDS", defaults.dispatch_member_ttl_seconds
+            ),
+            dispatch_heartbeat_seconds=_env_float("DISPATCH_HEARTBEAT_SECONDS", defaults.dispatch_heartbeat_seconds),
+            send_window_start=os.getenv("SEND_WINDOW_START", defaults.send_window_start),
+            send_window_end=os.getenv("SEND_WINDOW_END", defaults.send_window_end),
+            send_window_spread=_env_bool("SEND_WINDOW_SPREAD", defaults.send_window_spread),
+        )
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide settings, loading ``.env`` on first use."""
+    load_dotenv()
+    return Settings.from_env()
@@ -1,9 +1,6 @@
-import os
-from pymongo import MongoClient
+from app.db.mongodb import get_database as _get_shared_database
 
 
 def get_database():
-    mongo_url = os.getenv("MONGO_URL", "mongodb://mongo:27017")
-    db_name = os.getenv("DB_NAME", "reminder_dev")
-    client = MongoClient(mongo_url)
-    return client[db_name]
\ No newline at end of file
+    """Return the configured database on the shared, pooled client."""
+    return _get_shared_database()
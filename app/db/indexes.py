@@ -0,0 +1,243 @@
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+# Indexes backing every query the services issue. Keep in sync with
+# QUERY_PLANS below, which `reminderctl db explain` uses to verify them.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "patients": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("phone_e164", ASCENDING)], name="phone_e164_unique", unique=True),
+    ],
+    "appointments": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("start_at", ASCENDING)], name="status_start_at"),
+        IndexModel(
+            [("patient_id", ASCENDING), ("status", ASCENDING), ("start_at", ASCENDING)],
+            name="patient_id_status_start_at",
+        ),
+    ],
+    "templates": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("name", ASCENDING)], name="name_unique", unique=True),
+    ],
+    "reminders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [("appointment_id", ASCENDING), ("offset_days", ASCENDING)],
+            name="appointment_id_offset_days_unique",
+            unique=True,
+        ),
+        IndexModel([("status", ASCENDING), ("scheduled_for", ASCENDING)], name="status_scheduled_for"),
+        IndexModel([("scheduled_for", ASCENDING)], name="scheduled_for"),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="status_lease_expires_at"),
+        IndexModel(
+            [("status", ASCENDING), ("partition", ASCENDING), ("scheduled_for", ASCENDING)],
+            name="status_partition_scheduled_for",
+        ),
+        IndexModel(
+            [("claim_token", ASCENDING)],
+            name="claim_token",
+            partialFilterExpression={"claim_token": {"$type": "string"}},
+        ),
+    ],
+    "events": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [("entity_type", ASCENDING), ("entity_id", ASCENDING), ("occurred_at", ASCENDING)],
+            name="entity_type_entity_id_occurred_at",
+        ),
+        IndexModel(
+            [("appointment_id", ASCENDING), ("seq", ASCENDING), ("id", ASCENDING)],
+            name="appointment_id_seq_id",
+        ),
+        IndexModel(
+            [("source_event_id", ASCENDING)],
+            name="source_event_id_unique",
+            unique=True,
+            partialFilterExpression={"source_event_id": {"$type": "string"}},
+        ),
+    ],
+    "reminder_stats": [
+        IndexModel([("day", ASCENDING)], name="day"),
+    ],
+    "dead_letters": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("replayed_at", ASCENDING), ("created_at", ASCENDING)], name="replayed_at_created_at"),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "dispatch_members": [
+        IndexModel([("heartbeat_at", ASCENDING)], name="heartbeat_at"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+_SAMPLE_ID = "00000000-0000-0000-0000-000000000000"
+_SAMPLE_TIME = datetime(2025, 1, 1)
+
+# Representative shapes of the queries issued by the services:
+# (description, collection, filter, sort).
+QUERY_PLANS: List[Tuple[str, str, Dict[str, Any], List[Tuple[str, int]]]] = [
+    (
+        "schedule: appointments in range",
+        "appointments",
+        {"start_at": {"$gte": _SAMPLE_TIME, "$lte": _SAMPLE_TIME}, "status": "scheduled"},
+        [],
+    ),
+    ("schedule: patients by id", "patients", {"id": {"$in": [_SAMPLE_ID]}}, []),
+    (
+        "schedule: existing reminders",
+        "reminders",
+        {"appointment_id": {"$in": [_SAMPLE_ID]}, "offset_days": {"$in": [7, 2]}},
+        [],
+    ),
+    (
+        "dispatch: due reminders",
+        "reminders",
+        {"scheduled_for": {"$lte": _SAMPLE_TIME}, "status": {"$in": ["scheduled", "failed"]}},
+        [],
+    ),
+    (
+        "dispatch: next due reminder",
+        "reminders",
+        {"status": {"$in": ["scheduled", "failed"]}},
+        [("scheduled_for", 1)],
+    ),
+    (
+        "dispatch: due reminders in partitions",
+        "reminders",
+        {
+            "scheduled_for": {"$lte": _SAMPLE_TIME},
+            "status": {"$in": ["scheduled", "failed"]},
+            "partition": {"$in": [0, 1, None]},
+        },
+        [],
+    ),
+    (
+        "dispatch: next due reminder in partitions",
+        "reminders",
+        {"status": {"$in": ["scheduled", "failed"]}, "partition": {"$in": [0, 1]}},
+        [("scheduled_for", 1)],
+    ),
+    ("dispatch: live members", "dispatch_members", {"heartbeat_at": {"$gt": _SAMPLE_TIME}}, []),
+    (
+        "dispatch: claim chunk",
+        "reminders",
+        {"id": {"$in": [_SAMPLE_ID]}, "status": {"$in": ["scheduled", "failed"]}, "scheduled_for": {"$lte": _SAMPLE_TIME}},
+        [],
+    ),
+    ("dispatch: claimed by token", "reminders", {"claim_token": _SAMPLE_ID}, []),
+    (
+        "dispatch: expired leases",
+        "reminders",
+        {"status": "dispatched", "lease_expires_at": {"$lte": _SAMPLE_TIME}},
+        [],
+    ),
+    (
+        "dispatch: next lease expiry",
+        "reminders",
+        {"status": "dispatched", "lease_expires_at": {"$type": "date"}},
+        [("lease_expires_at", 1)],
+    ),
+    ("dispatch: appointments by id", "appointments", {"id": {"$in": [_SAMPLE_ID]}}, []),
+    ("dispatch: default template", "templates", {"name": "default"}, []),
+    ("dlq: pending dead letters", "dead_letters", {"replayed_at": None}, [("created_at", -1)]),
+    ("dlq: dead reminders", "reminders", {"id": {"$in": [_SAMPLE_ID]}, "status": "dead"}, []),
+    ("dispatch: rate limit window", "rate_limits", {"_id": "dispatch:1735689600"}, []),
+    ("list: patients page", "patients", {"id": {"$gt": _SAMPLE_ID}}, [("id", 1)]),
+    ("list: appointments page", "appointments", {"id": {"$gt": _SAMPLE_ID}}, [("id", 1)]),
+    (
+        "list: appointments page by status",
+        "appointments",
+        {"status": "scheduled", "id": {"$gt": _SAMPLE_ID}},
+        [("id", 1)],
+    ),
+    ("list: templates page", "templates", {"id": {"$gt": _SAMPLE_ID}}, [("id", 1)]),
+    ("replies: imported event ids", "events", {"source_event_id": {"$in": ["event_001"]}}, []),
+    ("replies: patients by phone", "patients", {"phone_e164": {"$in": ["+15550000000"]}}, []),
+    (
+        "replies: scheduled appointments",
+        "appointments",
+        {"patient_id": {"$in": [_SAMPLE_ID]}, "status": "scheduled"},
+        [("start_at", -1)],
+    ),
+    (
+        "report: reminders in range",
+        "reminders",
+        {"scheduled_for": {"$gte": _SAMPLE_TIME, "$lte": _SAMPLE_TIME}},
+        [],
+    ),
+    (
+        "replies: applied status changes",
+        "appointments",
+        {"id": {"$in": [_SAMPLE_ID]}},
+        [],
+    ),
+    (
+        "cancel: pending reminders",
+        "reminders",
+        {"appointment_id": {"$in": [_SAMPLE_ID]}, "status": {"$in": ["scheduled", "failed"]}},
+        [],
+    ),
+    (
+        "reschedule: appointment reminders",
+        "reminders",
+        {"appointment_id": _SAMPLE_ID, "status": {"$in": ["scheduled", "failed", "delivered", "canceled"]}},
+        [],
+    ),
+    ("stats: rollups in range", "reminder_stats", {"day": {"$gte": "2025-01-01", "$lte": "2025-01-31"}}, []),
+    ("history: appointment", "appointments", {"id": _SAMPLE_ID}, []),
+    (
+        "history: events page",
+        "events",
+        {"appointment_id": _SAMPLE_ID, "$or": [{"seq": {"$gt": 0}}, {"seq": 0, "id": {"$gt": _SAMPLE_ID}}]},
+        [("seq", 1), ("id", 1)],
+    ),
+]
+
+
+def ensure_indexes(db) -> List[str]:
+    """Create all indexes (idempotent) and return their names.
+
+    Raises ``PyMongoError`` if an index cannot be built, e.g. a unique index
+    over existing duplicate documents.
+    """
+    created: List[str] = []
+    for collection, indexes in INDEXES.items():
+        created.extend(f"{collection}.{name}" for name in db[collection].create_indexes(indexes))
+    return created
+
+
+def explain_queries(db) -> List[Tuple[str, List[str]]]:
+    """Return the winning-plan stages for every entry in QUERY_PLANS."""
+    results: List[Tuple[str, List[str]]] = []
+    for description, collection, query, sort in QUERY_PLANS:
+        command: Dict[str, Any] = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = dict(sort)
+        try:
+            explain = db.command("explain", command, verbosity="queryPlanner")
+        except PyMongoError as exc:
+            results.append((description, [f"ERROR: {exc}"]))
+            continue
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        results.append((description, _plan_stages(winning_plan)))
+    return results
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    """Collect every ``stage`` name in a (possibly nested) query plan."""
+    stages: List[str] = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
@@ -0,0 +1,89 @@
+import atexit
+import threading
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from pymongo import MongoClient
+from pymongo.client_session import ClientSession
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+
+from app.config.settings import Settings, get_settings
+
+_client: Optional[MongoClient] = None
+_client_lock = threading.Lock()
+
+# Server error code for transactions on a standalone mongod.
+ILLEGAL_OPERATION = 20
+
+T = TypeVar("T")
+
+
+def client_options(settings: Settings) -> Dict[str, Any]:
+    """Translate settings into ``MongoClient`` keyword arguments."""
+    options: Dict[str, Any] = {
+        "appname": settings.mongo_app_name,
+        "maxPoolSize": settings.mongo_max_pool_size,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+        "connectTimeoutMS": settings.mongo_connect_timeout_ms,
+        "readPreference": settings.mongo_read_preference,
+    }
+    if settings.mongo_max_idle_time_ms is not None:
+        options["maxIdleTimeMS"] = settings.mongo_max_idle_time_ms
+    if settings.mongo_socket_timeout_ms is not None:
+        options["socketTimeoutMS"] = settings.mongo_socket_timeout_ms
+    if settings.mongo_compressors:
+        options["compressors"] = settings.mongo_compressors
+
+    write_concern = settings.mongo_write_concern
+    options["w"] = int(write_concern) if write_concern.isdigit() else write_concern
+    if settings.mongo_write_journal is not None:
+        options["journal"] = settings.mongo_write_journal
+    return options
+
+
+def get_client() -> MongoClient:
+    """Return the process-wide pooled client, creating it on first use.
+
+    ``MongoClient`` is thread-safe and pools connections internally, so every
+    command, worker thread and service in the process shares this instance.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                settings = get_settings()
+                _client = MongoClient(settings.mongo_url, **client_options(settings))
+                atexit.register(close_client)
+    return _client
+
+
+def get_database(name: Optional[str] = None) -> Database:
+    """Return a database handle on the shared client."""
+    return get_client()[name or get_settings().db_name]
+
+
+def close_client() -> None:
+    """Close the shared client; the next ``get_client`` call reconnects."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def run_in_transaction(db: Database, callback: Callable[[Optional[ClientSession]], T]) -> T:
+    """Run ``callback(session)`` in a transaction and return its result.
+
+    Transient errors and commit conflicts retry the whole callback, as
+    ``ClientSession.with_transaction`` does. A standalone server has no
+    transactions: there the callback runs once with ``session=None``, so it
+    should make its writes in an order that is safe to interrupt.
+    """
+    try:
+        with db.client.start_session() as session:
+            return session.with_transaction(callback)
+    except OperationFailure as exc:
+        if exc.code != ILLEGAL_OPERATION:
+            raise
+    return callback(None)
@@ -0,0 +1,83 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Window documents are kept this long after their window ends, for inspection,
+# before the TTL index on ``expires_at`` removes them.
+WINDOW_RETENTION = timedelta(minutes=5)
+
+
+class MongoTokenLease:
+    """A messages/second limit shared by every process through ``rate_limits``.
+
+    Time is cut into one-second windows, each with one counter document. A
+    process leases up to ``lease_size`` tokens with a single ``$inc`` and
+    spends them locally, so the database sees one round trip per lease rather
+    than per message. The tokens granted in a window never add up to more
+    than ``rate``; tokens a process leased but did not spend before the
+    window ended are lost, so smaller leases waste less of the budget at the
+    cost of more round trips.
+    """
+
+    def __init__(
+        self,
+        db,
+        name: str,
+        rate: float,
+        lease_size: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.name = name
+        self.limit = max(1, int(rate))
+        self.lease_size = min(self.limit, lease_size or max(1, self.limit // 10))
+        self._collection = db.rate_limits
+        self._clock = clock
+        self._window: Optional[int] = None
+        self._available = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> None:
+        """Block the calling thread until ``tokens`` have been granted."""
+        remaining = int(tokens)
+        while remaining > 0:
+            with self._lock:
+                now = self._clock()
+                window = int(now)
+                if window != self._window:
+                    self._window, self._available = window, 0
+                if self._available == 0:
+                    self._available = self._lease(window, max(self.lease_size, min(remaining, self.limit)))
+                taken = min(remaining, self._available)
+                self._available -= taken
+                remaining -= taken
+                wait = window + 1 - now if remaining else 0
+            if wait > 0:
+                time.sleep(wait)
+
+    def _lease(self, window: int, wanted: int) -> int:
+        """Take up to ``wanted`` tokens from ``window``'s counter and return how many were granted."""
+        update = {
+            "$inc": {"leased": wanted},
+            "$setOnInsert": {
+                "name": self.name,
+                "window": datetime.utcfromtimestamp(window),
+                "limit": self.limit,
+                "expires_at": datetime.utcfromtimestamp(window + 1) + WINDOW_RETENTION,
+            },
+        }
+        key = f"{self.name}:{window}"
+        try:
+            document = self._collection.find_one_and_update(
+                {"_id": key}, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Two processes created the window document at the same time.
+            document = self._collection.find_one_and_update(
+                {"_id": key}, update, return_document=ReturnDocument.AFTER
+            )
+        leased_before = document["leased"] - wanted
+        return max(0, min(wanted, self.limit - leased_before))
@@ -0,0 +1,155 @@
+from dataclasses import MISSING, dataclass, fields
+from datetime import datetime
+from typing import Any, ClassVar, Dict, Optional, Tuple, Type, TypeVar
+
+D = TypeVar("D", bound="Document")
+
+
+class Document:
+    """Conversions shared by the domain models below.
+
+    The models are slotted dataclasses: a fraction of a dict's memory per
+    instance and attribute access instead of key lookups in hot loops.
+    ``from_doc`` trusts its input (documents this application wrote) and does
+    no validation, so it costs less than decoding the document did;
+    ``validate`` runs the model's pydantic validator, compiled on first use,
+    for input from outside.
+    """
+
+    __slots__ = ()
+
+    FIELDS: ClassVar[Tuple[str, ...]]
+    _DEFAULTS: ClassVar[Tuple[Tuple[str, Any], ...]]
+    _adapter: ClassVar[Any] = None
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._adapter = None
+
+    @classmethod
+    def _init_fields(cls) -> None:
+        """Set ``FIELDS`` and the ``(name, default)`` pairs ``from_doc`` reads.
+
+        Computed once per model, so ``from_doc`` is one ``doc.get`` per field
+        and a positional call. Required fields default to ``None``, so a
+        projection may leave them out.
+        """
+        model_fields = fields(cls)
+        cls.FIELDS = tuple(field.name for field in model_fields)
+        cls._DEFAULTS = tuple(
+            (field.name, None if field.default is MISSING else field.default) for field in model_fields
+        )
+
+    @classmethod
+    def from_doc(cls: Type[D], doc: Dict[str, Any]) -> D:
+        """Build from a stored document; keys outside the model (``_id``, claim fields) are ignored.
+
+        Partially projected documents are fine: fields left out take their
+        defaults.
+        """
+        get = doc.get
+        return cls(*[get(name, default) for name, default in cls._DEFAULTS])
+
+    def to_doc(self) -> Dict[str, Any]:
+        """Return the document to store, without fields that are ``None``."""
+        doc = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                doc[name] = value
+        return doc
+
+    @classmethod
+    def projection(cls, *names: str) -> Dict[str, int]:
+        """A find projection for ``names``; raises on names the model does not have."""
+        unknown = set(names) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"{cls.__name__} has no fields {', '.join(sorted(unknown))}")
+        return {"_id": 0, **{name: 1 for name in names}}
+
+    @classmethod
+    def validate(cls: Type[D], data: Dict[str, Any]) -> D:
+        """Build from untrusted input, checking and coercing types; raises ``pydantic.ValidationError``."""
+        if cls._adapter is None:
+            from pydantic import TypeAdapter
+
+            cls._adapter = TypeAdapter(cls)
+        return cls._adapter.validate_python(data)
+
+
+@dataclass(slots=True)
+class Patient(Document):
+    id: str
+    full_name: str = ""
+    phone_e164: str = ""
+    tz: Optional[str] = None
+    active: bool = True
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    @property
+    def first_name(self) -> str:
+        return self.full_name.split()[0] if self.full_name else ""
+
+
+@dataclass(slots=True)
+class Appointment(Document):
+    id: str
+    patient_id: str = ""
+    start_at: Optional[datetime] = None
+    provider: str = ""
+    location: str = ""
+    status: str = "scheduled"
+    version: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+@dataclass(slots=True)
+class Reminder(Document):
+    id: str
+    appointment_id: str = ""
+    offset_days: int = 0
+    scheduled_for: Optional[datetime] = None
+    partition: Optional[int] = None
+    status: str = "scheduled"
+    attempts: int = 0
+    dispatched_at: Optional[datetime] = None
+    delivered_at: Optional[datetime] = None
+    provider_message_id: Optional[str] = None
+    last_error: Optional[str] = None
+    dead_at: Optional[datetime] = None
+    canceled_at: Optional[datetime] = None
+    cancel_reason: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+@dataclass(slots=True)
+class Template(Document):
+    id: str
+    name: str = ""
+    channel: str = "sms"
+    language: str = "en"
+    body: str = ""
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+@dataclass(slots=True)
+class Event(Document):
+    id: str
+    seq: int = 0
+    occurred_at: Optional[datetime] = None
+    type: str = ""
+    entity_type: str = ""
+    entity_id: str = ""
+    appointment_id: str = ""
+    payload: Optional[Dict[str, Any]] = None
+    trace_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+for _model in (Patient, Appointment, Reminder, Template, Event):
+    _model._init_fields()
@@ -1,23 +1,36 @@
 
-from .patient_service import add_patient, list_patients
-from .appointment_service import add_appointment, list_appointments
-from .template_service import add_template, list_templates
-from .reminder_service import schedule_reminders, dispatch_due_reminders
-from .reply_service import process_replies
-from .report_service import generate_reminders_report
-from .history_service import show_appointment_history
+import importlib
+from typing import Any
 
-__all__ = [
-    "add_patient",
-    "list_patients",
-    "add_appointment",
-    "list_appointments",
-    "add_template",
-    "list_templates",
-    "schedule_reminders",
-    "dispatch_due_reminders",
-    "process_replies",
-    "generate_reminders_report",
-    "show_appointment_history",
-]
+# Service modules are imported on first attribute access, so importing one
+# service (or this package) does not pay for all the others.
+_EXPORTS = {
+    "add_patient": "patient_service",
+    "list_patients": "patient_service",
+    "add_appointment": "appointment_service",
+    "list_appointments": "appointment_service",
+    "reschedule_appointment": "appointment_service",
+    "add_template": "template_service",
+    "update_template": "template_service",
+    "list_templates": "template_service",
+    "schedule_reminders": "reminder_service",
+    "dispatch_due_reminders": "reminder_service",
+    "process_replies": "reply_service",
+    "generate_reminders_report": "report_service",
+    "show_appointment_history": "history_service",
+}
 
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted([*globals(), *__all__])
@@ -1,7 +1,16 @@
-from datetime import datetime
-from typing import Callable, Dict, Any, List
+from dataclasses import replace
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, Optional, Tuple
 import uuid
 
+from app.config.settings import get_settings
+from app.db.mongodb import run_in_transaction
+from app.models.models import Appointment, Patient
+from app.services.event_service import get_event_sink, new_event
+from app.services.reminder_service import retime_reminders
+from app.utils.pagination import LIST_FORMATS, KeysetPage, json_line
+from app.utils.timezones import SendWindow
+
 
 def add_appointment(
     db,
@@ -39,22 +48,164 @@ def add_appointment(
     echo(f"✅ Appointment created: {appointment['id']}")
 
 
-def list_appointments(db, echo: Callable[[str], None]) -> None:
-    """List all appointments."""
-    appointments: List[Dict[str, Any]] = list(db.appointments.find({}).limit(50))
+class _AppointmentChanged(Exception):
+    """The appointment was modified by someone else during a reschedule."""
 
-    if not appointments:
-        echo("No appointments found")
+
+def reschedule_appointment(
+    db,
+    appointment_id: str,
+    start_at: str,
+    echo: Callable[[str], None],
+) -> None:
+    """Move an appointment to ``start_at`` and re-time its reminders.
+
+    The appointment update and the reminder updates commit in one
+    transaction, so reminders never go out for the old time of a moved
+    appointment (see ``run_in_transaction`` for servers without
+    transactions). The update is conditional on the appointment's
+    ``version``: a concurrent change, such as a reply canceling it, aborts
+    the reschedule. The appointment goes back to ``scheduled``, awaiting
+    confirmation of the new time.
+    """
+    try:
+        new_start = datetime.fromisoformat(start_at.replace("Z", "+00:00"))
+    except ValueError:
+        echo("❌ Invalid datetime format. Use: 2025-02-20T15:00:00Z")
         return
+    if new_start.tzinfo is not None:
+        new_start = new_start.astimezone(timezone.utc).replace(tzinfo=None)
+
+    doc = db.appointments.find_one(
+        {"id": appointment_id},
+        projection=Appointment.projection("id", "patient_id", "start_at", "provider", "location", "status", "version"),
+    )
+    if not doc:
+        echo(f"❌ Appointment {appointment_id} not found")
+        return
+    appointment = Appointment.from_doc(doc)
+    if appointment.status == "canceled":
+        echo(f"❌ Appointment {appointment_id} is canceled; add a new appointment instead")
+        return
+
+    patient = db.patients.find_one({"id": appointment.patient_id}, projection=Patient.projection("tz"))
+    tz = patient.get("tz") if patient else None
+    window = SendWindow.from_settings(get_settings())
+    moved = replace(appointment, start_at=new_start)
 
-    for apt in appointments:
-        patient = db.patients.find_one({"id": apt["patient_id"]})
-        patient_name = patient["full_name"] if patient else "Unknown"
-        if isinstance(apt["start_at"], datetime):
-            apt_time = apt["start_at"].strftime("%Y-%m-%d %H:%M")
-        else:
-            apt_time = str(apt["start_at"])
-        echo(
-            f"{apt['id'][:8]} {patient_name} {apt_time} {apt['provider']} {apt['status']}"
+    def move(session) -> Tuple[int, int]:
+        # The appointment first: without a transaction, a failure in between
+        # leaves reminders timed for the old slot, which rerunning fixes.
+        now = datetime.utcnow()
+        result = db.appointments.update_one(
+            {"id": appointment.id, "version": appointment.version},
+            {
+                "$set": {"start_at": new_start, "status": "scheduled", "updated_at": now},
+                "$inc": {"version": 1},
+            },
+            session=session,
         )
+        if not result.matched_count:
+            raise _AppointmentChanged()
+        return retime_reminders(db, moved, tz, window, session=session)
 
+    try:
+        retimed, canceled = run_in_transaction(db, move)
+    except _AppointmentChanged:
+        echo(f"❌ Appointment {appointment_id} changed while rescheduling; try again")
+        return
+
+    get_event_sink(db).emit_many(
+        [
+            new_event(
+                "appointment_rescheduled",
+                "appointment",
+                appointment.id,
+                appointment.id,
+                {
+                    "previous_start_at": appointment.start_at,
+                    "new_start_at": new_start,
+                    "previous_status": appointment.status,
+                    "reminders_retimed": retimed,
+                    "reminders_canceled": canceled,
+                },
+            )
+        ]
+    )
+    get_event_sink(db).flush()
+    echo(f"✅ Appointment {appointment.id} moved to {new_start:%Y-%m-%d %H:%M} UTC")
+    echo(f"  ⏰ {retimed} reminders re-timed, {canceled} canceled as already past")
+
+
+def list_appointments(
+    db,
+    echo: Callable[[str], None],
+    limit: int = 50,
+    after: Optional[str] = None,
+    status: Optional[str] = None,
+    provider: Optional[str] = None,
+    patient_id: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    format: str = "text",
+) -> None:
+    """List appointments a page at a time, in id order.
+
+    Filters narrow the listing; pass the printed cursor as ``after`` to fetch
+    the next page, or ``limit=0`` to list everything. Patient names are
+    resolved with one ``$in`` query per batch. ``format="jsonl"`` prints one
+    JSON document per line.
+    """
+    if format not in LIST_FORMATS:
+        echo(f"❌ Unknown format '{format}'. Use one of: {', '.join(LIST_FORMATS)}")
+        return
+
+    query: Dict[str, Any] = {}
+    if status:
+        query["status"] = status
+    if provider:
+        query["provider"] = provider
+    if patient_id:
+        query["patient_id"] = patient_id
+    if from_date or to_date:
+        query["start_at"] = {}
+        if from_date:
+            query["start_at"]["$gte"] = datetime.fromisoformat(f"{from_date}T00:00:00+00:00")
+        if to_date:
+            query["start_at"]["$lte"] = datetime.fromisoformat(f"{to_date}T23:59:59+00:00")
+
+    page = KeysetPage(
+        db.appointments,
+        query,
+        {"patient_id": 1, "start_at": 1, "provider": 1, "location": 1, "status": 1},
+        limit,
+        after=after,
+    )
+    for appointments in page:
+        patient_names: Dict[str, str] = {
+            patient["id"]: patient["full_name"]
+            for patient in db.patients.find(
+                {"id": {"$in": list({apt["patient_id"] for apt in appointments})}},
+                projection={"_id": 0, "id": 1, "full_name": 1},
+            )
+        }
+        for apt in appointments:
+            patient_name = patient_names.get(apt["patient_id"], "Unknown")
+            if format == "jsonl":
+                echo(json_line({**apt, "patient_name": patient_name}))
+                continue
+            if isinstance(apt["start_at"], datetime):
+                apt_time = apt["start_at"].strftime("%Y-%m-%d %H:%M")
+            else:
+                apt_time = str(apt["start_at"])
+            echo(
+                f"{apt['id'][:8]} {patient_name} {apt_time} {apt['provider']} {apt['status']}"
+            )
+
+    if format == "jsonl":
+        return
+    if not page.count:
+        echo("No appointments found")
+    elif page.next_after:
+        echo("")
+        echo(f"More appointments: --after {page.next_after}")
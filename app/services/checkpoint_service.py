@@ -0,0 +1,29 @@
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+def checkpoint_key(kind: str, file_path: str) -> str:
+    """Identify one import of one version of a file.
+
+    The key includes the file's size and modification time, so a new export
+    written to the same path starts a fresh checkpoint instead of resuming
+    the previous file's.
+    """
+    stat = os.stat(file_path)
+    return f"{kind}:{os.path.realpath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_checkpoint(db, key: str) -> Optional[Dict[str, Any]]:
+    """Return the stored checkpoint for ``key``, if any."""
+    return db.import_checkpoints.find_one({"_id": key})
+
+
+def save_checkpoint(db, key: str, **fields: Any) -> None:
+    """Upsert the checkpoint for ``key`` with ``fields``."""
+    now = datetime.utcnow()
+    db.import_checkpoints.update_one(
+        {"_id": key},
+        {"$set": {**fields, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+        upsert=True,
+    )
@@ -0,0 +1,147 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.config.settings import get_settings
+from app.services.partition_service import PartitionMembership
+from app.services.reminder_service import dispatch_due_reminders, next_due_at
+
+# Reminder changes that can move the next due time earlier: new reminders and
+# anything that re-times an existing one (e.g. a retry backoff).
+WAKE_PIPELINE = [
+    {
+        "$match": {
+            "$or": [
+                {"operationType": {"$in": ["insert", "replace"]}},
+                {"updateDescription.updatedFields.scheduled_for": {"$exists": True}},
+            ]
+        }
+    }
+]
+
+
+def serve_dispatcher(
+    db,
+    echo: Callable[[str], None],
+    workers: int = 1,
+    batch_size: int = 100,
+    max_idle_seconds: float = 60.0,
+    poll_interval_seconds: float = 1.0,
+    stop_event: Optional[threading.Event] = None,
+) -> None:
+    """Run the dispatcher until ``stop_event`` is set.
+
+    The loop peeks at the earliest due reminder and sleeps exactly until then.
+    A change stream on ``reminders`` wakes it early when a reminder is inserted
+    or re-timed; on deployments without change streams (standalone mongod) it
+    falls back to re-peeking every ``poll_interval_seconds``. A dispatch run
+    that moved nothing forward is followed by the same pause, rather than an
+    immediate retry.
+
+    Running instances split the reminder partitions between them (see
+    ``PartitionMembership``); each heartbeats every
+    ``dispatch_heartbeat_seconds`` and only dispatches the partitions it owns.
+    """
+    settings = get_settings()
+    membership = PartitionMembership(
+        db, settings.dispatch_partitions, timedelta(seconds=settings.dispatch_member_ttl_seconds)
+    )
+    heartbeat_interval = settings.dispatch_heartbeat_seconds
+    stop_event = stop_event or threading.Event()
+    wake_event = threading.Event()
+    threading.Thread(
+        target=lambda: (stop_event.wait(), wake_event.set()),
+        name="dispatcher-stop",
+        daemon=True,
+    ).start()
+
+    watcher = _start_change_watcher(db, wake_event, stop_event, echo)
+    idle_cap = max_idle_seconds if watcher else min(max_idle_seconds, poll_interval_seconds)
+    mode = "change stream" if watcher else f"polling every {idle_cap:g}s"
+    echo(f"🛰️  Dispatcher running ({mode}, {workers} workers)")
+
+    next_heartbeat = 0.0
+    try:
+        while not stop_event.is_set():
+            wake_event.clear()
+            try:
+                if time.monotonic() >= next_heartbeat:
+                    if membership.heartbeat():
+                        echo(
+                            f"  ⚖️  Member {membership.member_id} owns {len(membership.owned)}/"
+                            f"{membership.partitions} partitions ({len(membership.members)} members)"
+                        )
+                    next_heartbeat = time.monotonic() + heartbeat_interval
+                partitions = membership.partition_filter()
+                due_at = next_due_at(db, partitions)
+            except PyMongoError as exc:
+                echo(f"  💥 Error peeking next due reminder: {str(exc)}")
+                stop_event.wait(poll_interval_seconds)
+                continue
+
+            now = datetime.utcnow()
+            if due_at is not None and due_at <= now:
+                totals = dispatch_due_reminders(db, echo, workers=workers, batch_size=batch_size, partitions=partitions)
+                if not (totals["dispatched"] or totals["deferred"] or totals["canceled"]):
+                    # Due reminders that cannot move on (failed lookups,
+                    # leases held in another member's partitions) would
+                    # otherwise have the loop re-dispatch them back to back.
+                    wake_event.wait(poll_interval_seconds)
+                continue
+
+            timeout = min(idle_cap, max(0.0, next_heartbeat - time.monotonic()))
+            if due_at is not None:
+                timeout = min(timeout, (due_at - now).total_seconds())
+            wake_event.wait(timeout)
+    finally:
+        stop_event.set()
+        wake_event.set()
+        if watcher:
+            watcher.join()
+        try:
+            membership.leave()
+        except PyMongoError as exc:
+            echo(f"  ⚠️  Could not leave dispatch group: {str(exc)}")
+        echo("🛑 Dispatcher stopped")
+
+
+def _start_change_watcher(
+    db,
+    wake_event: threading.Event,
+    stop_event: threading.Event,
+    echo: Callable[[str], None],
+) -> Optional[threading.Thread]:
+    """Start a thread that sets ``wake_event`` on relevant reminder changes.
+
+    Returns ``None`` when the server does not support change streams.
+    """
+    try:
+        stream = db.reminders.watch(WAKE_PIPELINE, max_await_time_ms=1000)
+    except OperationFailure:
+        return None
+
+    def watch() -> None:
+        current = stream
+        while not stop_event.is_set():
+            try:
+                if current is None:
+                    current = db.reminders.watch(WAKE_PIPELINE, max_await_time_ms=1000)
+                if current.try_next() is not None:
+                    wake_event.set()
+            except PyMongoError as exc:
+                echo(f"  ⚠️  Change stream interrupted: {str(exc)}")
+                if current is not None:
+                    current.close()
+                current = None
+                # Something may have changed while we were not watching.
+                wake_event.set()
+                stop_event.wait(1.0)
+        if current is not None:
+            current.close()
+
+    thread = threading.Thread(target=watch, name="reminder-watcher", daemon=True)
+    thread.start()
+    return thread
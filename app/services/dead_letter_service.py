@@ -0,0 +1,102 @@
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services.event_service import get_event_sink, new_event
+from app.utils.batching import chunked
+
+REPLAY_BATCH_SIZE = 500
+
+
+def list_dead_letters(
+    db,
+    echo: Callable[[str], None],
+    limit: int = 50,
+    include_replayed: bool = False,
+) -> None:
+    """List dead-lettered reminders, newest first."""
+    query: Dict[str, Any] = {} if include_replayed else {"replayed_at": None}
+    letters: List[Dict[str, Any]] = list(
+        db.dead_letters.find(query, projection={"_id": 0}).sort("created_at", -1).limit(limit)
+    )
+
+    if not letters:
+        echo("No dead letters found")
+        return
+
+    for letter in letters:
+        replayed = ""
+        if letter.get("replayed_at"):
+            replayed = f" (replayed {letter['replayed_at'].strftime('%Y-%m-%d %H:%M')})"
+        echo(
+            f"☠️  {letter['id']} {letter['created_at'].strftime('%Y-%m-%d %H:%M')} "
+            f"reminder {letter['reminder_id'][:8]} to {letter['to_phone']}, "
+            f"{letter['attempts']} attempts ({letter['reason']}): {letter['last_error']}{replayed}"
+        )
+
+
+def replay_dead_letters(
+    db,
+    echo: Callable[[str], None],
+    ids: Optional[List[str]] = None,
+    replay_all: bool = False,
+) -> None:
+    """Queue dead-lettered reminders for another round of attempts.
+
+    The reminders go back to ``failed`` with a fresh attempt budget and are
+    due immediately; ``failed`` rather than ``scheduled`` so the delivery
+    rollups replace their last recorded outcome instead of adding another.
+    """
+    if not ids and not replay_all:
+        echo("❌ Pass dead letter ids or --all")
+        return
+
+    query: Dict[str, Any] = {"replayed_at": None}
+    if ids:
+        query["id"] = {"$in": ids}
+    letters = db.dead_letters.find(query, projection={"_id": 0, "id": 1, "reminder_id": 1, "appointment_id": 1})
+
+    replayed = 0
+    skipped = 0
+    for chunk in chunked(letters, REPLAY_BATCH_SIZE):
+        now = datetime.utcnow()
+        reminder_ids = [letter["reminder_id"] for letter in chunk]
+        dead = {
+            reminder["id"]
+            for reminder in db.reminders.find(
+                {"id": {"$in": reminder_ids}, "status": "dead"}, projection={"_id": 0, "id": 1}
+            )
+        }
+        db.reminders.update_many(
+            {"id": {"$in": list(dead)}, "status": "dead"},
+            {
+                "$set": {"status": "failed", "attempts": 0, "scheduled_for": now, "updated_at": now},
+                "$unset": {"dead_at": ""},
+            },
+        )
+        db.dead_letters.update_many(
+            {"id": {"$in": [letter["id"] for letter in chunk if letter["reminder_id"] in dead]}},
+            {"$set": {"replayed_at": now, "updated_at": now}},
+        )
+
+        events = []
+        for letter in chunk:
+            if letter["reminder_id"] not in dead:
+                echo(f"  ⏭️  Reminder {letter['reminder_id'][:8]} is no longer dead, skipped")
+                skipped += 1
+                continue
+            events.append(
+                new_event(
+                    "reminder_replayed",
+                    "reminder",
+                    letter["reminder_id"],
+                    letter["appointment_id"],
+                    {"dead_letter_id": letter["id"]},
+                )
+            )
+            replayed += 1
+        get_event_sink(db).emit_many(events)
+    get_event_sink(db).flush()
+
+    if ids and replayed + skipped < len(ids):
+        echo(f"  ⚠️  {len(ids) - replayed - skipped} ids not found or already replayed")
+    echo(f"🔁 Replayed {replayed} dead letters, skipped {skipped}")
@@ -0,0 +1,242 @@
+import atexit
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.config.settings import get_settings
+
+# Low bits of every sort key identify the writing process, so two processes
+# emitting in the same microsecond almost always get distinct keys. The node
+# id is random, so ties remain possible; readers order events by
+# ``(seq, id)``.
+_NODE_BITS = 10
+_NODE_ID = random.getrandbits(_NODE_BITS)
+_sort_key_lock = threading.Lock()
+_last_sort_key = 0
+
+
+def time_sort_key() -> int:
+    """Return the ``seq`` of a new event: a sort key from the wall clock, not a counter.
+
+    Keys are microsecond timestamps shifted left by ``_NODE_BITS`` with a
+    random per-process node id in the low bits. They increase strictly
+    within a process. Between processes they are only as ordered as the
+    hosts' clocks, and two processes can tie (same microsecond and node
+    id), so ``seq`` is neither gap-free nor unique; paging uses ``(seq,
+    id)``. A per-appointment counter would cost a round trip per event and
+    defeat batched event writes.
+    """
+    global _last_sort_key
+    with _sort_key_lock:
+        candidate = (time.time_ns() // 1000) << _NODE_BITS | _NODE_ID
+        if candidate <= _last_sort_key:
+            candidate = _last_sort_key + (1 << _NODE_BITS)
+        _last_sort_key = candidate
+        return candidate
+
+
+def new_event(
+    type: str,
+    entity_type: str,
+    entity_id: str,
+    appointment_id: str,
+    payload: Dict[str, Any],
+    trace_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Build an event document.
+
+    Every event carries the appointment it belongs to and a time-ordered
+    ``seq`` (see ``time_sort_key``), so an appointment's history is one
+    indexed range scan on ``(appointment_id, seq)``.
+    """
+    now = datetime.utcnow()
+    return {
+        "id": str(uuid.uuid4()),
+        "seq": time_sort_key(),
+        "occurred_at": now,
+        "type": type,
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "appointment_id": appointment_id,
+        "payload": payload,
+        "trace_id": trace_id or str(uuid.uuid4()),
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def record_events(db, events: List[Dict[str, Any]]) -> None:
+    """Insert events immediately with a single unordered round trip.
+
+    Use this only when the caller must know the outcome of the write (e.g.
+    deduplication on a unique key); everything else goes through
+    ``get_event_sink(db)``.
+    """
+    if events:
+        db.events.insert_many(events, ordered=False)
+
+
+class EventSink:
+    """Buffers events in memory and writes them with ``insert_many(ordered=False)``.
+
+    In asynchronous mode a background thread flushes the buffer whenever it
+    reaches ``batch_size`` events or ``flush_interval`` seconds have passed,
+    whichever comes first. If writers outpace the flusher and the buffer
+    reaches ``max_buffered`` events, ``emit`` flushes inline as backpressure.
+    In synchronous mode every ``emit``/``emit_many`` call is written before
+    it returns. ``close`` always flushes what is left.
+    """
+
+    def __init__(
+        self,
+        db,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        synchronous: bool = False,
+        max_buffered: Optional[int] = None,
+    ) -> None:
+        self._db = db
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._synchronous = synchronous
+        self._max_buffered = max_buffered or batch_size * 20
+        self._buffer: List[Dict[str, Any]] = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        if not synchronous:
+            self._thread = threading.Thread(target=self._run, name="event-sink", daemon=True)
+            self._thread.start()
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        self.emit_many([event])
+
+    def emit_many(self, events: List[Dict[str, Any]]) -> None:
+        if not events:
+            return
+        if self._synchronous:
+            self._write(list(events))
+            return
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("EventSink is closed")
+            self._buffer.extend(events)
+            pending = len(self._buffer)
+            if pending >= self._batch_size:
+                self._condition.notify()
+        if pending >= self._max_buffered:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write everything buffered so far before returning."""
+        with self._flush_lock:
+            with self._condition:
+                events, self._buffer = self._buffer, []
+            if events:
+                self._write(events)
+
+    def close(self) -> None:
+        """Stop the background thread and flush the remaining events."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._closed and len(self._buffer) < self._batch_size:
+                    self._condition.wait(self._flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except PyMongoError:
+                # The events went back into the buffer; retry on the next tick.
+                pass
+
+    def _write(self, events: List[Dict[str, Any]]) -> None:
+        try:
+            self._db.events.insert_many(events, ordered=False)
+        except BulkWriteError:
+            # Unordered: everything but the reported documents was written,
+            # and those (duplicate ids) will not succeed on a retry either.
+            pass
+        except PyMongoError:
+            if not self._synchronous:
+                with self._condition:
+                    self._buffer[:0] = events
+            raise
+
+
+_sinks: Dict[Tuple[int, str], EventSink] = {}
+_sinks_lock = threading.Lock()
+_atexit_registered = False
+
+
+def get_event_sink(db) -> EventSink:
+    """Return the process-wide event sink for ``db``, configured from settings.
+
+    Services emit through it as they go and ``flush`` it before returning, so
+    writes are batched within a call and a caller sees the call's events.
+    """
+    global _atexit_registered
+    key = (id(db.client), db.name)
+    sink = _sinks.get(key)
+    if sink is None:
+        with _sinks_lock:
+            sink = _sinks.get(key)
+            if sink is None:
+                settings = get_settings()
+                sink = EventSink(
+                    db,
+                    batch_size=settings.event_sink_batch_size,
+                    flush_interval=settings.event_sink_flush_interval_ms / 1000,
+                    synchronous=settings.event_sink_mode == "sync",
+                )
+                if not _atexit_registered:
+                    atexit.register(close_event_sinks)
+                    _atexit_registered = True
+                _sinks[key] = sink
+    return sink
+
+
+def close_event_sinks() -> None:
+    """Flush and close every event sink; safe to call more than once."""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+        _sinks.clear()
+    for sink in sinks:
+        sink.close()
+
+
+def backfill_event_keys(db) -> int:
+    """Add ``appointment_id`` and ``seq`` to events written before they existed.
+
+    ``seq`` is derived from ``occurred_at`` (node id 0), which keeps old
+    events ordered before anything written afterwards. Returns the number of
+    events updated.
+    """
+    seq_from_time = {"$multiply": [{"$toLong": "$occurred_at"}, 1000 << _NODE_BITS]}
+    updated = 0
+    for query, appointment_id in [
+        ({"entity_type": "appointment"}, "$entity_id"),
+        ({"entity_type": "reminder", "payload.appointment_id": {"$exists": True}}, "$payload.appointment_id"),
+    ]:
+        result = db.events.update_many(
+            {**query, "appointment_id": {"$exists": False}},
+            [{"$set": {"appointment_id": appointment_id, "seq": seq_from_time}}],
+        )
+        updated += result.modified_count
+    return updated
@@ -1,8 +1,20 @@
-from typing import Callable, Dict, Any, List
+from typing import Callable, Dict, Any, List, Optional, Tuple
 
 
-def show_appointment_history(db, appointment_id: str, echo: Callable[[str], None]) -> None:
-    """Display appointment history."""
+def show_appointment_history(
+    db,
+    appointment_id: str,
+    echo: Callable[[str], None],
+    limit: int = 50,
+    after: Optional[str] = None,
+) -> None:
+    """Display appointment history.
+
+    Events are read a page at a time in ``(seq, id)`` order with one range
+    scan on the ``(appointment_id, seq, id)`` index; ``id`` breaks ties
+    between events with the same ``seq``. Pass the printed ``SEQ:ID`` cursor
+    as ``after`` to fetch the next page.
+    """
     appointment_data = db.appointments.find_one({"id": appointment_id})
     if not appointment_data:
         echo(f"❌ Appointment {appointment_id} not found")
@@ -11,19 +23,26 @@ def show_appointment_history(db, appointment_id: str, echo: Callable[[str], None
     patient = db.patients.find_one({"id": appointment_data["patient_id"]})
     patient_name = patient["full_name"] if patient else "Unknown"
 
+    query: Dict[str, Any] = {"appointment_id": appointment_id}
+    if after is not None:
+        try:
+            after_seq, after_id = _parse_cursor(after)
+        except ValueError:
+            echo(f"❌ Invalid cursor '{after}'. Pass the SEQ:ID printed after the previous page")
+            return
+        query["$or"] = [{"seq": {"$gt": after_seq}}, {"seq": after_seq, "id": {"$gt": after_id}}]
+
     events: List[Dict[str, Any]] = list(
-        db.events.find(
-            {
-                "$or": [
-                    {"entity_type": "appointment", "entity_id": appointment_id},
-                    {"entity_type": "reminder", "payload.appointment_id": appointment_id},
-                ]
-            }
-        ).sort("occurred_at", 1)
+        db.events.find(query, projection={"_id": 0}).sort([("seq", 1), ("id", 1)]).limit(limit + 1)
     )
+    has_more = len(events) > limit
+    events = events[:limit]
 
     if not events:
-        echo(f"No history found for appointment {appointment_id}")
+        if after is None:
+            echo(f"No history found for appointment {appointment_id}")
+        else:
+            echo(f"No more history for appointment {appointment_id}")
         return
 
     echo(f"📋 History for: {patient_name}")
@@ -44,10 +63,20 @@ def show_appointment_history(db, appointment_id: str, echo: Callable[[str], None
         if event_type == "status_changed":
             payload = event.get("payload", {})
             details = f"{payload.get('previous_status', '?')} → {payload.get('new_status', '?')}"
+        elif event_type == "appointment_rescheduled":
+            payload = event.get("payload", {})
+            details = (
+                f"Moved to {payload['new_start_at']:%Y-%m-%d %H:%M}, "
+                f"{payload.get('reminders_retimed', 0)} reminders re-timed"
+            )
         elif event_type == "reminder_scheduled":
             details = f"Offset: {event['payload'].get('offset_days')} days"
         elif event_type == "reminder_dispatched":
             details = f"SMS: {event['payload'].get('message_preview', '')[:50]}..."
+        elif event_type in ("reminder_failed", "reminder_dead_lettered"):
+            details = f"Attempt {event['payload'].get('attempts', '?')}: {event['payload'].get('error', '')}"
+        elif event_type == "reminder_replayed":
+            details = f"Replayed from dead letter {event['payload'].get('dead_letter_id', '')[:8]}"
         elif event_type == "reply_received":
             details = f"Reply: {event['payload'].get('message', '')[:50]}..."
             if "classification" in event["payload"]:
@@ -60,3 +89,15 @@ def show_appointment_history(db, appointment_id: str, echo: Callable[[str], None
 
         echo(f"{time_str} | {event_type:20} | {details}")
 
+    if has_more:
+        echo("")
+        echo(f"More events: --after {events[-1]['seq']}:{events[-1]['id']}")
+
+
+def _parse_cursor(cursor: str) -> Tuple[int, str]:
+    """Split a ``SEQ:ID`` cursor; raises ``ValueError`` unless it has both parts."""
+    seq, _, event_id = cursor.partition(":")
+    if not event_id:
+        raise ValueError(f"Cursor without an event id: {cursor}")
+    return int(seq), event_id
+
@@ -0,0 +1,299 @@
+import csv
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import suppress
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, IO, Iterator, List, Optional, Set, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from app.utils.batching import chunked
+from app.utils.timezones import is_valid_timezone
+
+PHONE_PATTERN = re.compile(r"^\+[1-9]\d{1,14}$")
+DUPLICATE_KEY_ERROR = 11000
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+
+# One row of an import: (row number, record as read, document to insert or
+# None, error or None).
+_Row = Tuple[int, Dict[str, Any], Optional[Dict[str, Any]], Optional[str]]
+
+
+def import_patients(
+    db,
+    file_path: str,
+    echo: Callable[[str], None],
+    reject_path: Optional[str] = None,
+    chunk_size: int = 1000,
+    verbose: bool = False,
+) -> None:
+    """Create patients from a CSV or JSONL file with ``name``, ``phone`` and ``tz``.
+
+    An optional ``id`` column keeps the clinic's own patient ids, so an
+    appointments file can refer to them. See ``_import`` for how rows are
+    processed.
+    """
+    _import(db, "patients", file_path, _patient_chunk, echo, reject_path, chunk_size, verbose)
+
+
+def import_appointments(
+    db,
+    file_path: str,
+    echo: Callable[[str], None],
+    reject_path: Optional[str] = None,
+    chunk_size: int = 1000,
+    verbose: bool = False,
+) -> None:
+    """Create appointments from a CSV or JSONL file.
+
+    Rows need ``patient_id``, ``start_at`` (ISO 8601; UTC unless it carries
+    an offset), ``provider`` and ``location``, and may set ``id``. See
+    ``_import`` for how rows are processed.
+    """
+    _import(db, "appointments", file_path, _appointment_chunk, echo, reject_path, chunk_size, verbose)
+
+
+def _import(
+    db,
+    collection: str,
+    file_path: str,
+    prepare_chunk: Callable[[Any, List[Tuple[int, Dict[str, Any]]]], List[_Row]],
+    echo: Callable[[str], None],
+    reject_path: Optional[str],
+    chunk_size: int,
+    verbose: bool,
+) -> None:
+    """Stream ``file_path`` into ``collection`` ``chunk_size`` rows at a time.
+
+    Each chunk is validated with one ``$in`` query per lookup and written
+    with one unordered ``insert_many``, so a bad row costs only itself.
+    Rejected rows, with their row number and error, go to ``reject_path``
+    (by default next to the input, e.g. ``patients.rejects.csv``) in the
+    input's format, ready to be fixed and imported again.
+    """
+    if not os.path.exists(file_path):
+        echo(f"❌ File not found: {file_path}")
+        return
+
+    jsonl = file_path.endswith(JSONL_EXTENSIONS)
+    if reject_path is None:
+        base, extension = os.path.splitext(file_path)
+        reject_path = f"{base}.rejects{extension}"
+
+    imported = 0
+    rows = 0
+    started = time.perf_counter()
+    with open(file_path, newline="", encoding="utf-8") as file, _RejectWriter(reject_path, jsonl) as rejects:
+        records = _read_jsonl(file) if jsonl else csv.DictReader(file)
+        for chunk in chunked(enumerate(records, 1), chunk_size):
+            malformed = [(row_num, record) for row_num, record in chunk if isinstance(record, _Malformed)]
+            prepared = prepare_chunk(db, [row for row in chunk if not isinstance(row[1], _Malformed)])
+            if malformed:
+                prepared.extend((row_num, record, None, "Invalid JSON") for row_num, record in malformed)
+                prepared.sort(key=lambda row: row[0])
+            documents = [document for _, _, document, error in prepared if error is None]
+            failed = _insert(db[collection], documents)
+
+            inserted = 0
+            for row_num, record, document, error in prepared:
+                if error is None and document is not None:
+                    error = failed.get(document["id"])
+                if error is None:
+                    inserted += 1
+                    continue
+                rejects.write(row_num, record, error)
+                if verbose:
+                    echo(f"  ❌ Row {row_num}: {error}")
+
+            imported += inserted
+            rows += len(chunk)
+            if len(chunk) == chunk_size:
+                elapsed = time.perf_counter() - started
+                echo(f"  … {rows} rows ({rows / elapsed:,.0f} rows/s)")
+
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed > 0 else 0.0
+    echo(f"📥 Import complete: {imported} {collection} imported, {rows - imported} rejected ({rate:,.0f} rows/s)")
+    if rows > imported:
+        echo(f"  Rejected rows written to {reject_path}")
+
+
+def _patient_chunk(db, chunk: List[Tuple[int, Dict[str, Any]]]) -> List[_Row]:
+    """Validate a chunk of patient records and build their documents."""
+    now = datetime.utcnow()
+    phones = [str(record.get("phone") or "").strip() for _, record in chunk]
+    ids = [str(record["id"]).strip() for _, record in chunk if record.get("id")]
+    taken_phones: Set[str] = {
+        patient["phone_e164"]
+        for patient in db.patients.find({"phone_e164": {"$in": phones}}, projection={"_id": 0, "phone_e164": 1})
+    }
+    taken_ids: Set[str] = {
+        patient["id"] for patient in db.patients.find({"id": {"$in": ids}}, projection={"_id": 0, "id": 1})
+    } if ids else set()
+
+    prepared: List[_Row] = []
+    for (row_num, record), phone in zip(chunk, phones):
+        name = str(record.get("name") or "").strip()
+        tz = str(record.get("tz") or "").strip()
+        patient_id = str(record.get("id") or "").strip() or str(uuid.uuid4())
+        error = None
+        if not name:
+            error = "Missing name"
+        elif not PHONE_PATTERN.match(phone):
+            error = f"Invalid phone {phone!r}; use E.164, e.g. +15551234567"
+        elif not is_valid_timezone(tz):
+            error = f"Unknown time zone {tz!r}"
+        elif phone in taken_phones:
+            error = f"Patient with phone {phone} already exists"
+        elif patient_id in taken_ids:
+            error = f"Patient {patient_id} already exists"
+
+        if error:
+            prepared.append((row_num, record, None, error))
+            continue
+        # Later rows of the same chunk must not reuse this phone or id either.
+        taken_phones.add(phone)
+        taken_ids.add(patient_id)
+        document = {
+            "id": patient_id,
+            "full_name": name,
+            "phone_e164": phone,
+            "tz": tz,
+            "active": True,
+            "created_at": now,
+            "updated_at": now,
+        }
+        prepared.append((row_num, record, document, None))
+    return prepared
+
+
+def _appointment_chunk(db, chunk: List[Tuple[int, Dict[str, Any]]]) -> List[_Row]:
+    """Validate a chunk of appointment records and build their documents."""
+    now = datetime.utcnow()
+    patient_ids = list({str(record.get("patient_id") or "").strip() for _, record in chunk})
+    ids = [str(record["id"]).strip() for _, record in chunk if record.get("id")]
+    patients: Set[str] = {
+        patient["id"] for patient in db.patients.find({"id": {"$in": patient_ids}}, projection={"_id": 0, "id": 1})
+    }
+    taken_ids: Set[str] = {
+        appointment["id"]
+        for appointment in db.appointments.find({"id": {"$in": ids}}, projection={"_id": 0, "id": 1})
+    } if ids else set()
+
+    prepared: List[_Row] = []
+    for row_num, record in chunk:
+        patient_id = str(record.get("patient_id") or "").strip()
+        appointment_id = str(record.get("id") or "").strip() or str(uuid.uuid4())
+        missing = [field for field in ("patient_id", "start_at", "provider", "location") if not record.get(field)]
+        error = None
+        start_at = None
+        if missing:
+            error = f"Missing {', '.join(missing)}"
+        else:
+            try:
+                start_at = _parse_start_at(str(record["start_at"]))
+            except ValueError:
+                error = f"Invalid start_at {record['start_at']!r}; use e.g. 2025-02-20T15:00:00Z"
+        if error is None:
+            if patient_id not in patients:
+                error = f"Patient {patient_id} not found"
+            elif appointment_id in taken_ids:
+                error = f"Appointment {appointment_id} already exists"
+
+        if error:
+            prepared.append((row_num, record, None, error))
+            continue
+        taken_ids.add(appointment_id)
+        document = {
+            "id": appointment_id,
+            "patient_id": patient_id,
+            "start_at": start_at,
+            "provider": str(record["provider"]).strip(),
+            "location": str(record["location"]).strip(),
+            "status": "scheduled",
+            "version": 1,
+            "created_at": now,
+            "updated_at": now,
+        }
+        prepared.append((row_num, record, document, None))
+    return prepared
+
+
+def _parse_start_at(value: str) -> datetime:
+    start_at = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if start_at.tzinfo is not None:
+        start_at = start_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return start_at
+
+
+def _insert(collection, documents: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Insert ``documents`` unordered; return the error for each one that was not written, by id."""
+    if not documents:
+        return {}
+    try:
+        collection.insert_many(documents, ordered=False)
+    except BulkWriteError as exc:
+        # Lost a race with a concurrent writer (unique index) or some other
+        # per-document error; the rest of the batch was still written.
+        failed: Dict[str, str] = {}
+        for error in exc.details.get("writeErrors", []):
+            document = documents[error["index"]]
+            if error.get("code") == DUPLICATE_KEY_ERROR:
+                failed[document["id"]] = "Duplicate of an existing record"
+            else:
+                failed[document["id"]] = error.get("errmsg", "Write failed")
+        return failed
+    return {}
+
+
+class _Malformed(dict):
+    """A JSONL line that is not a JSON object, kept as ``{"line": ...}`` for the reject file."""
+
+
+def _read_jsonl(file: IO[str]) -> Iterator[Dict[str, Any]]:
+    """Yield one record per non-blank line."""
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield record if isinstance(record, dict) else _Malformed(line=line.rstrip("\n"))
+
+
+class _RejectWriter:
+    """Write rejected records, opening the reject file on the first one.
+
+    A reject file left by an earlier import is removed on entry, so after a
+    clean import no stale rejects remain next to the input.
+    """
+
+    def __init__(self, path: str, jsonl: bool) -> None:
+        self.path = path
+        self.jsonl = jsonl
+        self._file: Optional[IO[str]] = None
+        self._csv: Optional[csv.DictWriter] = None
+
+    def __enter__(self) -> "_RejectWriter":
+        with suppress(FileNotFoundError):
+            os.remove(self.path)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self._file is not None:
+            self._file.close()
+
+    def write(self, row_num: int, record: Dict[str, Any], error: str) -> None:
+        if self._file is None:
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+        if self.jsonl:
+            self._file.write(json.dumps({**record, "row": row_num, "error": error}, ensure_ascii=False) + "\n")
+            return
+        if self._csv is None:
+            self._csv = csv.DictWriter(self._file, fieldnames=[*record.keys(), "row", "error"], extrasaction="ignore")
+            self._csv.writeheader()
+        self._csv.writerow({**record, "row": row_num, "error": error})
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import socket
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from app.utils.batching import chunked
+
+
+def reminder_partition(appointment_id: str, partitions: int) -> int:
+    """Partition of a reminder: a stable hash of its appointment id.
+
+    All reminders of an appointment land in the same partition, so one
+    dispatcher sees an appointment's reminders in order.
+    """
+    return zlib.crc32(appointment_id.encode()) % partitions
+
+
+def assign_partitions(members: List[str], partitions: int) -> Dict[str, List[int]]:
+    """Map each member to the partitions it owns, by rendezvous hashing.
+
+    Every partition goes to the member with the highest hash of
+    ``(member, partition)``. Any process with the same member list computes
+    the same disjoint assignment without coordination, and when a member
+    joins or leaves only the partitions it gains or loses move.
+    """
+    owned: Dict[str, List[int]] = {member: [] for member in members}
+    for partition in range(partitions):
+        owner = max(members, key=lambda member: _weight(member, partition))
+        owned[owner].append(partition)
+    return owned
+
+
+def _weight(member: str, partition: int) -> int:
+    digest = hashlib.blake2b(f"{member}:{partition}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class PartitionMembership:
+    """One dispatcher's membership in the dispatch group.
+
+    Members register in ``dispatch_members`` and renew a heartbeat; a member
+    whose heartbeat is older than ``ttl`` is treated as gone. ``heartbeat``
+    renews this member and recomputes which partitions it owns from the
+    live member list, so partitions rebalance within one heartbeat interval
+    of a member joining, leaving or dying. While views differ during a
+    change two members may briefly both dispatch a partition; claims are
+    atomic, so that costs wasted claim attempts, not duplicate sends.
+    """
+
+    def __init__(self, db, partitions: int, ttl: timedelta, member_id: Optional[str] = None) -> None:
+        self.db = db
+        self.partitions = partitions
+        self.ttl = ttl
+        self.member_id = member_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.members: List[str] = []
+        self.owned: List[int] = []
+
+    def heartbeat(self) -> bool:
+        """Renew this member and refresh the assignment; return True if it changed."""
+        now = datetime.utcnow()
+        self.db.dispatch_members.update_one(
+            {"_id": self.member_id},
+            {
+                "$set": {"heartbeat_at": now, "expires_at": now + self.ttl},
+                "$setOnInsert": {"joined_at": now},
+            },
+            upsert=True,
+        )
+        members = sorted(
+            member["_id"]
+            for member in self.db.dispatch_members.find(
+                {"heartbeat_at": {"$gt": now - self.ttl}}, projection={"_id": 1}
+            )
+        )
+        if self.member_id not in members:
+            members = sorted([*members, self.member_id])
+        owned = assign_partitions(members, self.partitions)[self.member_id]
+        changed = owned != self.owned or members != self.members
+        self.members, self.owned = members, owned
+        return changed
+
+    def leave(self) -> None:
+        """Deregister so the other members take over this member's partitions right away."""
+        self.db.dispatch_members.delete_one({"_id": self.member_id})
+        self.members, self.owned = [], []
+
+    def partition_filter(self) -> List[Optional[int]]:
+        """Values of ``partition`` this member dispatches.
+
+        The owner of partition 0 also takes reminders without a partition
+        (scheduled before partitioning; see ``backfill_reminder_partitions``).
+        """
+        return [*self.owned, None] if 0 in self.owned else list(self.owned)
+
+
+def backfill_reminder_partitions(
+    db,
+    partitions: int,
+    echo: Callable[[str], None],
+    batch_size: int = 1000,
+    repartition: bool = False,
+) -> int:
+    """Set ``partition`` on reminders scheduled before it existed; return how many.
+
+    After changing the partition count, pass ``repartition=True`` to
+    recompute it for every reminder, with the dispatchers stopped.
+    """
+    updated = 0
+    reminders = db.reminders.find(
+        {} if repartition else {"partition": {"$exists": False}},
+        projection={"_id": 0, "id": 1, "appointment_id": 1},
+        batch_size=batch_size,
+    )
+    for chunk in chunked(reminders, batch_size):
+        result = db.reminders.bulk_write(
+            [
+                UpdateOne(
+                    {"id": reminder["id"]},
+                    {"$set": {"partition": reminder_partition(reminder["appointment_id"], partitions)}},
+                )
+                for reminder in chunk
+            ],
+            ordered=False,
+        )
+        updated += result.modified_count
+        echo(f"  ✅ Partitioned {updated} reminders")
+    return updated
@@ -1,10 +1,17 @@
 from datetime import datetime
-from typing import Callable, List, Dict, Any
+from typing import Callable, Dict, Any, Optional
 import uuid
 
+from app.utils.pagination import LIST_FORMATS, KeysetPage, json_line
+from app.utils.timezones import is_valid_timezone
+
 
 def add_patient(db, name: str, phone: str, tz: str, echo: Callable[[str], None]) -> None:
     """Add a new patient."""
+    if not is_valid_timezone(tz):
+        echo(f"❌ Unknown time zone: {tz}")
+        return
+
     if db.patients.find_one({"phone_e164": phone}):
         echo(f"❌ Patient with phone {phone} already exists")
         return
@@ -23,18 +30,44 @@ def add_patient(db, name: str, phone: str, tz: str, echo: Callable[[str], None])
     echo(f"✅ Patient created: {patient['id']}")
 
 
-def list_patients(db, echo: Callable[[str], None]) -> None:
-    """List all patients."""
-    patients: List[Dict[str, Any]] = list(db.patients.find({}).limit(50))
+def list_patients(
+    db,
+    echo: Callable[[str], None],
+    limit: int = 50,
+    after: Optional[str] = None,
+    format: str = "text",
+) -> None:
+    """List patients a page at a time, in id order.
 
-    if not patients:
-        echo("No patients found")
+    Pass the printed cursor as ``after`` to fetch the next page; ``limit=0``
+    lists everything. ``format="jsonl"`` prints one JSON document per line.
+    """
+    if format not in LIST_FORMATS:
+        echo(f"❌ Unknown format '{format}'. Use one of: {', '.join(LIST_FORMATS)}")
         return
 
-    for patient in patients:
-        status = "✓" if patient.get("active", True) else "✗"
-        echo(
-            f"{status} {patient['id'][:8]} {patient['full_name']} "
-            f"{patient['phone_e164']} {patient['tz']}"
-        )
+    page = KeysetPage(
+        db.patients,
+        {},
+        {"full_name": 1, "phone_e164": 1, "tz": 1, "active": 1},
+        limit,
+        after=after,
+    )
+    for patients in page:
+        for patient in patients:
+            if format == "jsonl":
+                echo(json_line({**patient, "active": patient.get("active", True)}))
+                continue
+            status = "✓" if patient.get("active", True) else "✗"
+            echo(
+                f"{status} {patient['id'][:8]} {patient['full_name']} "
+                f"{patient['phone_e164']} {patient.get('tz', '')}"
+            )
 
+    if format == "jsonl":
+        return
+    if not page.count:
+        echo("No patients found")
+    elif page.next_after:
+        echo("")
+        echo(f"More patients: --after {page.next_after}")
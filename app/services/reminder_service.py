@@ -1,7 +1,52 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Callable, Dict, Any, List
+from typing import Callable, Dict, Any, List, Optional, Set, Tuple
+import os
+import socket
 import uuid
-import random
+import threading
+
+from jinja2 import TemplateError
+from pymongo import UpdateOne
+from pymongo.client_session import ClientSession
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.config.settings import get_settings
+from app.models.models import Appointment, Patient, Reminder
+from app.services.event_service import get_event_sink, new_event
+from app.services.partition_service import reminder_partition
+from app.services.stats_service import OUTCOME_STATUSES, StatsAccumulator
+from app.services.template_service import CompiledTemplate, build_context, get_template_renderer
+from app.sms import DispatchThrottle, SendResult, SmsMessage, SmsProvider, get_provider, get_throttle
+from app.sms.base import failed_results
+from app.utils.batching import chunked
+from app.utils.retry import RetryPolicy
+from app.utils.timezones import SendWindow, to_local, to_utc
+
+# Fields a dispatch claim adds to a reminder until it is acknowledged or reaped.
+_CLAIM_FIELDS: Tuple[str, ...] = ("claim_token", "claimed_by", "lease_expires_at", "claimed_from")
+
+# Outcome fields cleared when a reminder is re-timed for a moved appointment.
+_RESET_ON_RETIME: Tuple[str, ...] = (
+    "dispatched_at",
+    "delivered_at",
+    "provider_message_id",
+    "last_error",
+    "canceled_at",
+    "cancel_reason",
+)
+
+# Reminder statuses the dispatcher picks up once ``scheduled_for`` has passed:
+# new reminders and failed sends whose retry is due. Sends that exhausted
+# their attempts, or cannot succeed, end as ``dead`` with a dead letter.
+DISPATCHABLE_STATUSES: Tuple[str, ...] = ("scheduled", "failed")
+
+# Appointment statuses whose pending reminders are canceled rather than sent.
+INACTIVE_APPOINTMENT_STATUSES: Tuple[str, ...] = ("canceled", "reschedule_requested")
+
+# Reminder statuses a reschedule re-times: everything but sends in flight
+# (``dispatched``) and dead letters, which are replayed instead.
+RETIMABLE_STATUSES: Tuple[str, ...] = (*DISPATCHABLE_STATUSES, "delivered", "canceled")
 
 
 def schedule_reminders(
@@ -10,163 +55,914 @@ def schedule_reminders(
     to_date: str,
     offsets: str,
     echo: Callable[[str], None],
+    batch_size: int = 1000,
 ) -> None:
-    """Schedule reminders for appointments within a date range."""
+    """Schedule reminders for appointments within a date range.
+
+    Appointments are streamed from a cursor and handled ``batch_size`` at a
+    time: patients and already-scheduled reminders are resolved with one
+    ``$in`` query each per chunk, and new reminders are written with a single
+    unordered ``insert_many``.
+
+    Offsets are counted in the patient's time zone, and send times are moved
+    into the configured send window (see ``SendWindow``).
+    """
     from_dt = datetime.fromisoformat(f"{from_date}T00:00:00+00:00")
     to_dt = datetime.fromisoformat(f"{to_date}T23:59:59+00:00")
     offset_list: List[int] = [int(x.strip()) for x in offsets.split(",")]
 
-    appointments: List[Dict[str, Any]] = list(
-        db.appointments.find(
-            {
-                "start_at": {
-                    "$gte": from_dt,
-                    "$lte": to_dt,
-                },
-                "status": "scheduled",
-            }
-        )
+    appointments = db.appointments.find(
+        {
+            "start_at": {
+                "$gte": from_dt,
+                "$lte": to_dt,
+            },
+            "status": "scheduled",
+        },
+        projection=Appointment.projection("id", "patient_id", "start_at"),
+        batch_size=batch_size,
     )
 
     reminders_created = 0
     reminders_skipped = 0
 
+    window = SendWindow.from_settings(get_settings())
+    for chunk in chunked(map(Appointment.from_doc, appointments), batch_size):
+        created, skipped = _schedule_chunk(db, chunk, offset_list, window, echo)
+        reminders_created += created
+        reminders_skipped += skipped
+    get_event_sink(db).flush()
+
+    echo(f"📅 Summary: Created {reminders_created} reminders, skipped {reminders_skipped}")
+
+
+def _schedule_chunk(
+    db,
+    appointments: List[Appointment],
+    offset_list: List[int],
+    window: SendWindow,
+    echo: Callable[[str], None],
+) -> Tuple[int, int]:
+    """Create the reminders for one chunk of appointments.
+
+    Returns the ``(created, skipped)`` counts for the chunk.
+    """
+    patient_ids = list({appointment.patient_id for appointment in appointments})
+    patients: Dict[str, Patient] = {
+        patient.id: patient
+        for patient in map(
+            Patient.from_doc,
+            db.patients.find(
+                {"id": {"$in": patient_ids}},
+                projection=Patient.projection("id", "full_name", "tz", "active"),
+            ),
+        )
+    }
+
+    existing: Set[Tuple[str, int]] = {
+        (reminder["appointment_id"], reminder["offset_days"])
+        for reminder in db.reminders.find(
+            {
+                "appointment_id": {"$in": [appointment.id for appointment in appointments]},
+                "offset_days": {"$in": offset_list},
+            },
+            projection={"_id": 0, "appointment_id": 1, "offset_days": 1},
+        )
+    }
+
+    created = 0
+    skipped = 0
+    now = datetime.utcnow()
+    partitions = get_settings().dispatch_partitions
+    pending: List[Tuple[Reminder, str]] = []
+
     for appointment in appointments:
-        patient = db.patients.find_one({"id": appointment["patient_id"]})
-        if not patient or not patient.get("active", True):
+        patient = patients.get(appointment.patient_id)
+        if not patient or not patient.active:
             continue
 
+        local_start = to_local(appointment.start_at, patient.tz)
         for offset_days in offset_list:
-            scheduled_for = appointment["start_at"] - timedelta(days=offset_days)
+            local_send = window.send_time(
+                local_start - timedelta(days=offset_days), f"{appointment.id}:{offset_days}", local_start
+            )
+            scheduled_for = to_utc(local_send, patient.tz)
 
-            if scheduled_for < datetime.utcnow():
-                reminders_skipped += 1
+            if scheduled_for < now:
+                skipped += 1
                 continue
 
-            reminder = {
-                "id": str(uuid.uuid4()),
-                "appointment_id": appointment["id"],
-                "offset_days": offset_days,
-                "scheduled_for": scheduled_for,
-                "status": "scheduled",
-                "attempts": 0,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow(),
-            }
+            if (appointment.id, offset_days) in existing:
+                skipped += 1
+                echo(f"  ⏭️  Skipped duplicate: {offset_days} days before for {patient.full_name}")
+                continue
+
+            reminder = Reminder(
+                id=str(uuid.uuid4()),
+                appointment_id=appointment.id,
+                offset_days=offset_days,
+                scheduled_for=scheduled_for,
+                partition=reminder_partition(appointment.id, partitions),
+                created_at=now,
+                updated_at=now,
+            )
+            pending.append((reminder, patient.full_name))
+
+    if not pending:
+        return created, skipped
+
+    failed_indexes: Set[int] = set()
+    try:
+        db.reminders.insert_many([reminder.to_doc() for reminder, _ in pending], ordered=False)
+    except BulkWriteError as exc:
+        # Lost a race with a concurrent scheduler (unique index) or hit some
+        # other per-document error; either way the reminder was not created.
+        failed_indexes = {error["index"] for error in exc.details.get("writeErrors", [])}
+
+    events: List[Dict[str, Any]] = []
+    for index, (reminder, patient_name) in enumerate(pending):
+        offset_days = reminder.offset_days
+        if index in failed_indexes:
+            skipped += 1
+            echo(f"  ⏭️  Skipped duplicate: {offset_days} days before for {patient_name}")
+        else:
+            created += 1
+            events.append(
+                new_event(
+                    "reminder_scheduled",
+                    "reminder",
+                    reminder.id,
+                    reminder.appointment_id,
+                    {"offset_days": offset_days, "scheduled_for": reminder.scheduled_for},
+                )
+            )
+            echo(f"  ✅ Scheduled reminder: {offset_days} days before for {patient_name}")
+
+    get_event_sink(db).emit_many(events)
+    return created, skipped
+
+
+def dispatch_due_reminders(
+    db,
+    echo: Callable[[str], None],
+    workers: int = 1,
+    batch_size: int = 100,
+    provider: Optional[SmsProvider] = None,
+    throttle: Optional[DispatchThrottle] = None,
+    retry: Optional[RetryPolicy] = None,
+    lease_seconds: Optional[float] = None,
+    partitions: Optional[List[Optional[int]]] = None,
+) -> Dict[str, int]:
+    """Dispatch due reminders immediately.
 
+    Due reminders are streamed from a cursor in chunks of ``batch_size``. With
+    ``workers > 1`` the chunks are handed to a thread pool, with at most two
+    chunks per worker in flight at any time. Each chunk is claimed with one
+    update that leases its due reminders to this worker for ``lease_seconds``
+    (by default from settings), so concurrent workers and processes never
+    send the same reminder twice; leases left behind by a worker that died
+    are reaped first and their reminders dispatched again.
+
+    Messages go through ``provider``, by default the one configured in
+    settings, paced by ``throttle``'s rate limits; reminders for a number over
+    its per-number limit are deferred until it has capacity rather than sent
+    and failed. Failed sends are retried per ``retry`` (by default from
+    settings) and dead-lettered once it gives up. Reminders whose appointment
+    was canceled, or is awaiting a reschedule, are canceled instead of sent,
+    as are reminders whose patient's quiet hours last until the appointment.
+
+    ``partitions`` restricts the run to reminders in those partitions (see
+    ``PartitionMembership.partition_filter``); by default all are dispatched.
+
+    Returns the run's counts: ``seen``, ``dispatched``, ``failed``,
+    ``deferred`` and ``canceled``.
+    """
+    lease = timedelta(seconds=lease_seconds or get_settings().dispatch_lease_seconds)
+    reaped = reap_expired_leases(db, lease)
+    if reaped:
+        echo(f"♻️  Returned {reaped} reminders with expired dispatch leases to the queue")
+
+    due_query: Dict[str, Any] = {
+        "scheduled_for": {"$lte": datetime.utcnow()},
+        "status": {"$in": list(DISPATCHABLE_STATUSES)},
+    }
+    if partitions is not None:
+        due_query["partition"] = {"$in": partitions}
+    due_reminders = db.reminders.find(
+        due_query,
+        projection=Reminder.projection("id", "appointment_id", "offset_days", "status", "attempts", "dispatched_at"),
+        batch_size=batch_size,
+    )
+    due_reminders = map(Reminder.from_doc, due_reminders)
+
+    echo = _synchronized(echo)
+    provider = provider or get_provider()
+    throttle = throttle or get_throttle(db)
+    retry = retry or RetryPolicy.from_settings(get_settings())
+    window = SendWindow.from_settings(get_settings())
+    stats = StatsAccumulator()
+    try:
+        template = get_template_renderer(db, "default")
+    except TemplateError as exc:
+        echo(f"  ⚠️  Default template does not compile, using built-in message: {exc}")
+        template = None
+    totals = {"seen": 0, "dispatched": 0, "failed": 0, "deferred": 0, "canceled": 0}
+    errors: List[Exception] = []
+
+    def record(seen: int, result: Tuple[int, int, int, int]) -> None:
+        totals["seen"] += seen
+        totals["dispatched"] += result[0]
+        totals["failed"] += result[1]
+        totals["deferred"] += result[2]
+        totals["canceled"] += result[3]
+
+    if workers <= 1:
+        for chunk in chunked(due_reminders, batch_size):
+            record(len(chunk), _dispatch_chunk(db, chunk, template, provider, throttle, retry, window, lease, stats, echo))
+    else:
+        in_flight = threading.BoundedSemaphore(workers * 2)
+        submitted: List[Tuple[Future, int]] = []
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dispatch") as pool:
+            for chunk in chunked(due_reminders, batch_size):
+                in_flight.acquire()
+                future = pool.submit(
+                    _dispatch_chunk, db, chunk, template, provider, throttle, retry, window, lease, stats, echo
+                )
+                future.add_done_callback(lambda _future: in_flight.release())
+                submitted.append((future, len(chunk)))
+        # Results are collected here, not in done callbacks, where an
+        # exception would only be logged: a chunk that fails fails the run,
+        # after the others have finished and been counted.
+        for future, seen in submitted:
             try:
-                db.reminders.insert_one(reminder)
-                reminders_created += 1
-                echo(f"  ✅ Scheduled reminder: {offset_days} days before for {patient['full_name']}")
-            except Exception:
-                reminders_skipped += 1
-                echo(f"  ⏭️  Skipped duplicate: {offset_days} days before for {patient['full_name']}")
+                record(seen, future.result())
+            except Exception as exc:
+                echo(f"  ❌ A chunk of {seen} reminders failed: {exc}")
+                errors.append(exc)
+    get_event_sink(db).flush()
 
-    echo(f"📅 Summary: Created {reminders_created} reminders, skipped {reminders_skipped}")
+    if not totals["seen"] and not errors:
+        echo("No due reminders to dispatch")
+        return totals
+
+    summary = f"🚀 Dispatch complete: {totals['dispatched']} sent, {totals['failed']} failed"
+    if totals["deferred"]:
+        summary += f", {totals['deferred']} deferred by rate limits or quiet hours"
+    if totals["canceled"]:
+        summary += f", {totals['canceled']} canceled for inactive appointments or quiet hours"
+    if errors:
+        summary += f", {len(errors)} chunks failed"
+    echo(summary)
+    if errors:
+        raise errors[0]
+    return totals
+
+
+def next_due_at(db, partitions: Optional[List[Optional[int]]] = None) -> Optional[datetime]:
+    """Return when the dispatcher next has work.
+
+    That is the earliest ``scheduled_for`` among dispatchable reminders (in
+    ``partitions``, if given), or the earliest dispatch lease expiry if that
+    comes first.
+    """
+    query: Dict[str, Any] = {"status": {"$in": list(DISPATCHABLE_STATUSES)}}
+    if partitions is not None:
+        query["partition"] = {"$in": partitions}
+    reminder = db.reminders.find_one(
+        query,
+        projection={"_id": 0, "scheduled_for": 1},
+        sort=[("scheduled_for", 1)],
+    )
+    claimed = db.reminders.find_one(
+        {"status": "dispatched", "lease_expires_at": {"$type": "date"}},
+        projection={"_id": 0, "lease_expires_at": 1},
+        sort=[("lease_expires_at", 1)],
+    )
+    candidates = [
+        *([reminder["scheduled_for"]] if reminder else []),
+        *([claimed["lease_expires_at"]] if claimed else []),
+    ]
+    return min(candidates) if candidates else None
+
+
+def cancel_pending_reminders(
+    db,
+    appointment_ids: List[str],
+    reason: str,
+    session: Optional[ClientSession] = None,
+) -> int:
+    """Cancel the unsent reminders of ``appointment_ids``; return how many.
 
+    Reminders not yet attempted are canceled with one ``update_many`` keyed
+    by ``appointment_id``. Failed ones awaiting a retry have their last
+    attempt counted in the rollups, so they go through
+    ``_update_retracting_outcomes``. Reminders already claimed by a
+    dispatcher are left to finish; the claim itself skips canceled ones.
+    """
+    if not appointment_ids:
+        return 0
+    now = datetime.utcnow()
+    cancel = {"$set": {"status": "canceled", "cancel_reason": reason, "canceled_at": now, "updated_at": now}}
+    canceled = db.reminders.update_many(
+        {"appointment_id": {"$in": appointment_ids}, "status": "scheduled"}, cancel, session=session
+    ).modified_count
 
-def dispatch_due_reminders(db, echo: Callable[[str], None]) -> None:
-    """Dispatch due reminders immediately."""
-    due_reminders: List[Dict[str, Any]] = list(
+    failed = [
+        Reminder.from_doc(doc)
+        for doc in db.reminders.find(
+            {"appointment_id": {"$in": appointment_ids}, "status": "failed"},
+            projection=Reminder.projection("id", "appointment_id", "offset_days", "status", "dispatched_at"),
+            session=session,
+        )
+    ]
+    if failed:
+        appointments = {
+            appointment.id: appointment
+            for appointment in map(
+                Appointment.from_doc,
+                db.appointments.find(
+                    {"id": {"$in": list({reminder.appointment_id for reminder in failed})}},
+                    projection=Appointment.projection("id", "provider", "location"),
+                    session=session,
+                ),
+            )
+        }
+        canceled += _update_retracting_outcomes(
+            db, [(reminder, cancel) for reminder in failed], appointments, session
+        )
+    return canceled
+
+
+def retime_reminders(
+    db,
+    appointment: Appointment,
+    tz: Optional[str],
+    window: SendWindow,
+    session: Optional[ClientSession] = None,
+) -> Tuple[int, int]:
+    """Recompute the send times of ``appointment``'s reminders after it moved.
+
+    Each re-timable reminder (see ``RETIMABLE_STATUSES``) is scheduled afresh
+    for the same offset before the new ``start_at``. If that time has already
+    passed, a pending reminder is canceled and a sent or canceled one is left
+    as it is. Outcomes the changed reminders had are taken out of the
+    rollups (see ``_update_retracting_outcomes``). Offsets with no reminder
+    yet are left to ``schedule_reminders``. Returns the ``(retimed,
+    canceled)`` counts.
+    """
+    now = datetime.utcnow()
+    local_start = to_local(appointment.start_at, tz)
+    updates: List[Tuple[Reminder, Dict[str, Any]]] = []
+    canceled = 0
+    for reminder in map(
+        Reminder.from_doc,
         db.reminders.find(
-            {
-                "scheduled_for": {"$lte": datetime.utcnow()},
-                "status": "scheduled",
-            }
+            {"appointment_id": appointment.id, "status": {"$in": list(RETIMABLE_STATUSES)}},
+            projection=Reminder.projection("id", "appointment_id", "offset_days", "status", "dispatched_at"),
+            session=session,
+        ),
+    ):
+        local_send = window.send_time(
+            local_start - timedelta(days=reminder.offset_days), f"{appointment.id}:{reminder.offset_days}", local_start
         )
+        scheduled_for = to_utc(local_send, tz)
+        if scheduled_for < now:
+            if reminder.status not in DISPATCHABLE_STATUSES:
+                continue
+            update: Dict[str, Any] = {
+                "$set": {
+                    "status": "canceled",
+                    "cancel_reason": "send_time_passed",
+                    "canceled_at": now,
+                    "updated_at": now,
+                }
+            }
+            canceled += 1
+        else:
+            update = {
+                "$set": {"status": "scheduled", "scheduled_for": scheduled_for, "attempts": 0, "updated_at": now},
+                "$unset": {field: "" for field in _RESET_ON_RETIME},
+            }
+        updates.append((reminder, update))
+    _update_retracting_outcomes(db, updates, {appointment.id: appointment}, session)
+    return len(updates) - canceled, canceled
+
+
+def _update_retracting_outcomes(
+    db,
+    updates: List[Tuple[Reminder, Dict[str, Any]]],
+    appointments: Dict[str, Appointment],
+    session: Optional[ClientSession],
+) -> int:
+    """Apply each ``(reminder, update)`` unless the reminder changed since it was read; return how many applied.
+
+    Updates are guarded on the reminder's status and ``dispatched_at``.
+    Reminders without a dispatch outcome are updated with one bulk write;
+    ones leaving ``delivered`` or ``failed`` are updated one at a time, so
+    exactly the outcomes that were overwritten are retracted from the
+    rollups.
+    """
+    stats = StatsAccumulator()
+    bulk: List[UpdateOne] = []
+    applied = 0
+    for reminder, update in updates:
+        guard = {"id": reminder.id, "status": reminder.status, "dispatched_at": reminder.dispatched_at}
+        if reminder.status in OUTCOME_STATUSES and reminder.dispatched_at:
+            if db.reminders.update_one(guard, update, session=session).modified_count:
+                appointment = appointments.get(reminder.appointment_id) or Appointment(id=reminder.appointment_id)
+                stats.retract(reminder, appointment)
+                applied += 1
+        else:
+            bulk.append(UpdateOne(guard, update))
+    if bulk:
+        applied += db.reminders.bulk_write(bulk, ordered=False, session=session).modified_count
+    stats.flush(db, session=session)
+    return applied
+
+
+def reap_expired_leases(db, lease: timedelta) -> int:
+    """Return reminders whose dispatch lease expired to the queue; return how many.
+
+    A lease expires when its worker died or stalled mid-send. The reminder
+    goes back to the status it was claimed from, due immediately, so it is
+    sent again: delivery is at least once. Reminders left ``dispatched``
+    without a lease (claimed before leases existed) are reaped once they are
+    older than ``lease``.
+    """
+    now = datetime.utcnow()
+    result = db.reminders.update_many(
+        {
+            "status": "dispatched",
+            "$or": [
+                {"lease_expires_at": {"$lte": now}},
+                {"lease_expires_at": {"$exists": False}, "dispatched_at": {"$lte": now - lease}},
+            ],
+        },
+        [
+            {
+                "$set": {
+                    "status": {"$ifNull": ["$claimed_from.status", "scheduled"]},
+                    "dispatched_at": "$claimed_from.dispatched_at",
+                    "scheduled_for": now,
+                    "last_error": "Dispatch lease expired",
+                    "updated_at": now,
+                }
+            },
+            {"$unset": list(_CLAIM_FIELDS)},
+        ],
     )
+    return result.modified_count
 
-    if not due_reminders:
-        echo("No due reminders to dispatch")
-        return
 
-    dispatched = 0
-    failed = 0
+class _Claim:
+    """A chunk of reminders leased to this worker under one claim token.
 
-    for reminder in due_reminders:
-        try:
-            result = db.reminders.update_one(
-                {
-                    "id": reminder["id"],
-                    "status": "scheduled",
-                },
+    Claiming is two round trips however large the chunk: one ``update_many``
+    that leases every still-due reminder in it, and one indexed read of the
+    token to learn which ones this worker won. The pre-claim status and
+    ``dispatched_at`` are kept in ``claimed_from`` so a reaped reminder can
+    be put back exactly as it was.
+    """
+
+    def __init__(self, lease: timedelta) -> None:
+        self.token = str(uuid.uuid4())
+        self.lease = lease
+        self.claimed_at = datetime.utcnow()
+        self._renewed_at = self.claimed_at
+
+    def acquire(self, db, reminder_ids: List[str]) -> Set[str]:
+        """Lease the still-due reminders among ``reminder_ids``; return the ids claimed."""
+        if not reminder_ids:
+            return set()
+        now = self.claimed_at = self._renewed_at = datetime.utcnow()
+        db.reminders.update_many(
+            {
+                "id": {"$in": reminder_ids},
+                "status": {"$in": list(DISPATCHABLE_STATUSES)},
+                "scheduled_for": {"$lte": now},
+            },
+            [
                 {
                     "$set": {
+                        "claimed_from": {"status": "$status", "dispatched_at": "$dispatched_at"},
                         "status": "dispatched",
-                        "dispatched_at": datetime.utcnow(),
+                        "claim_token": self.token,
+                        "claimed_by": _worker_id(),
+                        "lease_expires_at": now + self.lease,
+                        "dispatched_at": now,
+                        "attempts": {"$add": [{"$ifNull": ["$attempts", 0]}, 1]},
+                        "updated_at": now,
+                    }
+                }
+            ],
+        )
+        return {
+            reminder["id"]
+            for reminder in db.reminders.find({"claim_token": self.token}, projection={"_id": 0, "id": 1})
+        }
+
+    def renew_if_due(self, db) -> None:
+        """Extend the lease on unacknowledged reminders once half of it has passed."""
+        now = datetime.utcnow()
+        if now - self._renewed_at < self.lease / 2:
+            return
+        db.reminders.update_many(
+            {"claim_token": self.token},
+            {"$set": {"lease_expires_at": now + self.lease, "updated_at": now}},
+        )
+        self._renewed_at = now
+
+    def ack(self, db, reminder_id: str, fields: Dict[str, Any]) -> bool:
+        """Apply a reminder's outcome and release it; False if the lease was lost."""
+        result = db.reminders.update_one(
+            {"id": reminder_id, "claim_token": self.token},
+            {
+                "$set": {**fields, "updated_at": datetime.utcnow()},
+                "$unset": {field: "" for field in _CLAIM_FIELDS},
+            },
+        )
+        return result.modified_count == 1
+
+    def release(self, db, reminder_id: str, until: datetime) -> bool:
+        """Put a reminder back as it was claimed from, due at ``until``; False if the lease was lost."""
+        result = db.reminders.update_one(
+            {"id": reminder_id, "claim_token": self.token},
+            [
+                {
+                    "$set": {
+                        "status": {"$ifNull": ["$claimed_from.status", "scheduled"]},
+                        "dispatched_at": "$claimed_from.dispatched_at",
+                        "attempts": {"$subtract": ["$attempts", 1]},
+                        "scheduled_for": until,
                         "updated_at": datetime.utcnow(),
-                    },
-                    "$inc": {"attempts": 1},
+                    }
                 },
+                {"$unset": list(_CLAIM_FIELDS)},
+            ],
+        )
+        return result.modified_count == 1
+
+
+def _defer(db, reminder: Reminder, until: datetime) -> None:
+    """Re-time a reminder that is not to be sent yet, unless it was claimed meanwhile."""
+    db.reminders.update_one(
+        {"id": reminder.id, "status": {"$in": list(DISPATCHABLE_STATUSES)}},
+        {"$set": {"scheduled_for": until, "updated_at": datetime.utcnow()}},
+    )
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _dispatch_chunk(
+    db,
+    reminders: List[Reminder],
+    template: Optional[CompiledTemplate],
+    provider: SmsProvider,
+    throttle: DispatchThrottle,
+    retry: RetryPolicy,
+    window: SendWindow,
+    lease: timedelta,
+    stats: StatsAccumulator,
+    echo: Callable[[str], None],
+) -> Tuple[int, int, int, int]:
+    """Claim, render, send and acknowledge one chunk of due reminders.
+
+    Reminders of inactive appointments are canceled, with one update per
+    appointment status. Reminders due during the patient's quiet hours are
+    re-timed instead of claimed, or canceled if the window next opens after
+    the appointment starts; the rest are claimed together under one lease.
+    A claimed reminder whose number is over its per-number limit is released
+    and re-timed. The others are sent in provider-sized batches, each
+    admitted by ``throttle`` first, renewing the lease as needed. Acknowledgements only
+    apply while the lease is held. Failures are re-timed per ``retry`` or
+    dead-lettered; reminders whose message does not render are dead-lettered
+    at once. Outcomes are added to the delivery rollups, and their
+    events written, once the chunk is done.
+    Returns the ``(dispatched, failed, deferred, canceled)`` counts for the chunk.
+    """
+    try:
+        appointments: Dict[str, Appointment] = {
+            appointment.id: appointment
+            for appointment in map(
+                Appointment.from_doc,
+                db.appointments.find(
+                    {"id": {"$in": list({reminder.appointment_id for reminder in reminders})}},
+                    projection=Appointment.projection("id", "patient_id", "start_at", "provider", "location", "status"),
+                ),
             )
+        }
+        patients: Dict[str, Patient] = {
+            patient.id: patient
+            for patient in map(
+                Patient.from_doc,
+                db.patients.find(
+                    {"id": {"$in": list({appointment.patient_id for appointment in appointments.values()})}},
+                    projection=Patient.projection("id", "full_name", "phone_e164", "tz"),
+                ),
+            )
+        }
+    except Exception as exc:
+        echo(f"  💥 Error loading {len(reminders)} reminders: {str(exc)}")
+        return 0, len(reminders), 0, 0
+
+    dispatched = 0
+    failed = 0
+    deferred = 0
+    canceled = 0
+    events: List[Dict[str, Any]] = []
+    candidates: List[Reminder] = []
+    inactive: Dict[str, Set[str]] = {}
+
+    for reminder in reminders:
+        try:
+            appointment = appointments.get(reminder.appointment_id)
+            if appointment and appointment.status in INACTIVE_APPOINTMENT_STATUSES:
+                inactive.setdefault(appointment.status, set()).add(appointment.id)
+                canceled += 1
+                continue
+            patient = patients.get(appointment.patient_id) if appointment else None
+            if patient:
+                opens = window.next_open(
+                    to_local(datetime.utcnow(), patient.tz),
+                    f"{reminder.appointment_id}:{reminder.offset_days}",
+                )
+                if opens and appointment.start_at and to_utc(opens, patient.tz) >= appointment.start_at:
+                    # Quiet hours last until the appointment: too late to remind.
+                    now = datetime.utcnow()
+                    cancel = {
+                        "$set": {
+                            "status": "canceled",
+                            "cancel_reason": "quiet_hours_until_start",
+                            "canceled_at": now,
+                            "updated_at": now,
+                        }
+                    }
+                    canceled += _update_retracting_outcomes(db, [(reminder, cancel)], appointments, None)
+                    echo(
+                        f"  🚫 Canceled reminder {reminder.id[:8]}: quiet hours for {patient.phone_e164} "
+                        f"last until the appointment"
+                    )
+                    continue
+                if opens:
+                    _defer(db, reminder, to_utc(opens, patient.tz))
+                    echo(
+                        f"  🌙 Deferred reminder {reminder.id[:8]} to {opens:%Y-%m-%d %H:%M} "
+                        f"local time: quiet hours for {patient.phone_e164}"
+                    )
+                    deferred += 1
+                    continue
+            candidates.append(reminder)
+        except Exception as exc:
+            echo(f"  💥 Error processing reminder {reminder.id[:8]}: {str(exc)}")
+            failed += 1
+
+    for status, appointment_ids in inactive.items():
+        try:
+            count = cancel_pending_reminders(db, list(appointment_ids), f"appointment_{status}")
+            echo(f"  🚫 Canceled {count} reminders of {len(appointment_ids)} appointments now {status}")
+        except PyMongoError as exc:
+            echo(f"  💥 Error canceling reminders of {status} appointments: {str(exc)}")
+
+    claim = _Claim(lease)
+    try:
+        claimed = claim.acquire(db, [reminder.id for reminder in candidates])
+    except PyMongoError as exc:
+        echo(f"  💥 Error claiming {len(candidates)} reminders: {str(exc)}")
+        return 0, failed + len(candidates), deferred, canceled
 
-            if result.modified_count == 0:
-                echo(f"  ⏭️  Reminder {reminder['id'][:8]} already claimed by another process")
+    outbox: List[Tuple[Reminder, Appointment, Patient, str]] = []
+    for reminder in candidates:
+        try:
+            if reminder.id not in claimed:
+                echo(f"  ⏭️  Reminder {reminder.id[:8]} already claimed by another process")
                 continue
 
-            appointment = db.appointments.find_one({"id": reminder["appointment_id"]})
-            if not appointment:
-                echo(f"  ❌ Appointment not found for reminder {reminder['id'][:8]}")
+            appointment = appointments.get(reminder.appointment_id)
+            patient = patients.get(appointment.patient_id) if appointment else None
+            if not appointment or not patient:
+                error = "Appointment not found" if not appointment else "Patient not found"
+                echo(f"  ❌ {error} for reminder {reminder.id[:8]}, dead-lettered")
+                attempts = reminder.attempts + 1
+                permanent = SendResult(reminder.id, False, error=error, retryable=False)
+                _dead_letter(db, reminder, None, attempts, permanent, claim)
+                events.append(
+                    new_event(
+                        "reminder_dead_lettered",
+                        "reminder",
+                        reminder.id,
+                        reminder.appointment_id,
+                        {"error": error, "attempts": attempts},
+                    )
+                )
                 failed += 1
                 continue
 
-            patient = db.patients.find_one({"id": appointment["patient_id"]})
-            if not patient:
-                echo(f"  ❌ Patient not found for reminder {reminder['id'][:8]}")
+            try:
+                message = _render_message(template, patient, appointment)
+            except Exception as exc:
+                # The reminder is claimed: it needs an outcome, and a message
+                # that does not render will not render on a retry either.
+                error = f"Could not render message: {type(exc).__name__}: {exc}"
+                attempts = reminder.attempts + 1
+                permanent = SendResult(reminder.id, False, error=error, retryable=False)
+                acked = _dead_letter(db, reminder, patient.phone_e164, attempts, permanent, claim)
+                echo(f"  ☠️  {error} for reminder {reminder.id[:8]}, dead-lettered")
+                if not acked:
+                    echo(f"  ⚠️  Lease on reminder {reminder.id[:8]} expired before it was acknowledged")
+                    continue
+                stats.record(reminder, appointment, "failed", claim.claimed_at)
+                events.append(
+                    new_event(
+                        "reminder_dead_lettered",
+                        "reminder",
+                        reminder.id,
+                        appointment.id,
+                        {"to_phone": patient.phone_e164, "error": error, "attempts": attempts},
+                    )
+                )
                 failed += 1
                 continue
 
-            template = db.templates.find_one({"name": "default"})
-            if template:
-                message = template["body"]
-                message = message.replace("{patient.first_name}", patient["full_name"].split()[0])
-                message = message.replace(
-                    "{appointment.start_local}", appointment["start_at"].strftime("%Y-%m-%d %H:%M")
-                )
-                message = message.replace("{appointment.location}", appointment["location"])
-                message = message.replace("{appointment.provider}", appointment["provider"])
-            else:
-                first_name = patient["full_name"].split()[0]
-                apt_time = appointment["start_at"].strftime("%Y-%m-%d at %H:%M")
-                message = (
-                    f"Hi {first_name}, your appointment with {appointment['provider']} is on "
-                    f"{apt_time} at {appointment['location']}."
-                )
+            # Only a reminder this worker holds takes a send slot for its number.
+            delay = throttle.phone_delay(patient.phone_e164)
+            if delay:
+                if claim.release(db, reminder.id, datetime.utcnow() + timedelta(seconds=delay)):
+                    echo(
+                        f"  ⏳ Deferred reminder {reminder.id[:8]} by {delay:.0f}s: "
+                        f"{patient.phone_e164} is at its rate limit"
+                    )
+                    deferred += 1
+                else:
+                    echo(f"  ⚠️  Lease on reminder {reminder.id[:8]} expired before it was acknowledged")
+                continue
+            outbox.append((reminder, appointment, patient, message))
+
+        except Exception as exc:
+            echo(f"  💥 Error processing reminder {reminder.id[:8]}: {str(exc)}")
+            failed += 1
 
-            success = random.random() > 0.2
+    # Providers with multi-recipient requests get as few requests as their
+    # batch size allows; the throttle admits each request before it is sent.
+    results: List[SendResult] = []
+    for batch in chunked(outbox, provider.max_batch_size):
+        messages = [
+            SmsMessage(patient.phone_e164, message, reminder.id)
+            for reminder, _, patient, message in batch
+        ]
+        try:
+            throttle.acquire(len(messages))
+            claim.renew_if_due(db)
+            results.extend(provider.send_batch(messages))
+        except Exception as exc:
+            results.extend(failed_results(messages, f"{type(exc).__name__}: {exc}"))
 
-            if success:
-                db.reminders.update_one(
-                    {"id": reminder["id"]},
+    for (reminder, appointment, patient, message), sent in zip(outbox, results):
+        try:
+            if sent.success:
+                acked = claim.ack(
+                    db,
+                    reminder.id,
                     {
-                        "$set": {
-                            "status": "delivered",
-                            "delivered_at": datetime.utcnow(),
-                            "updated_at": datetime.utcnow(),
-                        }
+                        "status": "delivered",
+                        "delivered_at": datetime.utcnow(),
+                        "provider_message_id": sent.provider_message_id,
                     },
                 )
-                echo(f"  ✅ Sent to {patient['phone_e164']}: {message[:60]}...")
+                echo(f"  ✅ Sent to {patient.phone_e164}: {message[:60]}...")
+                if not acked:
+                    echo(f"  ⚠️  Lease on reminder {reminder.id[:8]} expired before it was acknowledged")
+                    continue
+                stats.record(reminder, appointment, "delivered", claim.claimed_at)
+                events.append(
+                    new_event(
+                        "reminder_dispatched",
+                        "reminder",
+                        reminder.id,
+                        appointment.id,
+                        {"to_phone": patient.phone_e164, "message_preview": message[:100]},
+                    )
+                )
                 dispatched += 1
             else:
-                backoff_time = datetime.utcnow() + timedelta(minutes=30)
-                db.reminders.update_one(
-                    {"id": reminder["id"]},
-                    {
-                        "$set": {
+                attempts = reminder.attempts + 1
+                if sent.retryable and not retry.exhausted(attempts):
+                    delay = retry.delay(attempts)
+                    acked = claim.ack(
+                        db,
+                        reminder.id,
+                        {
                             "status": "failed",
-                            "last_error": "Simulated delivery failure",
-                            "scheduled_for": backoff_time,
-                            "updated_at": datetime.utcnow(),
-                        }
-                    },
+                            "last_error": sent.error,
+                            "scheduled_for": datetime.utcnow() + timedelta(seconds=delay),
+                        },
+                    )
+                    echo(f"  ❌ Failed to send to {patient.phone_e164} (retry in {delay:.0f}s)")
+                    event_type = "reminder_failed"
+                else:
+                    acked = _dead_letter(db, reminder, patient.phone_e164, attempts, sent, claim)
+                    echo(
+                        f"  ☠️  Failed to send to {patient.phone_e164} after {attempts} attempts, "
+                        f"dead-lettered: {sent.error}"
+                    )
+                    event_type = "reminder_dead_lettered"
+                if not acked:
+                    echo(f"  ⚠️  Lease on reminder {reminder.id[:8]} expired before it was acknowledged")
+                    continue
+                stats.record(reminder, appointment, "failed", claim.claimed_at)
+                events.append(
+                    new_event(
+                        event_type,
+                        "reminder",
+                        reminder.id,
+                        appointment.id,
+                        {
+                            "to_phone": patient.phone_e164,
+                            "error": sent.error,
+                            "attempts": attempts,
+                        },
+                    )
                 )
-                echo(f"  ❌ Failed to send to {patient['phone_e164']} (will retry)")
                 failed += 1
 
         except Exception as exc:
-            echo(f"  💥 Error processing reminder {reminder['id'][:8]}: {str(exc)}")
+            echo(f"  💥 Error processing reminder {reminder.id[:8]}: {str(exc)}")
             failed += 1
 
-    echo(f"🚀 Dispatch complete: {dispatched} sent, {failed} failed")
+    try:
+        get_event_sink(db).emit_many(events)
+    except PyMongoError as exc:
+        echo(f"  ⚠️  Could not record dispatch events: {str(exc)}")
+
+    try:
+        stats.flush(db)
+    except PyMongoError as exc:
+        echo(f"  ⚠️  Could not update delivery stats: {str(exc)}")
+
+    return dispatched, failed, deferred, canceled
+
+
+def _dead_letter(
+    db,
+    reminder: Reminder,
+    to_phone: Optional[str],
+    attempts: int,
+    sent: SendResult,
+    claim: "_Claim",
+) -> bool:
+    """Record a terminal send failure in ``dead_letters`` and mark the reminder ``dead``.
+
+    The dead letter is written first, so a crash in between leaves the
+    reminder claimed (and later reaped) rather than dead without a trace.
+    If the claim's lease had already expired, the reminder belongs to
+    another worker now: the letter is deleted again and False returned.
+    """
+    now = datetime.utcnow()
+    letter_id = str(uuid.uuid4())
+    db.dead_letters.insert_one(
+        {
+            "id": letter_id,
+            "reminder_id": reminder.id,
+            "appointment_id": reminder.appointment_id,
+            "offset_days": reminder.offset_days,
+            "to_phone": to_phone,
+            "attempts": attempts,
+            "reason": "permanent_failure" if not sent.retryable else "max_attempts",
+            "last_error": sent.error,
+            "replayed_at": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+    )
+    if claim.ack(db, reminder.id, {"status": "dead", "last_error": sent.error, "dead_at": now}):
+        return True
+    db.dead_letters.delete_one({"id": letter_id})
+    return False
+
+
+def _render_message(
+    template: Optional[CompiledTemplate],
+    patient: Patient,
+    appointment: Appointment,
+) -> str:
+    """Render the SMS body for a reminder."""
+    if template:
+        return template.render(build_context(template.variables, patient, appointment))
+
+    apt_time = to_local(appointment.start_at, patient.tz).strftime("%Y-%m-%d at %H:%M")
+    return (
+        f"Hi {patient.first_name}, your appointment with {appointment.provider} is on "
+        f"{apt_time} at {appointment.location}."
+    )
+
+
+def _synchronized(echo: Callable[[str], None]) -> Callable[[str], None]:
+    """Wrap ``echo`` so lines from concurrent workers do not interleave."""
+    lock = threading.Lock()
+
+    def locked_echo(message: str) -> None:
+        with lock:
+            echo(message)
 
+    return locked_echo
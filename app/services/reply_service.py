@@ -1,136 +1,426 @@
 import os
 import csv
-import uuid
+import time
+from collections import Counter
 from datetime import datetime
-from typing import Callable, Dict, Any, List
+from typing import BinaryIO, Callable, Dict, Any, Iterator, List, Optional, Set, Tuple
 
-from app.utils.classification import classify_reply_intent
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
+from app.services.checkpoint_service import checkpoint_key, load_checkpoint, save_checkpoint
+from app.services.event_service import get_event_sink, new_event, record_events
+from app.services.reminder_service import INACTIVE_APPOINTMENT_STATUSES, cancel_pending_reminders
+from app.utils.batching import chunked
+from app.utils.classification import classify_batch
 
-def process_replies(db, file_path: str, classify: bool, echo: Callable[[str], None]) -> None:
-    """Import and process replies from CSV."""
+REQUIRED_FIELDS = ["from", "to", "message", "received_at"]
+DUPLICATE_KEY_ERROR = 11000
+
+
+class _OffsetLines:
+    """Iterate decoded lines of a binary file, tracking the byte offset.
+
+    ``csv.reader`` pulls exactly the lines of the record it is parsing, so
+    after each yielded row ``offset`` is where the next record starts.
+    """
+
+    def __init__(self, handle: BinaryIO, encoding: str = "utf-8") -> None:
+        self.handle = handle
+        self.encoding = encoding
+        self.offset = handle.tell()
+
+    def __iter__(self) -> Iterator[str]:
+        return self
+
+    def __next__(self) -> str:
+        line = self.handle.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode(self.encoding)
+
+
+def process_replies(
+    db,
+    file_path: str,
+    classify: bool,
+    echo: Callable[[str], None],
+    chunk_size: int = 1000,
+    verbose: bool = True,
+    resume: bool = True,
+) -> None:
+    """Import and process replies from CSV.
+
+    The file is streamed ``chunk_size`` rows at a time, so memory stays
+    bounded regardless of file size. Each chunk resolves its patients and
+    their latest scheduled appointments in bulk and writes events and status
+    changes with one unordered bulk write apiece. Per-row lines are printed
+    only when ``verbose``.
+
+    Replies that cancel an appointment or ask to reschedule it cancel the
+    appointment's pending reminders, so they are not sent for a slot the
+    patient will not attend.
+
+    Imports are exactly-once on the CSV ``event_id`` column, and a checkpoint
+    (byte offset and row count) is stored after every chunk; with ``resume``
+    an interrupted import of the same file continues where it stopped. A
+    reply recorded by a run that stopped before writing its status change
+    keeps the change pending, and the next run applies it.
+    """
     if not os.path.exists(file_path):
         echo(f"❌ File not found: {file_path}")
         return
 
-    processed = 0
-    classified = 0
-    errors = 0
-
-    with open(file_path, "r", encoding="utf-8") as file:
-        reader = csv.DictReader(file)
-
-        for row_num, row in enumerate(reader, 1):
-            try:
-                if not all(field in row for field in ["from", "to", "message", "received_at"]):
-                    echo(f"  ❌ Row {row_num}: Missing required fields")
-                    errors += 1
-                    continue
-
-                received_at = datetime.fromisoformat(row["received_at"].replace("Z", "+00:00"))
-
-                patient = db.patients.find_one({"phone_e164": row["from"]})
-                if not patient:
-                    echo(f"  ❌ Row {row_num}: Patient not found for phone {row['from']}")
-                    errors += 1
-                    continue
-
-                appointments: List[Dict[str, Any]] = list(
-                    db.appointments.find(
-                        {
-                            "patient_id": patient["id"],
-                            "status": "scheduled",
-                        }
-                    )
-                )
-
-                if not appointments:
-                    echo(f"  ❌ Row {row_num}: No scheduled appointments found for patient")
-                    errors += 1
-                    continue
-
-                appointment = max(appointments, key=lambda x: x["start_at"])
-
-                intent = classify_reply_intent(row["message"])
-                confidence = "high" if intent != "unknown" else "low"
-
-                event = {
-                    "id": str(uuid.uuid4()),
-                    "occurred_at": datetime.utcnow(),
-                    "type": "reply_received",
-                    "entity_type": "appointment",
-                    "entity_id": appointment["id"],
-                    "payload": {
-                        "from_phone": row["from"],
-                        "to_phone": row["to"],
-                        "message": row["message"],
-                        "received_at": received_at.isoformat(),
-                        "classification": {
-                            "intent": intent,
-                            "confidence": confidence,
-                        },
+    key = checkpoint_key("replies", file_path)
+    checkpoint = load_checkpoint(db, key) if resume else None
+    if checkpoint and checkpoint.get("completed"):
+        echo(f"ℹ️  {file_path} was already imported ({checkpoint['rows']} rows); use --no-resume to re-run")
+        return
+
+    row_echo: Optional[Callable[[str], None]] = echo if verbose else None
+    totals: Counter = Counter()
+    rows = checkpoint["rows"] if checkpoint else 0
+    started_rows = rows
+    started = time.perf_counter()
+
+    with open(file_path, "rb") as file:
+        fieldnames = None
+        if checkpoint:
+            file.seek(checkpoint["offset"])
+            fieldnames = checkpoint["fieldnames"]
+            echo(f"⏩ Resuming {file_path} after row {rows}")
+
+        lines = _OffsetLines(file)
+        reader = csv.DictReader(lines, fieldnames=fieldnames)
+
+        for chunk in chunked(enumerate(reader, rows + 1), chunk_size):
+            offset = lines.offset
+            totals.update(_process_reply_chunk(db, chunk, classify, row_echo))
+            # The chunk's events are written before its checkpoint.
+            get_event_sink(db).flush()
+            rows += len(chunk)
+            save_checkpoint(
+                db,
+                key,
+                file_path=file_path,
+                fieldnames=reader.fieldnames,
+                offset=offset,
+                rows=rows,
+                completed=False,
+            )
+
+            if len(chunk) == chunk_size:
+                elapsed = time.perf_counter() - started
+                echo(f"  … {rows} rows ({(rows - started_rows) / elapsed:,.0f} rows/s)")
+
+        save_checkpoint(db, key, file_path=file_path, rows=rows, completed=True)
+
+    elapsed = time.perf_counter() - started
+    rate = (rows - started_rows) / elapsed if elapsed > 0 else 0.0
+    echo(
+        f"📥 Import complete: {totals['processed']} processed, {totals['classified']} status changes, "
+        f"{totals['duplicates']} duplicates, {totals['errors']} errors ({rate:,.0f} rows/s)"
+    )
+    if totals["reminders_canceled"]:
+        echo(f"🚫 Canceled {totals['reminders_canceled']} pending reminders of canceled or rescheduling appointments")
+
+
+def _process_reply_chunk(
+    db,
+    rows: List[Tuple[int, Dict[str, str]]],
+    classify: bool,
+    echo: Optional[Callable[[str], None]],
+) -> Counter:
+    """Process one chunk of ``(row_num, row)`` pairs.
+
+    Returns counts of ``processed``, ``classified`` (status changes),
+    ``reminders_canceled``, ``duplicates`` and ``errors`` for the chunk.
+    """
+    echo = echo or (lambda _message: None)
+    counts: Counter = Counter()
+
+    valid: List[Tuple[int, Dict[str, str], datetime]] = []
+    for row_num, row in rows:
+        if not all(row.get(field) is not None for field in REQUIRED_FIELDS):
+            echo(f"  ❌ Row {row_num}: Missing required fields")
+            counts["errors"] += 1
+            continue
+        try:
+            received_at = datetime.fromisoformat(row["received_at"].replace("Z", "+00:00"))
+        except ValueError as exc:
+            echo(f"  ❌ Row {row_num}: Error - {str(exc)}")
+            counts["errors"] += 1
+            continue
+        valid.append((row_num, row, received_at))
+
+    # Exactly-once on event_id: drop rows already imported (by an earlier run)
+    # or repeated within this chunk before touching anything else.
+    event_ids = [row["event_id"] for _, row, _ in valid if row.get("event_id")]
+    seen: Dict[str, Dict[str, Any]] = {
+        event["source_event_id"]: event
+        for event in db.events.find(
+            {"source_event_id": {"$in": event_ids}},
+            projection={"_id": 0, "id": 1, "appointment_id": 1, "source_event_id": 1, "pending_status_change": 1},
+        )
+    } if event_ids else {}
+
+    fresh: List[Tuple[int, Dict[str, str], datetime]] = []
+    # Status changes of replies imported by a run that stopped before
+    # writing them: (reply event id, status update, status event).
+    resumed: List[Tuple[str, UpdateOne, Dict[str, Any]]] = []
+    # The version each planned status change leaves its appointment at.
+    next_versions: Dict[str, int] = {}
+    for row_num, row, received_at in valid:
+        event_id = row.get("event_id")
+        if event_id:
+            if event_id in seen:
+                pending = seen[event_id].get("pending_status_change")
+                if pending:
+                    appointment_id = seen[event_id]["appointment_id"]
+                    resumed.append((seen[event_id]["id"], *_status_change(appointment_id, **pending)))
+                    next_versions[appointment_id] = (pending["version"] or 0) + 1
+                    echo(f"  ↩️  Row {row_num}: Applying the status change of already imported event {event_id}")
+                    seen[event_id] = {}
+                else:
+                    echo(f"  ⏭️  Row {row_num}: Duplicate event {event_id}")
+                counts["duplicates"] += 1
+                continue
+            seen[event_id] = {}
+        fresh.append((row_num, row, received_at))
+
+    if not fresh and not resumed:
+        return counts
+
+    patients: Dict[str, Dict[str, Any]] = {
+        patient["phone_e164"]: patient
+        for patient in db.patients.find(
+            {"phone_e164": {"$in": list({row["from"] for _, row, _ in fresh})}},
+            projection={"_id": 0, "id": 1, "full_name": 1, "phone_e164": 1},
+        )
+    }
+
+    # Scheduled appointments per patient, latest first. Rows are applied in
+    # file order, so a status change pops the head and a later reply from the
+    # same patient lands on their next scheduled appointment, as it would have
+    # if every row were processed on its own.
+    scheduled: Dict[str, List[Dict[str, Any]]] = {
+        group["_id"]: group["appointments"]
+        for group in db.appointments.aggregate(
+            [
+                {
+                    "$match": {
+                        "patient_id": {"$in": [patient["id"] for patient in patients.values()]},
+                        "status": "scheduled",
+                    }
+                },
+                {"$sort": {"start_at": -1}},
+                {
+                    "$group": {
+                        "_id": "$patient_id",
+                        "appointments": {"$push": {"id": "$id", "status": "$status", "version": "$version"}},
+                    }
+                },
+            ]
+        )
+    }
+
+    intents = classify_batch([row["message"] for _, row, _ in fresh])
+    # One entry per accepted row: (row_num, reply event, status update, status event).
+    planned: List[Tuple[int, Dict[str, Any], Optional[UpdateOne], Optional[Dict[str, Any]]]] = []
+
+    for (row_num, row, received_at), intent in zip(fresh, intents):
+        try:
+            patient = patients.get(row["from"])
+            if not patient:
+                echo(f"  ❌ Row {row_num}: Patient not found for phone {row['from']}")
+                counts["errors"] += 1
+                continue
+
+            appointments = scheduled.get(patient["id"])
+            if not appointments:
+                echo(f"  ❌ Row {row_num}: No scheduled appointments found for patient")
+                counts["errors"] += 1
+                continue
+
+            appointment = appointments[0]
+            confidence = "high" if intent != "unknown" else "low"
+
+            event = new_event(
+                "reply_received",
+                "appointment",
+                appointment["id"],
+                appointment["id"],
+                {
+                    "from_phone": row["from"],
+                    "to_phone": row["to"],
+                    "message": row["message"],
+                    "received_at": received_at.isoformat(),
+                    "classification": {
+                        "intent": intent,
+                        "confidence": confidence,
                     },
-                    "trace_id": str(uuid.uuid4()),
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow(),
-                }
-                db.events.insert_one(event)
-
-                if classify and intent != "unknown":
-                    old_status = appointment["status"]
-                    new_status = old_status
-
-                    if intent == "confirmed" and old_status == "scheduled":
-                        new_status = "confirmed"
-                    elif intent == "cancel" and old_status == "scheduled":
-                        new_status = "canceled"
-                    elif intent == "reschedule" and old_status == "scheduled":
-                        new_status = "reschedule_requested"
-
-                    if new_status != old_status:
-                        db.appointments.update_one(
-                            {"id": appointment["id"]},
-                            {
-                                "$set": {
-                                    "status": new_status,
-                                    "updated_at": datetime.utcnow(),
-                                    "version": appointment["version"] + 1,
-                                }
-                            },
-                        )
-
-                        status_event = {
-                            "id": str(uuid.uuid4()),
-                            "occurred_at": datetime.utcnow(),
-                            "type": "status_changed",
-                            "entity_type": "appointment",
-                            "entity_id": appointment["id"],
-                            "payload": {
-                                "previous_status": old_status,
-                                "new_status": new_status,
-                                "reason": "reply_classification",
-                            },
-                            "trace_id": str(uuid.uuid4()),
-                            "created_at": datetime.utcnow(),
-                            "updated_at": datetime.utcnow(),
-                        }
-                        db.events.insert_one(status_event)
-
-                        classified += 1
-                        echo(
-                            f"  ✅ Row {row_num}: {patient['full_name']} - {intent} "
-                            f"→ {old_status}→{new_status}"
-                        )
-                    else:
-                        echo(f"  ℹ️  Row {row_num}: {patient['full_name']} - {intent} (no status change)")
+                },
+            )
+            if row.get("event_id"):
+                event["source_event_id"] = row["event_id"]
+
+            status_update: Optional[UpdateOne] = None
+            status_event: Optional[Dict[str, Any]] = None
+
+            if classify and intent != "unknown":
+                old_status = appointment["status"]
+                new_status = old_status
+
+                if intent == "confirmed" and old_status == "scheduled":
+                    new_status = "confirmed"
+                elif intent == "cancel" and old_status == "scheduled":
+                    new_status = "canceled"
+                elif intent == "reschedule" and old_status == "scheduled":
+                    new_status = "reschedule_requested"
+
+                if new_status != old_status:
+                    change = {"previous_status": old_status, "new_status": new_status, "version": appointment.get("version")}
+                    # Cleared once the change is written, so a re-run after a
+                    # crash in between applies it instead of skipping the row.
+                    event["pending_status_change"] = change
+                    status_update, status_event = _status_change(appointment["id"], **change)
+                    next_versions[appointment["id"]] = (change["version"] or 0) + 1
+                    appointments.pop(0)
+
+                    echo(
+                        f"  ✅ Row {row_num}: {patient['full_name']} - {intent} "
+                        f"→ {old_status}→{new_status}"
+                    )
                 else:
-                    echo(f"  ℹ️  Row {row_num}: {patient['full_name']} - {intent} (not classified)")
+                    echo(f"  ℹ️  Row {row_num}: {patient['full_name']} - {intent} (no status change)")
+            else:
+                echo(f"  ℹ️  Row {row_num}: {patient['full_name']} - {intent} (not classified)")
+
+            planned.append((row_num, event, status_update, status_event))
+
+        except Exception as exc:
+            echo(f"  ❌ Row {row_num}: Error - {str(exc)}")
+            counts["errors"] += 1
+
+    if not planned and not resumed:
+        return counts
+
+    # Reply events are written synchronously and first: a row whose event_id
+    # lost a race with a concurrent import (duplicate key) must not apply its
+    # status change. Status events can go through the buffered sink.
+    rejected: Set[int] = set()
+    try:
+        record_events(db, [event for _, event, _, _ in planned])
+    except BulkWriteError as exc:
+        for error in exc.details.get("writeErrors", []):
+            row_num = planned[error["index"]][0]
+            rejected.add(error["index"])
+            if error.get("code") == DUPLICATE_KEY_ERROR:
+                echo(f"  ⏭️  Row {row_num}: Duplicate event {planned[error['index']][1].get('source_event_id')}")
+                counts["duplicates"] += 1
+            else:
+                echo(f"  ❌ Row {row_num}: Error - {error.get('errmsg')}")
+                counts["errors"] += 1
+
+    accepted = [entry for index, entry in enumerate(planned) if index not in rejected]
+    changes = [
+        (event["id"], update, status_event) for _, event, update, status_event in accepted if update is not None
+    ] + resumed
+    status_updates = [update for _, update, _ in changes]
+    status_events = [event for _, _, event in changes]
+    counts["processed"] += len(accepted)
+
+    if status_updates:
+        unwritten: Set[int] = set()
+        try:
+            modified = db.appointments.bulk_write(status_updates, ordered=False).modified_count
+        except BulkWriteError as exc:
+            unwritten = {error["index"] for error in exc.details.get("writeErrors", [])}
+            echo(f"  ❌ {len(unwritten)} status changes could not be written: {str(exc)}")
+            counts["errors"] += len(unwritten)
+            modified = exc.details.get("nModified", 0)
+
+        # Changes that lost a race matched nothing and are settled too; only
+        # those that failed to write stay pending for the next run.
+        db.events.update_many(
+            {"id": {"$in": [event_id for index, (event_id, _, _) in enumerate(changes) if index not in unwritten]}},
+            {"$unset": {"pending_status_change": ""}},
+        )
+
+        if modified < len(status_updates):
+            # Some changes lost a race with another writer and matched
+            # nothing: keep the events of those actually applied.
+            status_events = _applied_status_changes(db, status_events, next_versions)
+
+        inactive: Dict[str, List[str]] = {}
+        for event in status_events:
+            if event["payload"]["new_status"] in INACTIVE_APPOINTMENT_STATUSES:
+                inactive.setdefault(event["payload"]["new_status"], []).append(event["appointment_id"])
+        for status, appointment_ids in inactive.items():
+            counts["reminders_canceled"] += cancel_pending_reminders(db, appointment_ids, f"appointment_{status}")
+
+    counts["classified"] += len(status_events)
+
+    get_event_sink(db).emit_many(status_events)
+
+    return counts
+
 
-                processed += 1
+def _status_change(
+    appointment_id: str,
+    previous_status: str,
+    new_status: str,
+    version: Optional[int],
+) -> Tuple[UpdateOne, Dict[str, Any]]:
+    """Build the version-guarded update and the event of one status change."""
+    update = UpdateOne(
+        {"id": appointment_id, "status": previous_status, "version": version},
+        {
+            "$set": {
+                "status": new_status,
+                "updated_at": datetime.utcnow(),
+            },
+            "$inc": {"version": 1},
+        },
+    )
+    event = new_event(
+        "status_changed",
+        "appointment",
+        appointment_id,
+        appointment_id,
+        {
+            "previous_status": previous_status,
+            "new_status": new_status,
+            "reason": "reply_classification",
+        },
+    )
+    return update, event
 
-            except Exception as exc:
-                echo(f"  ❌ Row {row_num}: Error - {str(exc)}")
-                errors += 1
 
-    echo(f"📥 Import complete: {processed} processed, {classified} status changes, {errors} errors")
+def _applied_status_changes(
+    db,
+    status_events: List[Dict[str, Any]],
+    next_versions: Dict[str, int],
+) -> List[Dict[str, Any]]:
+    """Return the status events whose change was written.
 
+    An applied change left its appointment at the new status and the next
+    version; one that matched nothing left it as another writer made it.
+    """
+    current = {
+        appointment["id"]: appointment
+        for appointment in db.appointments.find(
+            {"id": {"$in": [event["appointment_id"] for event in status_events]}},
+            projection={"_id": 0, "id": 1, "status": 1, "version": 1},
+        )
+    }
+    applied = []
+    for event in status_events:
+        appointment = current.get(event["appointment_id"], {})
+        if (
+            appointment.get("status") == event["payload"]["new_status"]
+            and appointment.get("version") == next_versions[event["appointment_id"]]
+        ):
+            applied.append(event)
+    return applied
@@ -1,6 +1,83 @@
 import csv
+import gzip
+import os
+from collections import Counter
+from contextlib import suppress
 from datetime import datetime
-from typing import Callable, Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional, TextIO, Tuple, Type
+
+REPORT_FIELDS: List[str] = [
+    "reminder_id",
+    "appointment_id",
+    "patient_name",
+    "phone",
+    "offset_days",
+    "scheduled_for",
+    "status",
+    "attempts",
+    "last_error",
+    "dispatched_at",
+    "delivered_at",
+]
+
+STATUS_ICONS: Dict[str, str] = {
+    "scheduled": "⏰",
+    "dispatched": "🚀",
+    "delivered": "✅",
+    "failed": "❌",
+    "dead": "☠️",
+    "canceled": "🚫",
+}
+
+PROGRESS_EVERY = 100_000
+
+REPORT_FORMATS = ("csv", "csv.gz", "parquet", "arrow")
+
+# Rows buffered per Arrow record batch / Parquet row group.
+ARROW_BATCH_ROWS = 65_536
+
+
+def reminders_report_pipeline(from_dt: datetime, to_dt: datetime) -> List[Dict[str, Any]]:
+    """Aggregation joining reminders in range to their appointment and patient."""
+    return [
+        {"$match": {"scheduled_for": {"$gte": from_dt, "$lte": to_dt}}},
+        {
+            "$lookup": {
+                "from": "appointments",
+                "localField": "appointment_id",
+                "foreignField": "id",
+                "pipeline": [{"$project": {"_id": 0, "patient_id": 1}}],
+                "as": "appointment",
+            }
+        },
+        {"$unwind": {"path": "$appointment", "preserveNullAndEmptyArrays": True}},
+        {
+            "$lookup": {
+                "from": "patients",
+                "localField": "appointment.patient_id",
+                "foreignField": "id",
+                "pipeline": [{"$project": {"_id": 0, "full_name": 1, "phone_e164": 1}}],
+                "as": "patient",
+            }
+        },
+        {"$unwind": {"path": "$patient", "preserveNullAndEmptyArrays": True}},
+        {
+            "$project": {
+                "_id": 0,
+                "reminder_id": "$id",
+                "appointment_id": 1,
+                "patient_name": {"$ifNull": ["$patient.full_name", "Unknown"]},
+                "phone": {"$ifNull": ["$patient.phone_e164", "Unknown"]},
+                "offset_days": 1,
+                "scheduled_for": 1,
+                "status": 1,
+                "attempts": 1,
+                "last_error": 1,
+                "dispatched_at": 1,
+                "delivered_at": 1,
+            }
+        },
+    ]
 
 
 def generate_reminders_report(
@@ -9,89 +86,216 @@ def generate_reminders_report(
     to_date: str,
     output: Optional[str],
     echo: Callable[[str], None],
+    verbose: bool = False,
+    format: str = "csv",
 ) -> None:
-    """Generate reminders report for a date range."""
+    """Generate reminders report for a date range.
+
+    Rows come from a single ``$lookup`` aggregation (allowed to spill to disk)
+    and are streamed straight into the writer for ``format``, so memory use
+    does not grow with the size of the range. Per-row console lines are
+    printed only when ``verbose``; otherwise a status summary is printed at
+    the end.
+    """
+    if format not in REPORT_FORMATS:
+        echo(f"❌ Unknown report format '{format}'. Use one of: {', '.join(REPORT_FORMATS)}")
+        return
+
     from_dt = datetime.fromisoformat(f"{from_date}T00:00:00+00:00")
     to_dt = datetime.fromisoformat(f"{to_date}T23:59:59+00:00")
 
-    reminders: List[Dict[str, Any]] = list(
-        db.reminders.find(
-            {
-                "scheduled_for": {
-                    "$gte": from_dt,
-                    "$lte": to_dt,
-                }
-            }
-        )
+    if not output and not verbose:
+        statuses = _count_by_status(db, from_dt, to_dt)
+        if not statuses:
+            echo("No reminders found for the specified date range")
+            return
+        echo(f"📊 Reminders Report: {from_date} to {to_date}")
+        _echo_summary(statuses, echo)
+        return
+
+    rows = db.reminders.aggregate(
+        reminders_report_pipeline(from_dt, to_dt),
+        allowDiskUse=True,
+        batchSize=1000,
     )
 
-    if not reminders:
+    statuses: Counter = Counter()
+    count = 0
+    writer = None
+    # Rows go to a temporary file that replaces ``output`` only once the
+    # export has finished, so a failed write, close or cursor read never
+    # leaves a truncated report (or clobbers an earlier one).
+    partial = None
+
+    try:
+        try:
+            for row in rows:
+                if not count:
+                    echo(f"📊 Reminders Report: {from_date} to {to_date}")
+                    if output:
+                        partial = f"{output}.tmp"
+                        try:
+                            writer = _open_report_writer(partial, format)
+                        except ImportError:
+                            echo(f"❌ The {format} format requires pyarrow (pip install pyarrow)")
+                            return
+
+                count += 1
+                statuses[row.get("status")] += 1
+
+                if writer:
+                    writer.write(row)
+
+                if verbose:
+                    echo(
+                        f"{STATUS_ICONS.get(row['status'], '❓')} {row['reminder_id'][:8]} {row['patient_name']} "
+                        f"Offset: {row['offset_days']}d "
+                        f"Scheduled: {row['scheduled_for'].isoformat()[:16]} "
+                        f"Status: {row['status']} "
+                        f"Attempts: {row['attempts']}"
+                    )
+                elif count % PROGRESS_EVERY == 0:
+                    echo(f"  … {count:,} rows")
+        finally:
+            if writer:
+                writer.close()
+        if writer:
+            os.replace(partial, output)
+    except _export_errors() as exc:
+        echo(f"❌ Error exporting report: {exc}")
+        return
+    finally:
+        if partial:
+            with suppress(OSError):
+                os.remove(partial)
+
+    if not count:
         echo("No reminders found for the specified date range")
         return
 
-    report_data: List[Dict[str, Any]] = []
-    for reminder in reminders:
-        appointment = db.appointments.find_one({"id": reminder["appointment_id"]})
-        patient = db.patients.find_one({"id": appointment["patient_id"]}) if appointment else None
+    _echo_summary(statuses, echo)
+    if output:
+        echo(f"✅ Report exported to: {output}")
+
+
+def _export_errors() -> Tuple[Type[BaseException], ...]:
+    """Exceptions a failed export raises: I/O errors, and pyarrow's own."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return (OSError,)
+    return (OSError, pa.ArrowException)
+
+
+def _open_report_writer(path: str, format: str):
+    if format in ("csv", "csv.gz"):
+        return _CsvReportWriter(path, compressed=format == "csv.gz")
+    return _ArrowReportWriter(path, format)
 
-        report_data.append(
+
+class _CsvReportWriter:
+    """Writes report rows as (optionally gzip-compressed) CSV text."""
+
+    def __init__(self, path: str, compressed: bool = False) -> None:
+        self._file: TextIO
+        if compressed:
+            self._file = gzip.open(path, "wt", newline="", encoding="utf-8")
+        else:
+            self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        self._writer.writerow(
             {
-                "reminder_id": reminder["id"],
-                "appointment_id": reminder["appointment_id"],
-                "patient_name": patient["full_name"] if patient else "Unknown",
-                "phone": patient["phone_e164"] if patient else "Unknown",
-                "offset_days": reminder["offset_days"],
-                "scheduled_for": reminder["scheduled_for"].isoformat(),
-                "status": reminder["status"],
-                "attempts": reminder["attempts"],
-                "last_error": reminder.get("last_error", ""),
-                "dispatched_at": reminder.get("dispatched_at", ""),
-                "delivered_at": reminder.get("delivered_at", ""),
+                **row,
+                "scheduled_for": row["scheduled_for"].isoformat(),
+                "last_error": row.get("last_error") or "",
+                "dispatched_at": _isoformat(row.get("dispatched_at")),
+                "delivered_at": _isoformat(row.get("delivered_at")),
             }
         )
 
-    echo(f"📊 Reminders Report: {from_date} to {to_date}")
-    echo(f"Found {len(report_data)} reminders")
-    echo("")
-
-    for item in report_data:
-        status_icon = {
-            "scheduled": "⏰",
-            "dispatched": "🚀",
-            "delivered": "✅",
-            "failed": "❌",
-            "canceled": "🚫",
-        }.get(item["status"], "❓")
-
-        echo(
-            f"{status_icon} {item['reminder_id'][:8]} {item['patient_name']} "
-            f"Offset: {item['offset_days']}d "
-            f"Scheduled: {item['scheduled_for'][:16]} "
-            f"Status: {item['status']} "
-            f"Attempts: {item['attempts']}"
+    def close(self) -> None:
+        self._file.close()
+
+
+def _isoformat(value: Optional[datetime]) -> str:
+    return value.isoformat() if value else ""
+
+
+class _ArrowReportWriter:
+    """Writes report rows as typed Parquet row groups or an Arrow IPC file.
+
+    Timestamps stay timestamps, counts are integers and ``status`` is
+    dictionary-encoded. Rows are buffered column-wise and flushed every
+    ``ARROW_BATCH_ROWS`` rows.
+    """
+
+    def __init__(self, path: str, format: str) -> None:
+        import pyarrow as pa
+
+        self._pa = pa
+        timestamp = pa.timestamp("us", tz="UTC")
+        self._schema = pa.schema(
+            [
+                ("reminder_id", pa.string()),
+                ("appointment_id", pa.string()),
+                ("patient_name", pa.string()),
+                ("phone", pa.string()),
+                ("offset_days", pa.int32()),
+                ("scheduled_for", timestamp),
+                ("status", pa.dictionary(pa.int8(), pa.string())),
+                ("attempts", pa.int32()),
+                ("last_error", pa.string()),
+                ("dispatched_at", timestamp),
+                ("delivered_at", timestamp),
+            ]
         )
+        if format == "parquet":
+            import pyarrow.parquet as pq
 
-    if output:
-        try:
-            with open(output, "w", newline="", encoding="utf-8") as csvfile:
-                fieldnames = [
-                    "reminder_id",
-                    "appointment_id",
-                    "patient_name",
-                    "phone",
-                    "offset_days",
-                    "scheduled_for",
-                    "status",
-                    "attempts",
-                    "last_error",
-                    "dispatched_at",
-                    "delivered_at",
+            self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_file(
+                path, self._schema, options=pa.ipc.IpcWriteOptions(compression="zstd")
+            )
+        self._columns: Dict[str, List[Any]] = {name: [] for name in self._schema.names}
+
+    def write(self, row: Dict[str, Any]) -> None:
+        for name, values in self._columns.items():
+            values.append(row.get(name))
+        if len(self._columns["reminder_id"]) >= ARROW_BATCH_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._columns["reminder_id"]:
+            return
+        batch = self._pa.RecordBatch.from_pydict(self._columns, schema=self._schema)
+        self._writer.write_batch(batch)
+        for values in self._columns.values():
+            values.clear()
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+
+
+def _count_by_status(db, from_dt: datetime, to_dt: datetime) -> Counter:
+    return Counter(
+        {
+            group["_id"]: group["count"]
+            for group in db.reminders.aggregate(
+                [
+                    {"$match": {"scheduled_for": {"$gte": from_dt, "$lte": to_dt}}},
+                    {"$group": {"_id": "$status", "count": {"$sum": 1}}},
                 ]
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(report_data)
+            )
+        }
+    )
 
-            echo(f"✅ Report exported to: {output}")
-        except Exception as exc:
-            echo(f"❌ Error exporting CSV: {exc}")
 
+def _echo_summary(statuses: Counter, echo: Callable[[str], None]) -> None:
+    echo(f"Found {sum(statuses.values())} reminders")
+    for status, count in statuses.most_common():
+        echo(f"  {STATUS_ICONS.get(status, '❓')} {status}: {count}")
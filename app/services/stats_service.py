@@ -0,0 +1,214 @@
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.client_session import ClientSession
+
+from app.models.models import Appointment, Reminder
+
+# Outcomes the rollups count.
+OUTCOME_STATUSES = ("delivered", "failed")
+
+_RollupKey = Tuple[str, int, str, str, str]
+
+
+def _rollup_id(key: _RollupKey) -> Dict[str, Any]:
+    day, offset_days, status, provider, location = key
+    return {
+        "day": day,
+        "offset_days": offset_days,
+        "status": status,
+        "provider": provider,
+        "location": location,
+    }
+
+
+class StatsAccumulator:
+    """Collects delivery rollup deltas in memory and flushes them as ``$inc`` upserts.
+
+    Rollups count each reminder's latest dispatch outcome, keyed by the UTC
+    day of that attempt, offset, status, provider and location. When a
+    reminder that already has an outcome is dispatched again its previous
+    outcome is decremented, as it is when the reminder is re-armed or
+    canceled (``retract``), so the counters always match what
+    ``rebuild_rollups`` would compute from the reminders themselves.
+    """
+
+    def __init__(self) -> None:
+        self._deltas: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        reminder: Reminder,
+        appointment: Appointment,
+        status: str,
+        dispatched_at: datetime,
+    ) -> None:
+        """Record ``status`` as the outcome of ``reminder``'s dispatch at ``dispatched_at``.
+
+        ``reminder`` is as it was before this attempt was claimed.
+        """
+        with self._lock:
+            self._retract(reminder, appointment)
+            day = dispatched_at.strftime("%Y-%m-%d")
+            self._deltas[(day, reminder.offset_days, status, appointment.provider, appointment.location)] += 1
+
+    def retract(self, reminder: Reminder, appointment: Appointment) -> None:
+        """Take ``reminder``'s current outcome, if it has one, out of the rollups.
+
+        For reminders leaving ``delivered`` or ``failed`` without a new
+        dispatch: re-armed for a moved appointment, or canceled.
+        """
+        with self._lock:
+            self._retract(reminder, appointment)
+
+    def _retract(self, reminder: Reminder, appointment: Appointment) -> None:
+        if reminder.status in OUTCOME_STATUSES and reminder.dispatched_at:
+            day = reminder.dispatched_at.strftime("%Y-%m-%d")
+            self._deltas[(day, reminder.offset_days, reminder.status, appointment.provider, appointment.location)] -= 1
+
+    def flush(self, db, session: Optional[ClientSession] = None) -> int:
+        """Write pending deltas with one unordered bulk write; return the number of counters touched."""
+        with self._lock:
+            deltas = {key: delta for key, delta in self._deltas.items() if delta}
+            self._deltas.clear()
+        if not deltas:
+            return 0
+
+        db.reminder_stats.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": _rollup_id(key)},
+                    {
+                        "$inc": {"count": delta},
+                        "$setOnInsert": _rollup_id(key),
+                    },
+                    upsert=True,
+                )
+                for key, delta in deltas.items()
+            ],
+            ordered=False,
+            session=session,
+        )
+        return len(deltas)
+
+
+def rebuild_rollups(db, from_date: str, to_date: str, echo: Callable[[str], None]) -> None:
+    """Recompute the rollups for a day range from the reminders collection.
+
+    Run it while dispatch is paused: outcomes recorded during the rebuild for
+    the same days would otherwise be counted twice.
+    """
+    from_dt = datetime.fromisoformat(f"{from_date}T00:00:00")
+    to_dt = datetime.fromisoformat(f"{to_date}T23:59:59.999999")
+
+    removed = db.reminder_stats.delete_many({"day": {"$gte": from_date, "$lte": to_date}}).deleted_count
+    db.reminders.aggregate(
+        [
+            {
+                "$match": {
+                    "status": {"$in": [*OUTCOME_STATUSES, "dead"]},
+                    "dispatched_at": {"$gte": from_dt, "$lte": to_dt},
+                }
+            },
+            {
+                "$lookup": {
+                    "from": "appointments",
+                    "localField": "appointment_id",
+                    "foreignField": "id",
+                    "pipeline": [{"$project": {"_id": 0, "provider": 1, "location": 1}}],
+                    "as": "appointment",
+                }
+            },
+            {"$unwind": {"path": "$appointment", "preserveNullAndEmptyArrays": True}},
+            {
+                "$group": {
+                    "_id": {
+                        "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$dispatched_at"}},
+                        "offset_days": "$offset_days",
+                        # A dead reminder's last attempt was counted as failed.
+                        "status": {"$cond": [{"$eq": ["$status", "dead"]}, "failed", "$status"]},
+                        "provider": {"$ifNull": ["$appointment.provider", ""]},
+                        "location": {"$ifNull": ["$appointment.location", ""]},
+                    },
+                    "count": {"$sum": 1},
+                }
+            },
+            {
+                "$set": {
+                    "day": "$_id.day",
+                    "offset_days": "$_id.offset_days",
+                    "status": "$_id.status",
+                    "provider": "$_id.provider",
+                    "location": "$_id.location",
+                }
+            },
+            {"$merge": {"into": "reminder_stats", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ],
+        allowDiskUse=True,
+    )
+    rebuilt = db.reminder_stats.count_documents({"day": {"$gte": from_date, "$lte": to_date}})
+    echo(f"🔁 Rebuilt rollups {from_date} to {to_date}: {rebuilt} counters (replaced {removed})")
+
+
+def show_delivery_stats(
+    db,
+    from_date: str,
+    to_date: str,
+    echo: Callable[[str], None],
+    group_by: Optional[str] = None,
+) -> None:
+    """Print delivery counts and rates per day and offset from the rollups.
+
+    ``group_by`` may be ``"provider"`` or ``"location"`` to split rows further.
+    """
+    group: Dict[str, Any] = {"day": "$day", "offset_days": "$offset_days"}
+    if group_by:
+        group[group_by] = f"${group_by}"
+
+    rows: List[Dict[str, Any]] = list(
+        db.reminder_stats.aggregate(
+            [
+                {"$match": {"day": {"$gte": from_date, "$lte": to_date}}},
+                {
+                    "$group": {
+                        "_id": group,
+                        "delivered": {"$sum": {"$cond": [{"$eq": ["$status", "delivered"]}, "$count", 0]}},
+                        "failed": {"$sum": {"$cond": [{"$eq": ["$status", "failed"]}, "$count", 0]}},
+                    }
+                },
+                {"$sort": {"_id.day": 1, "_id.offset_days": 1}},
+            ]
+        )
+    )
+
+    if not rows:
+        echo("No delivery stats found for the specified date range")
+        return
+
+    echo(f"📈 Delivery stats: {from_date} to {to_date}")
+    label = f" {group_by:<20}" if group_by else ""
+    echo(f"{'day':<10} {'offset':>6}{label} {'delivered':>9} {'failed':>7} {'rate':>7}")
+
+    total_delivered = 0
+    total_failed = 0
+    for row in rows:
+        delivered = row["delivered"]
+        failed = row["failed"]
+        total_delivered += delivered
+        total_failed += failed
+        column = f" {str(row['_id'].get(group_by, '')):<20}" if group_by else ""
+        echo(
+            f"{row['_id']['day']:<10} {row['_id']['offset_days']:>5}d{column} "
+            f"{delivered:>9} {failed:>7} {_rate(delivered, failed):>7}"
+        )
+
+    echo(f"Total: {total_delivered} delivered, {total_failed} failed ({_rate(total_delivered, total_failed)})")
+
+
+def _rate(delivered: int, failed: int) -> str:
+    attempts = delivered + failed
+    return f"{delivered / attempts:.1%}" if attempts else "-"
@@ -1,7 +1,150 @@
 from datetime import datetime
-from typing import Callable, Dict, Any, List
+from typing import Callable, Dict, Any, FrozenSet, List, Optional
+import re
+import threading
 import uuid
 
+from jinja2 import Environment, TemplateSyntaxError, meta
+
+from app.models.models import Appointment, Patient
+from app.utils.pagination import LIST_FORMATS, KeysetPage, json_line
+from app.utils.timezones import to_local
+
+# Variables a template may reference, and the fields each one exposes.
+TEMPLATE_VARIABLES: Dict[str, FrozenSet[str]] = {
+    "patient": frozenset({"first_name", "full_name"}),
+    "appointment": frozenset({"start_local", "start_at", "provider", "location"}),
+}
+
+# Legacy single-brace placeholders such as ``{patient.first_name}``.
+_LEGACY_PLACEHOLDER = re.compile(r"(?<!\{)\{(patient|appointment)\.(\w+)\}(?!\})")
+
+_environment = Environment(autoescape=False, keep_trailing_newline=True)
+_cache: Dict[str, "CompiledTemplate"] = {}
+_cache_lock = threading.Lock()
+
+
+class CompiledTemplate:
+    """A template body compiled once and rendered many times."""
+
+    __slots__ = ("id", "name", "updated_at", "variables", "_template")
+
+    def __init__(self, template: Dict[str, Any]) -> None:
+        source = to_jinja_source(template["body"])
+        self.id: str = template["id"]
+        self.name: str = template["name"]
+        self.updated_at: Optional[datetime] = template.get("updated_at")
+        self.variables: FrozenSet[str] = frozenset(
+            meta.find_undeclared_variables(_environment.parse(source))
+        )
+        self._template = _environment.from_string(source)
+
+    def render(self, context: Dict[str, Any]) -> str:
+        return self._template.render(context)
+
+
+def to_jinja_source(body: str) -> str:
+    """Rewrite legacy ``{patient.first_name}`` placeholders as Jinja expressions.
+
+    Placeholders naming an unknown field are left as literal text, as the
+    legacy renderer did.
+    """
+    return _LEGACY_PLACEHOLDER.sub(_rewrite_placeholder, body)
+
+
+def _rewrite_placeholder(match: "re.Match[str]") -> str:
+    variable, field = match.groups()
+    if field not in TEMPLATE_VARIABLES[variable]:
+        return match.group(0)
+    return f"{{{{ {variable}.{field} }}}}"
+
+
+def _unknown_legacy_placeholders(body: str) -> List[str]:
+    return [
+        match.group(0)
+        for match in _LEGACY_PLACEHOLDER.finditer(body)
+        if match.group(2) not in TEMPLATE_VARIABLES[match.group(1)]
+    ]
+
+
+def validate_template_body(body: str) -> Optional[str]:
+    """Return an error message if ``body`` does not compile, else ``None``."""
+    try:
+        parsed = _environment.parse(to_jinja_source(body))
+    except TemplateSyntaxError as exc:
+        return f"Invalid template syntax: {exc.message}"
+
+    unknown = meta.find_undeclared_variables(parsed) - TEMPLATE_VARIABLES.keys()
+    if unknown:
+        return f"Unknown template variables: {', '.join(sorted(unknown))}"
+
+    placeholders = _unknown_legacy_placeholders(body)
+    if placeholders:
+        return f"Unknown template placeholders: {', '.join(sorted(set(placeholders)))}"
+    return None
+
+
+def get_template_renderer(db, name: str) -> Optional[CompiledTemplate]:
+    """Return the compiled renderer for template ``name``.
+
+    Compiled templates are cached per process by template id and reused until
+    the stored ``updated_at`` changes, so a hit costs one small projected read
+    and no re-parsing.
+    """
+    header = db.templates.find_one({"name": name}, projection={"_id": 0, "id": 1, "updated_at": 1})
+    if not header:
+        return None
+
+    cached = _cache.get(header["id"])
+    if cached is not None and cached.updated_at == header.get("updated_at"):
+        return cached
+
+    template = db.templates.find_one(
+        {"id": header["id"]},
+        projection={"_id": 0, "id": 1, "name": 1, "body": 1, "updated_at": 1},
+    )
+    if not template:
+        return None
+
+    compiled = CompiledTemplate(template)
+    with _cache_lock:
+        _cache[compiled.id] = compiled
+    return compiled
+
+
+def build_context(
+    variables: FrozenSet[str],
+    patient: Patient,
+    appointment: Appointment,
+) -> Dict[str, Any]:
+    """Build only the render context a template actually references.
+
+    ``start_local`` is the appointment time in the patient's time zone.
+    """
+    context: Dict[str, Any] = {}
+    if "patient" in variables:
+        context["patient"] = {
+            "first_name": patient.first_name,
+            "full_name": patient.full_name,
+        }
+    if "appointment" in variables:
+        context["appointment"] = {
+            "start_local": to_local(appointment.start_at, patient.tz).strftime("%Y-%m-%d %H:%M"),
+            "start_at": appointment.start_at,
+            "provider": appointment.provider,
+            "location": appointment.location,
+        }
+    return context
+
+
+def invalidate_template_cache(template_id: Optional[str] = None) -> None:
+    """Drop one compiled template (or all of them) from the cache."""
+    with _cache_lock:
+        if template_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(template_id, None)
+
 
 def add_template(db, name: str, body: str, echo: Callable[[str], None]) -> None:
     """Add a new template."""
@@ -9,6 +152,11 @@ def add_template(db, name: str, body: str, echo: Callable[[str], None]) -> None:
         echo(f"❌ Template '{name}' already exists")
         return
 
+    error = validate_template_body(body)
+    if error:
+        echo(f"❌ {error}")
+        return
+
     template: Dict[str, Any] = {
         "id": str(uuid.uuid4()),
         "name": name,
@@ -20,20 +168,67 @@ def add_template(db, name: str, body: str, echo: Callable[[str], None]) -> None:
     }
 
     db.templates.insert_one(template)
+    invalidate_template_cache(template["id"])
     echo(f"✅ Template created: {template['id']}")
 
 
-def list_templates(db, echo: Callable[[str], None]) -> None:
-    """List all templates."""
-    templates: List[Dict[str, Any]] = list(db.templates.find({}).limit(20))
+def update_template(db, name: str, body: str, echo: Callable[[str], None]) -> None:
+    """Replace the body of an existing template."""
+    error = validate_template_body(body)
+    if error:
+        echo(f"❌ {error}")
+        return
 
-    if not templates:
-        echo("No templates found")
+    template = db.templates.find_one_and_update(
+        {"name": name},
+        {"$set": {"body": body, "updated_at": datetime.utcnow()}},
+        projection={"_id": 0, "id": 1},
+    )
+    if not template:
+        echo(f"❌ Template '{name}' not found")
         return
 
-    for template in templates:
-        body_preview = (
-            template["body"][:50] + "..." if len(template["body"]) > 50 else template["body"]
-        )
-        echo(f"{template['id'][:8]} {template['name']}: {body_preview}")
+    invalidate_template_cache(template["id"])
+    echo(f"✅ Template updated: {template['id']}")
+
+
+def list_templates(
+    db,
+    echo: Callable[[str], None],
+    limit: int = 20,
+    after: Optional[str] = None,
+    format: str = "text",
+) -> None:
+    """List templates a page at a time, in id order.
 
+    Pass the printed cursor as ``after`` to fetch the next page; ``limit=0``
+    lists everything. ``format="jsonl"`` prints one JSON document per line.
+    """
+    if format not in LIST_FORMATS:
+        echo(f"❌ Unknown format '{format}'. Use one of: {', '.join(LIST_FORMATS)}")
+        return
+
+    page = KeysetPage(
+        db.templates,
+        {},
+        {"name": 1, "channel": 1, "language": 1, "body": 1, "updated_at": 1},
+        limit,
+        after=after,
+    )
+    for templates in page:
+        for template in templates:
+            if format == "jsonl":
+                echo(json_line(template))
+                continue
+            body_preview = (
+                template["body"][:50] + "..." if len(template["body"]) > 50 else template["body"]
+            )
+            echo(f"{template['id'][:8]} {template['name']}: {body_preview}")
+
+    if format == "jsonl":
+        return
+    if not page.count:
+        echo("No templates found")
+    elif page.next_after:
+        echo("")
+        echo(f"More templates: --after {page.next_after}")
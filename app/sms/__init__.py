@@ -0,0 +1,86 @@
+import atexit
+import threading
+from typing import Dict, Optional, Tuple
+
+from app.config.settings import Settings, get_settings
+from app.sms.base import AsyncSmsProvider, SendResult, SmsMessage, SmsProvider
+from app.sms.simulated import SimulatedProvider
+from app.sms.throttle import DispatchThrottle, create_throttle
+
+_provider: Optional[SmsProvider] = None
+_provider_lock = threading.Lock()
+_throttles: Dict[Tuple[int, str], DispatchThrottle] = {}
+
+
+def create_provider(settings: Settings) -> SmsProvider:
+    """Build the SMS provider selected by ``settings.sms_provider``.
+
+    Its throughput limit (``sms_rate_per_second``) is enforced by the
+    dispatch throttle, not the provider, so it can be shared across processes.
+    """
+    if settings.sms_provider == "simulated":
+        return SimulatedProvider(
+            failure_rate=settings.sms_simulated_failure_rate,
+            max_batch_size=settings.sms_batch_size,
+        )
+    if settings.sms_provider == "http":
+        from app.sms.http_provider import HttpProvider
+
+        return HttpProvider(
+            settings.sms_provider_url,
+            api_key=settings.sms_provider_api_key or None,
+            timeout=settings.sms_timeout_ms / 1000,
+            max_connections=settings.sms_max_connections,
+            max_batch_size=settings.sms_batch_size,
+        )
+    raise ValueError(f"Unknown SMS provider: {settings.sms_provider}")
+
+
+def get_provider() -> SmsProvider:
+    """Return the process-wide SMS provider, creating it on first use."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_provider(get_settings())
+                atexit.register(close_provider)
+    return _provider
+
+
+def get_throttle(db) -> DispatchThrottle:
+    """Return the process-wide dispatch throttle for ``db``, configured from settings.
+
+    Every dispatch run in the process shares it, so per-number limits hold
+    across runs of a long-lived dispatcher.
+    """
+    key = (id(db.client), db.name)
+    throttle = _throttles.get(key)
+    if throttle is None:
+        with _provider_lock:
+            throttle = _throttles.get(key)
+            if throttle is None:
+                throttle = _throttles[key] = create_throttle(db, get_settings())
+    return throttle
+
+
+def close_provider() -> None:
+    """Close the shared provider; the next ``get_provider`` call recreates it."""
+    global _provider
+    with _provider_lock:
+        if _provider is not None:
+            _provider.close()
+            _provider = None
+
+
+__all__ = [
+    "AsyncSmsProvider",
+    "DispatchThrottle",
+    "SendResult",
+    "SimulatedProvider",
+    "SmsMessage",
+    "SmsProvider",
+    "close_provider",
+    "create_provider",
+    "get_provider",
+    "get_throttle",
+]
@@ -0,0 +1,98 @@
+import asyncio
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from app.utils.batching import chunked
+from app.utils.rate_limit import TokenBucket
+
+
+@dataclass(frozen=True)
+class SmsMessage:
+    """One outgoing SMS. ``reference`` (the reminder id) is echoed back in its result."""
+
+    to: str
+    body: str
+    reference: str
+
+
+@dataclass(frozen=True)
+class SendResult:
+    """Outcome of sending one message."""
+
+    reference: str
+    success: bool
+    provider_message_id: Optional[str] = None
+    error: Optional[str] = None
+    # False when sending the same message again cannot succeed (e.g. an
+    # invalid number), True for timeouts, throttling and server errors.
+    retryable: bool = True
+
+
+class SmsProvider:
+    """Base class for blocking SMS providers.
+
+    Subclasses implement ``_send_batch`` for at most ``max_batch_size``
+    messages; providers without multi-recipient requests keep the default of
+    one. ``send_batch`` splits larger lists and, when ``rate_limit`` is set,
+    paces requests to the provider's allowed messages per second. Instances
+    are shared by all dispatch worker threads and must be thread-safe.
+    """
+
+    name = "base"
+    max_batch_size = 1
+
+    def __init__(self, rate_limit: Optional[TokenBucket] = None) -> None:
+        self._rate_limit = rate_limit
+
+    def send(self, message: SmsMessage) -> SendResult:
+        return self.send_batch([message])[0]
+
+    def send_batch(self, messages: Sequence[SmsMessage]) -> List[SendResult]:
+        """Send ``messages`` and return one result per message, in order."""
+        results: List[SendResult] = []
+        for batch in chunked(messages, self.max_batch_size):
+            if self._rate_limit is not None:
+                self._rate_limit.acquire(len(batch))
+            results.extend(self._send_batch(batch))
+        return results
+
+    def close(self) -> None:
+        """Release pooled connections."""
+
+    def _send_batch(self, messages: List[SmsMessage]) -> List[SendResult]:
+        raise NotImplementedError
+
+
+class AsyncSmsProvider:
+    """asyncio counterpart of ``SmsProvider``."""
+
+    name = "base"
+    max_batch_size = 1
+
+    def __init__(self, rate_limit: Optional[TokenBucket] = None) -> None:
+        self._rate_limit = rate_limit
+
+    async def send(self, message: SmsMessage) -> SendResult:
+        return (await self.send_batch([message]))[0]
+
+    async def send_batch(self, messages: Sequence[SmsMessage]) -> List[SendResult]:
+        """Send ``messages`` and return one result per message, in order."""
+        results: List[SendResult] = []
+        for batch in chunked(messages, self.max_batch_size):
+            if self._rate_limit is not None:
+                delay = self._rate_limit.reserve(len(batch))
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            results.extend(await self._send_batch(batch))
+        return results
+
+    async def aclose(self) -> None:
+        """Release pooled connections."""
+
+    async def _send_batch(self, messages: List[SmsMessage]) -> List[SendResult]:
+        raise NotImplementedError
+
+
+def failed_results(messages: Sequence[SmsMessage], error: str, retryable: bool = True) -> List[SendResult]:
+    """Build a failed result for every message of a request that failed as a whole."""
+    return [SendResult(message.reference, False, error=error, retryable=retryable) for message in messages]
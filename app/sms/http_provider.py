@@ -0,0 +1,137 @@
+"""SMS providers speaking a small JSON-over-HTTP protocol.
+
+``POST {url}/messages`` with ``{"messages": [{"to", "body", "reference"}, ...]}``
+answers ``{"results": [{"reference", "status": "sent" | "failed", "id", "error"}, ...]}``.
+``429`` and ``5xx`` responses fail the whole request as retryable, any other
+non-2xx response as permanent. The bundled stub (``reminderctl sms stub``)
+implements the same protocol; adapters for real carriers map their API onto
+``_send_batch``.
+
+httpx is imported lazily, so the package is only needed when an HTTP
+provider is configured.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.sms.base import AsyncSmsProvider, SendResult, SmsMessage, SmsProvider, failed_results
+from app.utils.rate_limit import TokenBucket
+
+
+def request_body(messages: Sequence[SmsMessage]) -> Dict[str, Any]:
+    return {
+        "messages": [
+            {"to": message.to, "body": message.body, "reference": message.reference} for message in messages
+        ]
+    }
+
+
+def parse_response(messages: Sequence[SmsMessage], status_code: int, payload: Any) -> List[SendResult]:
+    """Map a provider response onto one result per message."""
+    if status_code == 429 or status_code >= 500:
+        return failed_results(messages, f"HTTP {status_code}")
+    if status_code >= 300:
+        return failed_results(messages, f"HTTP {status_code}", retryable=False)
+
+    by_reference: Dict[str, Dict[str, Any]] = {}
+    if isinstance(payload, dict):
+        by_reference = {
+            result.get("reference"): result for result in payload.get("results", []) if isinstance(result, dict)
+        }
+
+    results: List[SendResult] = []
+    for message in messages:
+        result = by_reference.get(message.reference)
+        if result is None:
+            results.append(SendResult(message.reference, False, error="No result from provider"))
+        elif result.get("status") == "sent":
+            results.append(SendResult(message.reference, True, provider_message_id=result.get("id")))
+        else:
+            results.append(
+                SendResult(
+                    message.reference,
+                    False,
+                    error=result.get("error") or "Rejected by provider",
+                    retryable=result.get("retryable", True),
+                )
+            )
+    return results
+
+
+def _client_options(api_key: Optional[str], timeout: float, max_connections: int) -> Dict[str, Any]:
+    import httpx
+
+    headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+    return {
+        "headers": headers,
+        "timeout": timeout,
+        "limits": httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    }
+
+
+class HttpProvider(SmsProvider):
+    """Blocking HTTP provider over one pooled keep-alive ``httpx.Client``.
+
+    Keep ``max_connections`` at or above the number of dispatch workers, or
+    workers queue for a connection.
+    """
+
+    name = "http"
+
+    def __init__(
+        self,
+        url: str,
+        api_key: Optional[str] = None,
+        timeout: float = 10.0,
+        max_connections: int = 20,
+        max_batch_size: int = 1,
+        rate_limit: Optional[TokenBucket] = None,
+    ) -> None:
+        import httpx
+
+        super().__init__(rate_limit)
+        self.max_batch_size = max_batch_size
+        self._httpx = httpx
+        self._client = httpx.Client(base_url=url, **_client_options(api_key, timeout, max_connections))
+
+    def close(self) -> None:
+        self._client.close()
+
+    def _send_batch(self, messages: List[SmsMessage]) -> List[SendResult]:
+        try:
+            response = self._client.post("/messages", json=request_body(messages))
+            payload = response.json() if response.is_success else None
+        except (self._httpx.HTTPError, ValueError) as exc:
+            return failed_results(messages, f"{type(exc).__name__}: {exc}")
+        return parse_response(messages, response.status_code, payload)
+
+
+class AsyncHttpProvider(AsyncSmsProvider):
+    """asyncio HTTP provider over one pooled ``httpx.AsyncClient``."""
+
+    name = "http"
+
+    def __init__(
+        self,
+        url: str,
+        api_key: Optional[str] = None,
+        timeout: float = 10.0,
+        max_connections: int = 100,
+        max_batch_size: int = 1,
+        rate_limit: Optional[TokenBucket] = None,
+    ) -> None:
+        import httpx
+
+        super().__init__(rate_limit)
+        self.max_batch_size = max_batch_size
+        self._httpx = httpx
+        self._client = httpx.AsyncClient(base_url=url, **_client_options(api_key, timeout, max_connections))
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def _send_batch(self, messages: List[SmsMessage]) -> List[SendResult]:
+        try:
+            response = await self._client.post("/messages", json=request_body(messages))
+            payload = response.json() if response.is_success else None
+        except (self._httpx.HTTPError, ValueError) as exc:
+            return failed_results(messages, f"{type(exc).__name__}: {exc}")
+        return parse_response(messages, response.status_code, payload)
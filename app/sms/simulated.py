@@ -0,0 +1,39 @@
+import random
+import time
+import uuid
+from typing import List, Optional
+
+from app.sms.base import SendResult, SmsMessage, SmsProvider
+from app.utils.rate_limit import TokenBucket
+
+
+class SimulatedProvider(SmsProvider):
+    """Pretends to send: each message fails with probability ``failure_rate``.
+
+    ``latency`` (seconds per request) makes it usable for rough dispatcher
+    timing without any network.
+    """
+
+    name = "simulated"
+
+    def __init__(
+        self,
+        failure_rate: float = 0.2,
+        latency: float = 0.0,
+        max_batch_size: int = 1,
+        rate_limit: Optional[TokenBucket] = None,
+    ) -> None:
+        super().__init__(rate_limit)
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.max_batch_size = max_batch_size
+
+    def _send_batch(self, messages: List[SmsMessage]) -> List[SendResult]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [
+            SendResult(message.reference, True, provider_message_id=str(uuid.uuid4()))
+            if random.random() > self.failure_rate
+            else SendResult(message.reference, False, error="Simulated delivery failure")
+            for message in messages
+        ]
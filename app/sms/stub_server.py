@@ -0,0 +1,145 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+from app.utils.rate_limit import TokenBucket
+
+
+class StubProviderServer(ThreadingHTTPServer):
+    """Local SMS provider for load tests, speaking the protocol of ``HttpProvider``.
+
+    Every request waits ``latency`` seconds (plus up to ``jitter`` more) and
+    each message in it fails with probability ``failure_rate``. Requests over
+    ``max_batch_size`` messages get ``413``; with ``rate_per_second`` set,
+    messages beyond that throughput get ``429`` like a throttling carrier.
+    ``GET /stats`` returns request and message counters.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        address: tuple,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        max_batch_size: int = 100,
+        rate_per_second: float = 0,
+    ) -> None:
+        super().__init__(address, _StubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.max_batch_size = max_batch_size
+        self.rate_limit = TokenBucket(rate_per_second) if rate_per_second else None
+        self.counters: Dict[str, int] = {"requests": 0, "sent": 0, "failed": 0, "throttled": 0}
+        self._counters_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, **deltas: int) -> None:
+        with self._counters_lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: StubProviderServer
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, the body
+    # waits for the client's delayed ACK and every request gains ~40ms.
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        if self.path == "/stats":
+            self._reply(200, dict(self.server.counters))
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        if self.path != "/messages":
+            self._reply(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            messages = json.loads(self.rfile.read(length))["messages"]
+        except (ValueError, KeyError, TypeError):
+            self._reply(400, {"error": "invalid request body"})
+            return
+
+        server = self.server
+        server.count(requests=1)
+        if len(messages) > server.max_batch_size:
+            self._reply(413, {"error": f"at most {server.max_batch_size} messages per request"})
+            return
+        if server.rate_limit is not None and not server.rate_limit.try_acquire(len(messages)):
+            server.count(throttled=len(messages))
+            self._reply(429, {"error": "rate limit exceeded"})
+            return
+
+        time.sleep(server.latency + random.random() * server.jitter)
+        results = []
+        for message in messages:
+            if random.random() < server.failure_rate:
+                results.append({"reference": message.get("reference"), "status": "failed", "error": "Carrier rejected message"})
+            else:
+                results.append({"reference": message.get("reference"), "status": "sent", "id": str(uuid.uuid4())})
+        sent = sum(1 for result in results if result["status"] == "sent")
+        server.count(sent=sent, failed=len(results) - sent)
+        self._reply(200, {"results": results})
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def run_stub_provider(
+    echo: Callable[[str], None],
+    host: str = "127.0.0.1",
+    port: int = 8025,
+    latency: float = 0.05,
+    jitter: float = 0.0,
+    failure_rate: float = 0.0,
+    max_batch_size: int = 100,
+    rate_per_second: float = 0,
+    stop_event: Optional[threading.Event] = None,
+) -> None:
+    """Serve the stub provider until interrupted (or ``stop_event`` is set)."""
+    server = StubProviderServer(
+        (host, port),
+        latency=latency,
+        jitter=jitter,
+        failure_rate=failure_rate,
+        max_batch_size=max_batch_size,
+        rate_per_second=rate_per_second,
+    )
+    echo(
+        f"📡 Stub SMS provider on {server.url} "
+        f"(latency {latency * 1000:g}ms, failure rate {failure_rate:.0%}, batches up to {max_batch_size})"
+    )
+    if stop_event is not None:
+        threading.Thread(target=lambda: (stop_event.wait(), server.shutdown()), daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        counters = server.counters
+        echo(
+            f"📊 {counters['requests']} requests: {counters['sent']} sent, "
+            f"{counters['failed']} failed, {counters['throttled']} throttled"
+        )
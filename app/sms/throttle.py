@@ -0,0 +1,66 @@
+from typing import List, Optional, Protocol, Sequence
+
+from app.config.settings import Settings
+from app.utils.rate_limit import KeyedTokenBuckets, TokenBucket
+
+
+class Limiter(Protocol):
+    def acquire(self, tokens: float = 1) -> None: ...
+
+
+class DispatchThrottle:
+    """The rate limits the dispatcher applies, shared by all its worker threads.
+
+    ``acquire`` blocks before each provider request until every send limit
+    (global, then per provider) admits it, which paces dispatch to the
+    allowed throughput instead of letting the carrier reject the overflow.
+    ``phone_delay`` applies the per-number limit; it never blocks, so a
+    worker can defer a throttled reminder and carry on with the rest of its
+    chunk.
+    """
+
+    def __init__(
+        self,
+        limiters: Sequence[Limiter] = (),
+        phone_buckets: Optional[KeyedTokenBuckets] = None,
+    ) -> None:
+        self.limiters = list(limiters)
+        self.phone_buckets = phone_buckets
+
+    def acquire(self, tokens: int) -> None:
+        for limiter in self.limiters:
+            limiter.acquire(tokens)
+
+    def phone_delay(self, phone: str) -> float:
+        """Take a send slot for ``phone`` and return 0, or return the seconds until one frees up."""
+        if self.phone_buckets is None:
+            return 0.0
+        return self.phone_buckets.try_acquire(phone)
+
+
+def create_throttle(db, settings: Settings) -> DispatchThrottle:
+    """Build the dispatch throttle from settings.
+
+    With ``rate_limit_backend="mongo"`` the global and provider limits are
+    shared by every dispatcher process through ``MongoTokenLease``; otherwise
+    each process enforces them on its own. Per-number limits are always
+    tracked per process.
+    """
+    limiters: List[Limiter] = []
+    for name, rate in [
+        ("dispatch", settings.dispatch_rate_per_second),
+        (f"sms:{settings.sms_provider}", settings.sms_rate_per_second),
+    ]:
+        if not rate:
+            continue
+        if settings.rate_limit_backend == "mongo":
+            from app.db.rate_limits import MongoTokenLease
+
+            limiters.append(MongoTokenLease(db, name, rate, lease_size=settings.rate_limit_lease_size or None))
+        else:
+            limiters.append(TokenBucket(rate, capacity=max(rate, settings.sms_batch_size)))
+
+    phone_buckets = None
+    if settings.sms_phone_rate_per_minute:
+        phone_buckets = KeyedTokenBuckets(settings.sms_phone_rate_per_minute / 60, capacity=settings.sms_phone_burst)
+    return DispatchThrottle(limiters, phone_buckets)
@@ -0,0 +1,17 @@
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+
+def chunked(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Yield successive lists of at most ``size`` items from ``iterable``."""
+    if size < 1:
+        raise ValueError("size must be >= 1")
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
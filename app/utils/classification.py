@@ -1,11 +1,9 @@
-from typing import List
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Pattern, Tuple
 
-
-def classify_reply_intent(message: str) -> str:
-    """Simple rule-based classifier for reply intent."""
-    message_lower = message.lower()
-
-    confirm_patterns: List[str] = [
+INTENT_PATTERNS: Dict[str, List[str]] = {
+    "confirmed": [
         "yes",
         "yeah",
         "yep",
@@ -19,9 +17,8 @@ def classify_reply_intent(message: str) -> str:
         "see you",
         "attending",
         "accept",
-    ]
-
-    cancel_patterns: List[str] = [
+    ],
+    "cancel": [
         "no",
         "nope",
         "cancel",
@@ -36,9 +33,8 @@ def classify_reply_intent(message: str) -> str:
         "emergency",
         "sick",
         "ill",
-    ]
-
-    reschedule_patterns: List[str] = [
+    ],
+    "reschedule": [
         "reschedule",
         "move",
         "change",
@@ -46,11 +42,71 @@ def classify_reply_intent(message: str) -> str:
         "another time",
         "different day",
         "not available",
-    ]
+    ],
+}
+
+# Replies at most this long are memoised; carriers deliver a lot of "Yes"/"C".
+CACHEABLE_LENGTH = 64
+
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """Build a regex alternation factored as a character trie.
+
+    ``yes|yeah|yep`` becomes ``ye(?:ah|p|s)``, so the regex engine tries each
+    prefix once instead of once per phrase. Spaces inside a phrase match any
+    run of whitespace.
+    """
+    trie: Dict[str, Any] = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + build(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not branches:
+            return ""
+        if "" in node:
+            return "(?:" + "|".join(branches) + ")?"
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return build(trie)
+
+
+def _compile(patterns: Dict[str, List[str]]) -> Tuple[Pattern[str], Dict[str, str]]:
+    """Compile every intent phrase into one word-bounded regex.
 
-    confirm_matches = sum(1 for pattern in confirm_patterns if pattern in message_lower)
-    cancel_matches = sum(1 for pattern in cancel_patterns if pattern in message_lower)
-    reschedule_matches = sum(1 for pattern in reschedule_patterns if pattern in message_lower)
+    Returns the regex and a map from matched phrase to intent. Matching on
+    word boundaries means "no" does not match inside "know" nor "ill" inside
+    "will", and the longest phrase wins ("cancelled" over "cancel").
+    """
+    intents = {phrase: intent for intent, phrases in patterns.items() for phrase in phrases}
+    regex = re.compile(r"\b" + _trie_pattern(intents) + r"\b")
+    return regex, intents
+
+
+_INTENT_REGEX, _PHRASE_INTENTS = _compile(INTENT_PATTERNS)
+
+
+def _classify(message: str) -> str:
+    matches = _INTENT_REGEX.findall(message.lower().replace("\u2019", "'"))
+    if not matches:
+        return "unknown"
+
+    counts = {"confirmed": 0, "cancel": 0, "reschedule": 0}
+    for phrase in {" ".join(match.split()) for match in matches}:
+        counts[_PHRASE_INTENTS[phrase]] += 1
+
+    confirm_matches = counts["confirmed"]
+    cancel_matches = counts["cancel"]
+    reschedule_matches = counts["reschedule"]
 
     if confirm_matches > cancel_matches and confirm_matches > reschedule_matches:
         return "confirmed"
@@ -60,3 +116,22 @@ def classify_reply_intent(message: str) -> str:
         return "reschedule"
     return "unknown"
 
+
+_classify_cached = lru_cache(maxsize=8192)(_classify)
+
+
+def classify_reply_intent(message: str) -> str:
+    """Rule-based classifier for reply intent.
+
+    Counts the distinct phrases of each intent found in the message and
+    returns the intent with strictly the most matches, else ``"unknown"``.
+    """
+    if len(message) <= CACHEABLE_LENGTH:
+        return _classify_cached(message)
+    return _classify(message)
+
+
+def classify_batch(messages: Iterable[str]) -> List[str]:
+    """Classify many replies, in order."""
+    classify = classify_reply_intent
+    return [classify(message) for message in messages]
@@ -0,0 +1,74 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.utils.batching import chunked
+
+LIST_FORMATS = ("text", "jsonl")
+
+
+class KeysetPage:
+    """One page of a collection in ``key`` order, read in batches.
+
+    The page starts after the document whose ``key`` is ``after`` and holds
+    at most ``limit`` documents (0 means no limit), so walking a large
+    collection costs one index range scan per page however deep it goes.
+    Iterating yields the page in batches of ``batch_size``, letting callers
+    resolve related documents once per batch and stream the output; once
+    exhausted, ``next_after`` is the cursor for the following page, or
+    ``None`` if this was the last one.
+    """
+
+    def __init__(
+        self,
+        collection,
+        query: Dict[str, Any],
+        projection: Dict[str, Any],
+        limit: int,
+        after: Optional[str] = None,
+        key: str = "id",
+        batch_size: int = 1000,
+    ) -> None:
+        self.collection = collection
+        self.query = query
+        self.projection = {"_id": 0, **projection, key: 1}
+        self.limit = limit
+        self.after = after
+        self.key = key
+        self.batch_size = batch_size
+        self.count = 0
+        self.next_after: Optional[str] = None
+        self._last: Optional[str] = None
+
+    def __iter__(self) -> Iterator[List[Dict[str, Any]]]:
+        query = dict(self.query)
+        if self.after is not None:
+            query[self.key] = {"$gt": self.after}
+        cursor = self.collection.find(query, projection=self.projection, batch_size=self.batch_size).sort(self.key, 1)
+        if self.limit:
+            # One extra document tells whether another page follows.
+            cursor = cursor.limit(self.limit + 1)
+
+        for batch in chunked(cursor, self.batch_size):
+            if self.limit and self.count + len(batch) > self.limit:
+                batch = batch[: self.limit - self.count]
+                if batch:
+                    self.next_after = batch[-1][self.key]
+                elif self.count:
+                    # The extra document started a new batch.
+                    self.next_after = self._last
+            if batch:
+                self.count += len(batch)
+                self._last = batch[-1][self.key]
+                yield batch
+
+
+def json_line(document: Dict[str, Any]) -> str:
+    """Serialize a document as one JSON line; datetimes become ISO 8601 strings."""
+    return json.dumps(document, default=_json_default, ensure_ascii=False)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
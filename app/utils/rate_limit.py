@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilling at ``rate`` tokens per second.
+
+    ``reserve`` takes tokens immediately and returns how long the caller must
+    wait before using them, so waiters are served in arrival order and the
+    same bucket can pace both threads (``acquire``) and coroutines
+    (``await asyncio.sleep(bucket.reserve(n))``). The balance may go negative
+    by the amount reserved in advance; a request larger than ``capacity``
+    simply waits longer.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """Take ``tokens`` and return the seconds to wait before using them."""
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Take ``tokens`` only if they are available right now."""
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def delay(self, tokens: float = 1) -> float:
+        """Return the seconds until ``tokens`` are available, without taking them."""
+        with self._lock:
+            self._refill()
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def acquire(self, tokens: float = 1) -> None:
+        """Block the calling thread until ``tokens`` are available."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class KeyedTokenBuckets:
+    """One ``TokenBucket`` per key (e.g. per destination number), created on demand.
+
+    Only the ``max_keys`` most recently used keys are remembered. A bucket
+    that has been idle long enough to refill is identical to a new one, so
+    evicting the least recently used keys only forgets throttling state for
+    keys that have not been seen in a while.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, max_keys: int = 100_000) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key: Hashable, tokens: float = 1) -> float:
+        """Take ``tokens`` for ``key`` and return 0, or return the seconds to wait.
+
+        Nothing is taken when a wait is returned, so the caller can defer the
+        work and ask again later.
+        """
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+        if bucket.try_acquire(tokens):
+            return 0.0
+        return max(bucket.delay(tokens), 1e-3)
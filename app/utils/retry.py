@@ -0,0 +1,34 @@
+import random
+from dataclasses import dataclass
+
+from app.config.settings import Settings
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Exponential backoff with full jitter and a cap on attempts.
+
+    The n-th retry waits a random time between zero and
+    ``min(max_delay, base_delay * 2 ** (n - 1))`` seconds, which spreads the
+    retries of a burst of failures out instead of sending them back in one
+    wave. A reminder that has used ``max_attempts`` attempts is not retried.
+    """
+
+    max_attempts: int = 5
+    base_delay: float = 60.0
+    max_delay: float = 3600.0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "RetryPolicy":
+        return cls(
+            max_attempts=settings.retry_max_attempts,
+            base_delay=settings.retry_base_delay_seconds,
+            max_delay=settings.retry_max_delay_seconds,
+        )
+
+    def delay(self, attempts: int) -> float:
+        """Seconds to wait before the next try, after ``attempts`` failed attempts."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** max(0, attempts - 1)))
+
+    def exhausted(self, attempts: int) -> bool:
+        return attempts >= self.max_attempts
@@ -0,0 +1,145 @@
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import pendulum
+
+from app.config.settings import Settings
+
+DEFAULT_TIMEZONE = "UTC"
+
+
+@lru_cache(maxsize=1024)
+def is_valid_timezone(name: str) -> bool:
+    try:
+        pendulum.timezone(name)
+    except ValueError:
+        return False
+    return True
+
+
+@lru_cache(maxsize=1024)
+def get_timezone(name: Optional[str]) -> tzinfo:
+    """Return the time zone called ``name``; missing or unknown names mean UTC."""
+    try:
+        return pendulum.timezone(name or DEFAULT_TIMEZONE)
+    except ValueError:
+        return pendulum.timezone(DEFAULT_TIMEZONE)
+
+
+@lru_cache(maxsize=65536)
+def _day_offsets(name: Optional[str], day: date, local: bool) -> Tuple[timedelta, timedelta]:
+    """UTC offsets of ``name`` at the start of ``day`` and of the day after.
+
+    ``day`` is a UTC date, or a local date if ``local``. Equal offsets mean
+    no transition that day, so every time in it converts with one addition.
+    """
+    zone = get_timezone(name)
+    start = datetime.combine(day, time())
+    offsets = []
+    for moment in (start, start + timedelta(days=1)):
+        if local:
+            offsets.append(moment.replace(tzinfo=zone).utcoffset())
+        else:
+            offsets.append(moment.replace(tzinfo=timezone.utc).astimezone(zone).utcoffset())
+    return offsets[0], offsets[1]
+
+
+def to_local(moment: datetime, name: Optional[str]) -> datetime:
+    """Convert a naive UTC datetime to naive wall time in time zone ``name``.
+
+    Offsets come from a per-(zone, day) table, so converting many datetimes
+    only builds aware datetimes on the days a zone changes offset.
+    """
+    start, end = _day_offsets(name, moment.date(), False)
+    if start == end:
+        return moment + start
+    return moment + moment.replace(tzinfo=timezone.utc).astimezone(get_timezone(name)).utcoffset()
+
+
+def to_utc(local: datetime, name: Optional[str]) -> datetime:
+    """Convert naive wall time in time zone ``name`` to a naive UTC datetime.
+
+    A wall time skipped by a DST change resolves with the offset in force
+    before it, e.g. 02:30 on a spring-forward night becomes 03:30.
+    """
+    start, end = _day_offsets(name, local.date(), True)
+    if start == end:
+        return local - start
+    return local - local.replace(tzinfo=get_timezone(name)).utcoffset()
+
+
+def _parse_time(value: str) -> time:
+    hours, _, minutes = value.strip().partition(":")
+    return time(int(hours), int(minutes or 0))
+
+
+@dataclass(frozen=True)
+class SendWindow:
+    """Local times of day between which patients may be texted.
+
+    Outside ``[start, end)`` are quiet hours; ``start == end`` lifts the
+    restriction. With ``spread`` a reminder goes out at a point in its day's
+    window picked by hashing its key, instead of at the appointment's time of
+    day clamped into the window, which spreads sends evenly over the window.
+    """
+
+    start: time = time(0)
+    end: time = time(0)
+    spread: bool = False
+
+    def __post_init__(self) -> None:
+        if self.start > self.end:
+            raise ValueError(f"Send window starts after it ends: {self.start:%H:%M}-{self.end:%H:%M}")
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "SendWindow":
+        return cls(
+            start=_parse_time(settings.send_window_start),
+            end=_parse_time(settings.send_window_end),
+            spread=settings.send_window_spread,
+        )
+
+    @property
+    def unrestricted(self) -> bool:
+        return self.start == self.end
+
+    def send_time(self, local: datetime, key: str, deadline: Optional[datetime] = None) -> datetime:
+        """Local time to send a reminder nominally due at ``local``, on the same day.
+
+        A send moved to or past ``deadline`` (the appointment's local start)
+        goes out in the last minute of the window before it instead, which
+        may be the evening before.
+        """
+        if self.unrestricted:
+            return local
+        day = local.date()
+        opens = datetime.combine(day, self.start)
+        closes = datetime.combine(day, self.end)
+        if self.spread:
+            length = int((closes - opens).total_seconds())
+            send = opens + timedelta(seconds=zlib.crc32(key.encode()) % length)
+        else:
+            # The window is half-open; the last minute of it is the latest send.
+            send = min(max(local, opens), closes - timedelta(minutes=1))
+        if deadline is not None and send >= deadline:
+            send = self.last_before(deadline)
+        return send
+
+    def last_before(self, local: datetime) -> datetime:
+        """The last minute of the window that starts before ``local``."""
+        latest = local - timedelta(minutes=1)
+        if self.unrestricted:
+            return latest
+        if latest.time() < self.start:
+            latest = datetime.combine(latest.date() - timedelta(days=1), self.end)
+        return min(latest, datetime.combine(latest.date(), self.end) - timedelta(minutes=1))
+
+    def next_open(self, local: datetime, key: str) -> Optional[datetime]:
+        """``None`` if ``local`` is inside the window, else when the reminder ``key`` may go out."""
+        if self.unrestricted or self.start <= local.time() < self.end:
+            return None
+        day = local.date() if local.time() < self.start else local.date() + timedelta(days=1)
+        return self.send_time(datetime.combine(day, self.start), key)
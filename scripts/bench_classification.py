@@ -0,0 +1,76 @@
+"""Micro-benchmark the reply intent classifier.
+
+Usage:
+    python scripts/bench_classification.py [COUNT]
+
+Classifies COUNT (default 1,000,000) synthetic replies with the original
+substring-scan classifier and with the compiled one, one at a time and
+through ``classify_batch``.
+"""
+import os
+import random
+import sys
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.utils.classification import (  # noqa: E402
+    INTENT_PATTERNS,
+    classify_batch,
+    classify_reply_intent,
+)
+
+SHORT_REPLIES = ["Yes", "yes", "Y", "C", "No", "OK", "Ok thanks", "STOP", "Confirm", "Sure"]
+FILLER = ["i", "the", "appointment", "please", "thanks", "know", "will", "tomorrow", "doctor", "my"]
+
+
+def legacy_classify(message: str) -> str:
+    """The substring-scan classifier this module replaced."""
+    message_lower = message.lower()
+
+    confirm_matches = sum(1 for pattern in INTENT_PATTERNS["confirmed"] if pattern in message_lower)
+    cancel_matches = sum(1 for pattern in INTENT_PATTERNS["cancel"] if pattern in message_lower)
+    reschedule_matches = sum(1 for pattern in INTENT_PATTERNS["reschedule"] if pattern in message_lower)
+
+    if confirm_matches > cancel_matches and confirm_matches > reschedule_matches:
+        return "confirmed"
+    if cancel_matches > confirm_matches and cancel_matches > reschedule_matches:
+        return "cancel"
+    if reschedule_matches > confirm_matches and reschedule_matches > cancel_matches:
+        return "reschedule"
+    return "unknown"
+
+
+def synthetic_replies(count: int, seed: int = 42) -> List[str]:
+    rng = random.Random(seed)
+    phrases = [phrase for group in INTENT_PATTERNS.values() for phrase in group]
+    replies = []
+    for _ in range(count):
+        if rng.random() < 0.6:
+            replies.append(rng.choice(SHORT_REPLIES))
+        else:
+            words = rng.choices(FILLER, k=rng.randint(3, 12))
+            words.insert(rng.randrange(len(words) + 1), rng.choice(phrases))
+            replies.append(" ".join(words).capitalize())
+    return replies
+
+
+def timed(label: str, func: Callable[[], List[str]], count: int) -> None:
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:7.2f}s  {count / elapsed:>12,.0f} replies/s")
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    replies = synthetic_replies(count)
+
+    timed("legacy substring scan", lambda: [legacy_classify(m) for m in replies], count)
+    timed("compiled regex", lambda: [classify_reply_intent(m) for m in replies], count)
+    timed("compiled regex (batch)", lambda: classify_batch(replies), count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Load-test reminder dispatch end-to-end against the bundled stub SMS provider.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python scripts/bench_dispatch.py [WORKERS ...]
+    python scripts/bench_dispatch.py --provider-only [CONCURRENCY ...]
+
+The first form seeds BENCH_REMINDERS due reminders (default 5,000) into a
+scratch database, starts the stub provider in-process and runs
+``dispatch_due_reminders`` over HTTP once per WORKERS value (default 1, 4,
+16, 32), printing messages/second. ``--provider-only`` skips Mongo and drives
+the stub with ``AsyncHttpProvider`` at each CONCURRENCY value (default 1, 16,
+64, 256), printing throughput and latency percentiles.
+
+Stub behaviour is set with BENCH_LATENCY_MS (default 50), BENCH_FAILURE_RATE
+(default 0.05) and BENCH_BATCH_SIZE (messages per request, default 1).
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.reminder_service import dispatch_due_reminders  # noqa: E402
+from app.sms.base import SmsMessage  # noqa: E402
+from app.sms.http_provider import AsyncHttpProvider, HttpProvider  # noqa: E402
+from app.sms.stub_server import StubProviderServer  # noqa: E402
+from app.utils.batching import chunked  # noqa: E402
+
+REMINDERS = int(os.getenv("BENCH_REMINDERS", "5000"))
+LATENCY = float(os.getenv("BENCH_LATENCY_MS", "50")) / 1000
+FAILURE_RATE = float(os.getenv("BENCH_FAILURE_RATE", "0.05"))
+BATCH_SIZE = int(os.getenv("BENCH_BATCH_SIZE", "1"))
+SEED_BATCH = 10_000
+
+
+def start_stub() -> StubProviderServer:
+    server = StubProviderServer(("127.0.0.1", 0), latency=LATENCY, failure_rate=FAILURE_RATE)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def seed(db, size: int) -> None:
+    for collection in ["patients", "appointments", "reminders", "events", "reminder_stats"]:
+        db[collection].drop()
+
+    now = datetime.utcnow()
+    for chunk in chunked(range(size), SEED_BATCH):
+        db.patients.insert_many(
+            [
+                {"id": f"p{i}", "full_name": f"Bench Patient {i}", "phone_e164": f"+1555{i:07d}", "tz": "UTC"}
+                for i in chunk
+            ]
+        )
+        db.appointments.insert_many(
+            [
+                {
+                    "id": f"a{i}",
+                    "patient_id": f"p{i}",
+                    "start_at": now + timedelta(days=2),
+                    "provider": "Dr. Bench",
+                    "location": "Bench Clinic",
+                    "status": "scheduled",
+                }
+                for i in chunk
+            ]
+        )
+        db.reminders.insert_many(
+            [
+                {
+                    "id": str(uuid.uuid4()),
+                    "appointment_id": f"a{i}",
+                    "offset_days": 2,
+                    "scheduled_for": now - timedelta(minutes=1),
+                    "status": "scheduled",
+                    "attempts": 0,
+                }
+                for i in chunk
+            ]
+        )
+
+    db.patients.create_index("id")
+    db.appointments.create_index("id")
+    db.reminders.create_index("id")
+    db.reminders.create_index([("status", 1), ("scheduled_for", 1)])
+
+
+def run_dispatch(db, stub: StubProviderServer, workers: int) -> None:
+    seed(db, REMINDERS)
+    provider = HttpProvider(stub.url, max_connections=workers, max_batch_size=BATCH_SIZE)
+    try:
+        started = time.perf_counter()
+        dispatch_due_reminders(db, lambda _msg: None, workers=workers, batch_size=100, provider=provider)
+        elapsed = time.perf_counter() - started
+    finally:
+        provider.close()
+
+    sent = db.reminders.count_documents({"status": {"$in": ["delivered", "failed"]}})
+    print(f"{workers:>4} workers: {sent:>7,} messages in {elapsed:7.2f}s ({sent / elapsed:,.0f} msg/s)")
+
+
+async def run_provider(stub: StubProviderServer, concurrency: int) -> None:
+    provider = AsyncHttpProvider(stub.url, max_connections=concurrency, max_batch_size=BATCH_SIZE)
+    latencies: List[float] = []
+    messages = [SmsMessage(f"+1555{i:07d}", "Bench reminder", str(i)) for i in range(REMINDERS)]
+    requests = iter(chunked(messages, BATCH_SIZE))
+
+    async def worker() -> None:
+        for batch in requests:
+            started = time.perf_counter()
+            await provider.send_batch(batch)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await provider.aclose()
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(
+        f"{concurrency:>4} in flight: {len(messages) / elapsed:>8,.0f} msg/s  "
+        f"p50 {percentile(0.5):6.1f}ms  p95 {percentile(0.95):6.1f}ms  p99 {percentile(0.99):6.1f}ms"
+    )
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    provider_only = "--provider-only" in args
+    levels = [int(arg) for arg in args if arg != "--provider-only"]
+    stub = start_stub()
+    try:
+        if provider_only:
+            for concurrency in levels or [1, 16, 64, 256]:
+                asyncio.run(run_provider(stub, concurrency))
+            return
+
+        client = MongoClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+        db = client[os.getenv("BENCH_DB_NAME", "bench_reminder_db")]
+        try:
+            for workers in levels or [1, 4, 16, 32]:
+                run_dispatch(db, stub, workers)
+        finally:
+            client.drop_database(db.name)
+    finally:
+        stub.shutdown()
+        stub.server_close()
+
+
+if __name__ == "__main__":
+    main()
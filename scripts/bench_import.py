@@ -0,0 +1,103 @@
+"""Measure bulk import throughput against a local mongod.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python scripts/bench_import.py [APPOINTMENTS]
+
+Writes BENCH_PATIENTS patients (default 100,000) and APPOINTMENTS
+appointments (default 1,000,000) to CSV files in a temporary directory, then
+imports both into a scratch database with ``import_patients`` and
+``import_appointments``, printing rows/second for each. BENCH_CHUNK_SIZE sets
+the rows per bulk round trip (default 1,000); BENCH_FORMAT=jsonl generates
+JSONL instead of CSV.
+"""
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.db.indexes import ensure_indexes  # noqa: E402
+from app.services.import_service import import_appointments, import_patients  # noqa: E402
+
+PATIENTS = int(os.getenv("BENCH_PATIENTS", "100000"))
+CHUNK_SIZE = int(os.getenv("BENCH_CHUNK_SIZE", "1000"))
+FORMAT = os.getenv("BENCH_FORMAT", "csv")
+TIME_ZONES = ["America/New_York", "America/Chicago", "America/Los_Angeles", "Europe/London", "UTC"]
+
+
+def write_rows(path: str, fieldnames, rows) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        if FORMAT == "jsonl":
+            for row in rows:
+                file.write(json.dumps(row) + "\n")
+            return
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def generate(directory: str, appointments: int):
+    patients_path = os.path.join(directory, f"patients.{FORMAT}")
+    appointments_path = os.path.join(directory, f"appointments.{FORMAT}")
+    write_rows(
+        patients_path,
+        ["id", "name", "phone", "tz"],
+        (
+            {"id": f"p{i}", "name": f"Bench Patient {i}", "phone": f"+1555{i:07d}", "tz": random.choice(TIME_ZONES)}
+            for i in range(PATIENTS)
+        ),
+    )
+    start = datetime(2025, 3, 1, 8)
+    write_rows(
+        appointments_path,
+        ["patient_id", "start_at", "provider", "location"],
+        (
+            {
+                "patient_id": f"p{random.randrange(PATIENTS)}",
+                "start_at": (start + timedelta(minutes=15 * random.randrange(20_000))).isoformat() + "Z",
+                "provider": f"Dr. Bench {i % 50}",
+                "location": "Bench Clinic",
+            }
+            for i in range(appointments)
+        ),
+    )
+    return patients_path, appointments_path
+
+
+def timed(label: str, rows: int, run) -> None:
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    print(f"{label:>12}: {rows:>9,} rows in {elapsed:7.2f}s ({rows / elapsed:,.0f} rows/s)")
+
+
+def main() -> None:
+    appointments = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    client = MongoClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("BENCH_DB_NAME", "bench_reminder_db")]
+    client.drop_database(db.name)
+    ensure_indexes(db)
+    quiet = lambda _msg: None  # noqa: E731
+
+    with tempfile.TemporaryDirectory() as directory:
+        patients_path, appointments_path = generate(directory, appointments)
+        try:
+            timed("patients", PATIENTS, lambda: import_patients(db, patients_path, quiet, chunk_size=CHUNK_SIZE))
+            timed(
+                "appointments",
+                appointments,
+                lambda: import_appointments(db, appointments_path, quiet, chunk_size=CHUNK_SIZE),
+            )
+        finally:
+            client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    main()
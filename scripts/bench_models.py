@@ -0,0 +1,100 @@
+"""Compare the domain models with raw dicts for reminder documents.
+
+Usage:
+    python scripts/bench_models.py [REMINDERS]
+
+Needs no database. Builds REMINDERS reminder documents (default 1,000,000)
+the way the dispatcher reads them and reports, for raw dicts and for
+``Reminder`` instances, the memory held per 1M reminders (tracemalloc) and
+the cost of each conversion: BSON decode alone, decode plus ``from_doc``,
+``to_doc`` plus BSON encode, and ``validate``.
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+import bson
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.models.models import Reminder  # noqa: E402
+
+VALIDATE_SAMPLE = 100_000
+
+
+def documents(count: int):
+    now = datetime(2025, 3, 1, 8)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "appointment_id": str(uuid.uuid4()),
+            "offset_days": (1, 2, 7)[i % 3],
+            "scheduled_for": now + timedelta(minutes=i % 10_000),
+            "partition": i % 64,
+            "status": "scheduled",
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def measure_memory(label: str, count: int, build) -> None:
+    gc.collect()
+    tracemalloc.start()
+    items = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_million = current * 1_000_000 / count / 2**20
+    print(f"{label:>26}: {per_million:8,.0f} MiB per 1M ({current / count:5,.0f} B each)")
+    del items
+
+
+def timed(label: str, count: int, run) -> None:
+    # As timeit does: collections over the millions of live objects would
+    # otherwise dominate the timings.
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+    finally:
+        gc.enable()
+    print(f"{label:>26}: {elapsed * 1e9 / count:8,.0f} ns/doc ({count / elapsed:>12,.0f} docs/s)")
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    raw = documents(count)
+    encoded = [bson.encode(doc) for doc in raw]
+    print(f"{count:,} reminders\n")
+
+    print("Memory held (documents decoded from BSON):")
+    measure_memory("dict", count, lambda: [bson.decode(data) for data in encoded])
+    measure_memory("Reminder", count, lambda: [Reminder.from_doc(bson.decode(data)) for data in encoded])
+
+    models = [Reminder.from_doc(doc) for doc in raw]
+    print("\nConversion cost:")
+    timed("bson.decode", count, lambda: [bson.decode(data) for data in encoded])
+    timed("bson.decode + from_doc", count, lambda: [Reminder.from_doc(bson.decode(data)) for data in encoded])
+    timed("from_doc", count, lambda: [Reminder.from_doc(doc) for doc in raw])
+    timed("bson.encode", count, lambda: [bson.encode(doc) for doc in raw])
+    timed("to_doc + bson.encode", count, lambda: [bson.encode(model.to_doc()) for model in models])
+    timed("to_doc", count, lambda: [model.to_doc() for model in models])
+    sample = raw[: min(count, VALIDATE_SAMPLE)]
+    Reminder.validate(sample[0])
+    timed("validate", len(sample), lambda: [Reminder.validate(doc) for doc in sample])
+
+    print("\nAttribute access (sum offset_days):")
+    timed("dict[key]", count, lambda: sum(doc["offset_days"] for doc in raw))
+    timed("model.attr", count, lambda: sum(model.offset_days for model in models))
+
+
+if __name__ == "__main__":
+    main()
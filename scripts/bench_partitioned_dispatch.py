@@ -0,0 +1,121 @@
+"""Measure how dispatch throughput scales with the number of dispatcher processes.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python scripts/bench_partitioned_dispatch.py [PROCESSES ...]
+    python scripts/bench_partitioned_dispatch.py --unpartitioned [PROCESSES ...]
+
+For each PROCESSES value (default 1, 2, 4, 8) the script seeds
+BENCH_REMINDERS due reminders (default 20,000) into a scratch database and
+starts that many dispatcher processes. Each joins the dispatch group through
+``PartitionMembership``, waits until it sees every other member, and then
+dispatches only the partitions it owns, the way ``serve`` instances do. The
+run prints messages/second and the speedup over the first level.
+``--unpartitioned`` makes every process dispatch the whole due set instead,
+which is what instances did before partitioning.
+
+Sends go to the simulated provider with BENCH_LATENCY_MS of latency per
+request (default 20), so the sender, not the CPU, is the bottleneck, as it is
+against a real carrier. BENCH_WORKERS sets the worker threads per process
+(default 4). Reminders are seeded as in ``bench_dispatch.py``, with quiet
+hours lifted so none is deferred to the next send window.
+"""
+import multiprocessing
+import os
+import sys
+import time
+from datetime import timedelta
+from typing import Optional
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.partition_service import PartitionMembership, backfill_reminder_partitions  # noqa: E402
+from app.services.reminder_service import dispatch_due_reminders  # noqa: E402
+from app.sms.simulated import SimulatedProvider  # noqa: E402
+from bench_dispatch import seed  # noqa: E402
+
+REMINDERS = int(os.getenv("BENCH_REMINDERS", "20000"))
+LATENCY = float(os.getenv("BENCH_LATENCY_MS", "20")) / 1000
+WORKERS = int(os.getenv("BENCH_WORKERS", "4"))
+PARTITIONS = int(os.getenv("BENCH_PARTITIONS", "64"))
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.getenv("BENCH_DB_NAME", "bench_reminder_db")
+
+
+def dispatcher(processes: int, partitioned: bool, ready, start) -> None:
+    client = MongoClient(MONGO_URL)
+    db = client[DB_NAME]
+    provider = SimulatedProvider(failure_rate=0, latency=LATENCY)
+    membership: Optional[PartitionMembership] = None
+    try:
+        if partitioned:
+            membership = PartitionMembership(db, PARTITIONS, timedelta(seconds=60))
+            membership.heartbeat()
+            ready.wait()
+            # Everyone has registered; this heartbeat sees the full group.
+            membership.heartbeat()
+            assert len(membership.members) == processes, membership.members
+        else:
+            ready.wait()
+        start.wait()
+        dispatch_due_reminders(
+            db,
+            lambda _msg: None,
+            workers=WORKERS,
+            batch_size=100,
+            provider=provider,
+            partitions=membership.partition_filter() if membership else None,
+        )
+    finally:
+        if membership:
+            membership.leave()
+        client.close()
+
+
+def run(db, processes: int, partitioned: bool) -> float:
+    seed(db, REMINDERS)
+    db.dispatch_members.drop()
+    backfill_reminder_partitions(db, PARTITIONS, lambda _msg: None)
+    db.reminders.create_index([("status", 1), ("partition", 1), ("scheduled_for", 1)])
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(processes)
+    start = context.Barrier(processes + 1)
+    workers = [
+        context.Process(target=dispatcher, args=(processes, partitioned, ready, start)) for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    start.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    failed = [worker.exitcode for worker in workers if worker.exitcode]
+    if failed:
+        raise SystemExit(f"{len(failed)} dispatcher processes failed")
+    sent = db.reminders.count_documents({"status": "delivered"})
+    return sent / elapsed
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    partitioned = "--unpartitioned" not in args
+    levels = [int(arg) for arg in args if arg != "--unpartitioned"] or [1, 2, 4, 8]
+
+    client = MongoClient(MONGO_URL)
+    db = client[DB_NAME]
+    baseline = None
+    try:
+        for processes in levels:
+            rate = run(db, processes, partitioned)
+            baseline = baseline or rate
+            print(f"{processes:>3} processes: {rate:>8,.0f} msg/s  ({rate / baseline:4.2f}x)")
+    finally:
+        client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark reminder scheduling throughput against a local mongod.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python scripts/bench_schedule.py [SIZE ...]
+
+Seeds SIZE appointments (default: 10k, 100k and 1M) into a scratch database,
+runs ``schedule_reminders`` with offsets 7,2 and prints reminders/second.
+"""
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.reminder_service import schedule_reminders  # noqa: E402
+from app.utils.batching import chunked  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+APPOINTMENTS_PER_PATIENT = 4
+SEED_BATCH = 10_000
+
+
+def seed(db, size: int) -> None:
+    for collection in ["patients", "appointments", "reminders"]:
+        db[collection].drop()
+
+    now = datetime.utcnow()
+    patient_count = max(1, size // APPOINTMENTS_PER_PATIENT)
+    patient_ids = [str(uuid.uuid4()) for _ in range(patient_count)]
+
+    for chunk in chunked(range(patient_count), SEED_BATCH):
+        db.patients.insert_many(
+            [
+                {
+                    "id": patient_ids[i],
+                    "full_name": f"Bench Patient {i}",
+                    "phone_e164": f"+1555{i:07d}",
+                    "tz": "UTC",
+                    "active": True,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for i in chunk
+            ]
+        )
+
+    for chunk in chunked(range(size), SEED_BATCH):
+        db.appointments.insert_many(
+            [
+                {
+                    "id": str(uuid.uuid4()),
+                    "patient_id": patient_ids[i % patient_count],
+                    "start_at": now + timedelta(days=10, minutes=i % (20 * 24 * 60)),
+                    "provider": "Dr. Bench",
+                    "location": "Bench Clinic",
+                    "status": "scheduled",
+                    "version": 1,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for i in chunk
+            ]
+        )
+
+    db.patients.create_index("id")
+    db.appointments.create_index([("status", 1), ("start_at", 1)])
+    db.reminders.create_index([("appointment_id", 1), ("offset_days", 1)], unique=True)
+
+
+def run(db, size: int) -> None:
+    seed(db, size)
+
+    today = datetime.utcnow().date()
+    from_date = today.isoformat()
+    to_date = (today + timedelta(days=40)).isoformat()
+
+    started = time.perf_counter()
+    schedule_reminders(db, from_date, to_date, "7,2", lambda _msg: None)
+    elapsed = time.perf_counter() - started
+
+    created = db.reminders.count_documents({})
+    print(
+        f"{size:>9,} appointments: {created:>9,} reminders in {elapsed:7.2f}s "
+        f"({created / elapsed:,.0f} reminders/s)"
+    )
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    client = MongoClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.getenv("BENCH_DB_NAME", "bench_reminder_db")]
+    try:
+        for size in sizes:
+            run(db, size)
+    finally:
+        client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Check that `reminderctl --help` starts within a time budget.
+
+Usage:
+    python scripts/check_startup.py [BUDGET_MS]
+
+Runs ``python -X importtime -m app.cli.main --help`` STARTUP_RUNS times
+(default 5) in fresh interpreters and takes the median of the total time
+spent importing modules and of the wall time. Exits non-zero if the
+median import time exceeds BUDGET_MS (default STARTUP_BUDGET_MS or 300),
+printing the slowest imports so the regression is easy to find.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+RUNS = int(os.getenv("STARTUP_RUNS", "5"))
+
+
+def measure() -> Tuple[float, float, Dict[str, int]]:
+    """Return (import ms, wall ms, cumulative us per module) for one cold start."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "app.cli.main", "--help"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall = (time.perf_counter() - started) * 1000
+
+    # Lines look like "import time: self [us] | cumulative | imported package";
+    # the self times add up to all the time the process spent importing.
+    cumulative: Dict[str, int] = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, total, name = line[len("import time:"):].split("|")
+        total_us += int(own)
+        cumulative[name.strip()] = int(total)
+    return total_us / 1000, wall, cumulative
+
+
+def main() -> None:
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else float(os.getenv("STARTUP_BUDGET_MS", "300"))
+    runs: List[Tuple[float, float, Dict[str, int]]] = [measure() for _ in range(RUNS)]
+    imports = statistics.median(run[0] for run in runs)
+    wall = statistics.median(run[1] for run in runs)
+    print(f"reminderctl --help: {imports:.0f}ms importing, {wall:.0f}ms wall (median of {RUNS}, budget {budget:.0f}ms)")
+
+    if imports > budget:
+        slowest = sorted(runs[-1][2].items(), key=lambda item: item[1], reverse=True)[:15]
+        for name, total in slowest:
+            print(f"  {total / 1000:8.1f}ms  {name}")
+        raise SystemExit(f"Startup import time {imports:.0f}ms exceeds the {budget:.0f}ms budget")
+
+
+if __name__ == "__main__":
+    main()
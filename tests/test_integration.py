@@ -4,17 +4,154 @@ import os
 from datetime import datetime, timedelta
 import uuid
 import csv
+import json
 import tempfile
 
+from app.sms.base import SendResult, SmsProvider
+
 @pytest.fixture
 def test_db():
     client = MongoClient(os.getenv("MONGO_URL", "mongodb://localhost:27017"))
     db = client["test_reminder_db"]
     # Clean up
-    for collection in ["patients", "appointments", "templates", "reminders", "events"]:
+    for collection in ["patients", "appointments", "templates", "reminders", "events", "dead_letters", "reminder_stats", "import_checkpoints"]:
         db[collection].delete_many({})
     return db
 
+def insert_due_reminders(db, prefix, count):
+    """Insert ``count`` patients, each with an appointment and one due reminder"""
+    now = datetime.utcnow()
+    for i in range(count):
+        db.patients.insert_one({"id": f"{prefix}-patient-{i}", "full_name": f"{prefix} Patient", "phone_e164": f"+1555{i:07d}"})
+        db.appointments.insert_one({
+            "id": f"{prefix}-{i}",
+            "patient_id": f"{prefix}-patient-{i}",
+            "start_at": now + timedelta(days=2),
+            "provider": "Dr. Dispatch",
+            "location": "Test Clinic",
+            "status": "scheduled",
+        })
+        db.reminders.insert_one({
+            "id": f"{prefix}-reminder-{i}",
+            "appointment_id": f"{prefix}-{i}",
+            "offset_days": 2,
+            "scheduled_for": now - timedelta(minutes=1),
+            "status": "scheduled",
+            "attempts": 0,
+        })
+
+def write_confirmations(db, path, count):
+    """Insert ``count`` patients with two scheduled appointments each and write a file of their "Yes" replies"""
+    start_at = datetime.utcnow() + timedelta(days=3)
+    lines = ["event_id,from,to,message,received_at"]
+    for i in range(count):
+        db.patients.insert_one({"id": f"reply-patient-{i}", "full_name": "Reply Test", "phone_e164": f"+1555777{i:04d}"})
+        for day in range(2):
+            db.appointments.insert_one({
+                "id": f"reply-{i}-{day}",
+                "patient_id": f"reply-patient-{i}",
+                "start_at": start_at + timedelta(days=day),
+                "provider": "Dr. Reply",
+                "location": "Test Clinic",
+                "status": "scheduled",
+                "version": 1,
+            })
+        lines.append(f"sms-{i},+1555777{i:04d},+15551234567,Yes I will be there,{datetime.utcnow().isoformat()}")
+    path.write_text("\n".join(lines) + "\n")
+
+def assert_replies_applied_once(db, count):
+    """Each reply event was recorded, and confirmed one appointment, exactly once"""
+    events = list(db.events.find({"type": "reply_received"}))
+    assert sorted(event["source_event_id"] for event in events) == sorted(f"sms-{i}" for i in range(count))
+    assert db.events.count_documents({"type": "status_changed"}) == count
+    for i in range(count):
+        assert db.appointments.count_documents({"patient_id": f"reply-patient-{i}", "status": "confirmed"}) == 1
+
+def insert_reported_reminders(db):
+    """Insert one reminder in each report state, plus one whose appointment is gone"""
+    now = datetime.utcnow().replace(microsecond=0)
+    db.patients.insert_one({"id": "report-patient", "full_name": "Report Test", "phone_e164": "+15559990000"})
+    db.appointments.insert_one({"id": "report-appointment", "patient_id": "report-patient", "start_at": now + timedelta(days=2), "status": "scheduled"})
+    reminders = [
+        {"id": "report-scheduled", "status": "scheduled", "attempts": 0},
+        {"id": "report-delivered", "status": "delivered", "attempts": 1, "dispatched_at": now, "delivered_at": now},
+        {"id": "report-failed", "status": "failed", "attempts": 2, "dispatched_at": now, "last_error": "Carrier timeout"},
+    ]
+    for reminder in reminders:
+        db.reminders.insert_one({**reminder, "appointment_id": "report-appointment", "offset_days": 1, "scheduled_for": now + timedelta(days=1)})
+    db.reminders.insert_one({"id": "report-orphan", "appointment_id": "gone", "offset_days": 1, "scheduled_for": now, "status": "scheduled", "attempts": 0})
+
+def report_rows(path, format):
+    """Rows of an exported reminders report, with typed values, whatever its format"""
+    import gzip
+
+    if format in ("csv", "csv.gz"):
+        opener = gzip.open if format == "csv.gz" else open
+        with opener(path, "rt", newline="") as report:
+            rows = list(csv.DictReader(report))
+        for row in rows:
+            for field in ("offset_days", "attempts"):
+                row[field] = int(row[field])
+            for field in ("scheduled_for", "dispatched_at", "delivered_at"):
+                row[field] = datetime.fromisoformat(row[field]) if row[field] else None
+            row["last_error"] = row["last_error"] or None
+        return rows
+
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    table = pyarrow.parquet.read_table(path) if format == "parquet" else pyarrow.ipc.open_file(path).read_all()
+    rows = table.to_pylist()
+    for row in rows:
+        for field in ("scheduled_for", "dispatched_at", "delivered_at"):
+            if row[field]:
+                row[field] = row[field].replace(tzinfo=None)
+    return rows
+
+def rollup_counts(db):
+    """Non-zero delivery rollups, keyed by (day, offset_days, status, provider, location)"""
+    return {
+        (row["day"], row["offset_days"], row["status"], row["provider"], row["location"]): row["count"]
+        for row in db.reminder_stats.find()
+        if row["count"]
+    }
+
+def assert_rollups_match_rebuild(db):
+    """The incrementally maintained rollups equal the ones rebuilt from the reminders"""
+    from app.services.stats_service import rebuild_rollups
+
+    incremental = rollup_counts(db)
+    rebuild_rollups(db, "2000-01-01", "2099-12-31", lambda _msg: None)
+    assert rollup_counts(db) == incremental
+
+class FailingNumbersProvider(SmsProvider):
+    """Delivers every message except those to ``failing`` numbers, whose sends fail and are retried"""
+
+    name = "test"
+
+    def __init__(self, failing=()):
+        super().__init__()
+        self.failing = set(failing)
+
+    def _send_batch(self, messages):
+        return [
+            SendResult(message.reference, False, error="Carrier timeout")
+            if message.to in self.failing
+            else SendResult(message.reference, True, provider_message_id=str(uuid.uuid4()))
+            for message in messages
+        ]
+
+@pytest.fixture
+def quiet_hours(monkeypatch):
+    """Only text patients between 09:00 and 20:00 their time"""
+    from app.config.settings import get_settings
+
+    monkeypatch.setenv("SEND_WINDOW_START", "09:00")
+    monkeypatch.setenv("SEND_WINDOW_END", "20:00")
+    get_settings.cache_clear()
+    yield
+    get_settings.cache_clear()
+
 def test_complete_workflow(test_db):
     """Test the complete reminder workflow"""
     # 1. Create patient
@@ -91,5 +228,642 @@ def test_complete_workflow(test_db):
     
     print("✅ Complete workflow test passed!")
 
+def test_scheduling_twice_skips_every_existing_reminder(test_db):
+    """A second scheduling run over the same range creates nothing and skips every reminder"""
+    from app.services.reminder_service import schedule_reminders
+
+    start_at = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0) + timedelta(days=10)
+    for i in range(5):
+        test_db.patients.insert_one({"id": f"twice-patient-{i}", "full_name": "Twice Test", "phone_e164": f"+1555888000{i}", "tz": "UTC", "active": True})
+        test_db.appointments.insert_one({"id": f"twice-{i}", "patient_id": f"twice-patient-{i}", "start_at": start_at, "status": "scheduled"})
+    day = start_at.date().isoformat()
+
+    first, second = [], []
+    schedule_reminders(test_db, day, day, "1,2", first.append, batch_size=2)
+    schedule_reminders(test_db, day, day, "1,2", second.append, batch_size=2)
+
+    assert first[-1] == "📅 Summary: Created 10 reminders, skipped 0"
+    assert second[-1] == "📅 Summary: Created 0 reminders, skipped 10"
+    assert test_db.reminders.count_documents({}) == 10
+    assert test_db.events.count_documents({"type": "reminder_scheduled"}) == 10
+
+def test_concurrent_workers_send_each_reminder_once(test_db):
+    """Dispatching with a worker pool sends every due reminder exactly once"""
+    from app.services.reminder_service import dispatch_due_reminders
+    from app.sms import DispatchThrottle
+
+    class RecordingProvider(FailingNumbersProvider):
+        def __init__(self):
+            super().__init__()
+            self.sent = []
+
+        def _send_batch(self, messages):
+            self.sent.extend(message.reference for message in messages)
+            return super()._send_batch(messages)
+
+    insert_due_reminders(test_db, "pool", 20)
+    provider = RecordingProvider()
+    totals = dispatch_due_reminders(
+        test_db, lambda _msg: None, workers=4, batch_size=3, provider=provider, throttle=DispatchThrottle()
+    )
+
+    assert sorted(provider.sent) == sorted(f"pool-reminder-{i}" for i in range(20))
+    assert totals["dispatched"] == 20
+    assert test_db.reminders.count_documents({"status": "delivered"}) == 20
+
+def test_failed_worker_chunk_fails_the_dispatch(test_db, monkeypatch):
+    """An error in one worker's chunk is raised once the other chunks are sent and counted"""
+    from app.services import reminder_service
+    from app.sms import DispatchThrottle
+
+    dispatch_chunk = reminder_service._dispatch_chunk
+
+    def fail_first_reminder(db, chunk, *args):
+        if any(reminder.id == "pool-reminder-0" for reminder in chunk):
+            raise RuntimeError("chunk exploded")
+        return dispatch_chunk(db, chunk, *args)
+
+    insert_due_reminders(test_db, "pool", 6)
+    monkeypatch.setattr(reminder_service, "_dispatch_chunk", fail_first_reminder)
+    messages = []
+    with pytest.raises(RuntimeError, match="chunk exploded"):
+        reminder_service.dispatch_due_reminders(
+            test_db, messages.append, workers=2, batch_size=2, provider=FailingNumbersProvider(), throttle=DispatchThrottle()
+        )
+
+    assert "  ❌ A chunk of 2 reminders failed: chunk exploded" in messages
+    assert messages[-1] == "🚀 Dispatch complete: 4 sent, 0 failed, 1 chunks failed"
+
+def test_number_limit_is_only_charged_for_claimed_reminders(test_db, monkeypatch):
+    """A reminder lost to another worker takes no send slot; one over the limit goes back as it was"""
+    from app.services import reminder_service
+    from app.sms import DispatchThrottle
+    from app.utils.rate_limit import KeyedTokenBuckets
+
+    def due_reminder(reminder_id, offset_days):
+        return {
+            "id": reminder_id,
+            "appointment_id": "phone-0",
+            "offset_days": offset_days,
+            "scheduled_for": datetime.utcnow() - timedelta(minutes=1),
+            "status": "scheduled",
+            "attempts": 0,
+        }
+
+    # The reminder another worker wins is read first, so it is the first to reach the limit.
+    test_db.reminders.insert_one(due_reminder("phone-reminder-race", 3))
+    insert_due_reminders(test_db, "phone", 1)
+    test_db.reminders.insert_one(due_reminder("phone-reminder-extra", 1))
+    acquire = reminder_service._Claim.acquire
+
+    def lose_race(self, db, reminder_ids):
+        db.reminders.update_one({"id": "phone-reminder-race"}, {"$set": {"status": "dispatched", "claim_token": "other-worker"}})
+        return acquire(self, db, reminder_ids)
+
+    monkeypatch.setattr(reminder_service._Claim, "acquire", lose_race)
+    throttle = DispatchThrottle(phone_buckets=KeyedTokenBuckets(rate=1 / 60, capacity=1))
+    reminder_service.dispatch_due_reminders(test_db, lambda _msg: None, provider=FailingNumbersProvider(), throttle=throttle)
+
+    reminders = {
+        reminder["id"]: reminder
+        for reminder in test_db.reminders.find({"id": {"$in": ["phone-reminder-0", "phone-reminder-extra"]}})
+    }
+    assert sorted(reminder["status"] for reminder in reminders.values()) == ["delivered", "scheduled"]
+    (held,) = [reminder for reminder in reminders.values() if reminder["status"] == "scheduled"]
+    assert held["attempts"] == 0
+    assert held["scheduled_for"] > datetime.utcnow()
+    assert "claim_token" not in held and "claimed_from" not in held
+
+def test_reminder_is_not_deferred_past_its_appointment(test_db, quiet_hours):
+    """A reminder due in quiet hours that last until its appointment is canceled rather than deferred"""
+    from datetime import time
+
+    from app.services.reminder_service import dispatch_due_reminders
+    from app.sms import DispatchThrottle
+    from app.utils.timezones import to_local
+
+    # A zone where it is now around 03:00, six hours before the window opens.
+    offset = (3 - datetime.utcnow().hour) % 24
+    if offset > 14:
+        offset -= 24
+    tz = f"Etc/GMT{-offset:+d}"
+    insert_due_reminders(test_db, "quiet", 2)
+    test_db.patients.update_many({}, {"$set": {"tz": tz}})
+    test_db.appointments.update_one({"id": "quiet-0"}, {"$set": {"start_at": datetime.utcnow() + timedelta(hours=2)}})
+
+    totals = dispatch_due_reminders(test_db, lambda _msg: None, provider=FailingNumbersProvider(), throttle=DispatchThrottle())
+
+    assert (totals["dispatched"], totals["deferred"], totals["canceled"]) == (0, 1, 1)
+    canceled = test_db.reminders.find_one({"id": "quiet-reminder-0"})
+    assert (canceled["status"], canceled["cancel_reason"]) == ("canceled", "quiet_hours_until_start")
+    deferred = test_db.reminders.find_one({"id": "quiet-reminder-1"})
+    assert deferred["status"] == "scheduled"
+    assert to_local(deferred["scheduled_for"], tz).time() == time(9)
+
+def test_indexes_cover_service_queries(test_db):
+    """Every service query should be served by an index"""
+    from app.db.indexes import ensure_indexes, explain_queries
+
+    ensure_indexes(test_db)
+    ensure_indexes(test_db)  # idempotent
+
+    for description, stages in explain_queries(test_db):
+        assert "COLLSCAN" not in stages, description
+
+def test_reimporting_replies_applies_each_event_once(test_db, tmp_path):
+    """Importing the same replies file again skips every event_id already imported"""
+    from app.services.reply_service import process_replies
+
+    replies = tmp_path / "replies.csv"
+    write_confirmations(test_db, replies, 3)
+
+    process_replies(test_db, str(replies), True, lambda _msg: None)
+    messages = []
+    process_replies(test_db, str(replies), True, messages.append, resume=False)
+
+    assert_replies_applied_once(test_db, 3)
+    assert "0 processed, 0 status changes, 3 duplicates" in messages[-1]
+
+def test_interrupted_reply_import_resumes_from_checkpoint(test_db, tmp_path, monkeypatch):
+    """A re-run after an interrupted import continues after the last checkpointed chunk"""
+    from app.services import reply_service
+
+    replies = tmp_path / "replies.csv"
+    write_confirmations(test_db, replies, 5)
+    process_chunk = reply_service._process_reply_chunk
+    chunks = []
+
+    def interrupt_second_chunk(db, rows, *args):
+        chunks.append([row_num for row_num, _ in rows])
+        if len(chunks) == 2:
+            raise KeyboardInterrupt
+        return process_chunk(db, rows, *args)
+
+    monkeypatch.setattr(reply_service, "_process_reply_chunk", interrupt_second_chunk)
+    with pytest.raises(KeyboardInterrupt):
+        reply_service.process_replies(test_db, str(replies), True, lambda _msg: None, chunk_size=2)
+    assert test_db.events.count_documents({"type": "reply_received"}) == 2
+
+    messages = []
+    reply_service.process_replies(test_db, str(replies), True, messages.append, chunk_size=2)
+
+    assert f"⏩ Resuming {replies} after row 2" in messages
+    assert chunks[2:] == [[3, 4], [5]]
+    assert "3 processed, 3 status changes, 0 duplicates" in messages[-1]
+    assert_replies_applied_once(test_db, 5)
+
+def test_reply_import_stopped_before_its_status_changes_applies_them_on_resume(test_db, tmp_path, monkeypatch):
+    """Replies recorded by a run that stopped before changing their appointments are applied by the next run"""
+    from app.services import reply_service
+
+    replies = tmp_path / "replies.csv"
+    write_confirmations(test_db, replies, 3)
+    record_events = reply_service.record_events
+
+    def record_then_stop(db, events):
+        record_events(db, events)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(reply_service, "record_events", record_then_stop)
+    with pytest.raises(KeyboardInterrupt):
+        reply_service.process_replies(test_db, str(replies), True, lambda _msg: None)
+    assert test_db.appointments.count_documents({"status": "confirmed"}) == 0
+
+    monkeypatch.setattr(reply_service, "record_events", record_events)
+    messages = []
+    reply_service.process_replies(test_db, str(replies), True, messages.append)
+
+    assert "0 processed, 3 status changes, 3 duplicates" in messages[-1]
+    assert_replies_applied_once(test_db, 3)
+    assert test_db.events.count_documents({"pending_status_change": {"$exists": True}}) == 0
+
+def test_reminders_report_joins_appointments_and_patients(test_db, tmp_path):
+    """Each exported row carries its patient; reminders whose appointment is gone say so"""
+    from app.services.report_service import generate_reminders_report
+
+    insert_reported_reminders(test_db)
+    output = tmp_path / "report.csv"
+    messages = []
+    generate_reminders_report(test_db, "2000-01-01", "2099-12-31", str(output), messages.append)
+
+    with open(output, newline="") as report:
+        rows = {row["reminder_id"]: row for row in csv.DictReader(report)}
+    assert set(rows) == {"report-scheduled", "report-delivered", "report-failed", "report-orphan"}
+    assert (rows["report-failed"]["patient_name"], rows["report-failed"]["phone"]) == ("Report Test", "+15559990000")
+    assert rows["report-failed"]["last_error"] == "Carrier timeout"
+    delivered = test_db.reminders.find_one({"id": "report-delivered"})
+    for field in ("scheduled_for", "dispatched_at", "delivered_at"):
+        assert rows["report-delivered"][field] == delivered[field].isoformat()
+        assert datetime.fromisoformat(rows["report-delivered"][field]) == delivered[field]
+    assert rows["report-failed"]["delivered_at"] == ""
+    assert (rows["report-orphan"]["patient_name"], rows["report-orphan"]["phone"]) == ("Unknown", "Unknown")
+    assert "Found 4 reminders" in messages
+    assert messages[-1] == f"✅ Report exported to: {output}"
+
+def test_report_formats_export_the_same_rows(test_db, tmp_path):
+    """csv.gz, Arrow and Parquet reports hold the same rows as the CSV one"""
+    pytest.importorskip("pyarrow")
+    from app.services.report_service import generate_reminders_report
+
+    insert_reported_reminders(test_db)
+    rows = {}
+    for format in ("csv", "csv.gz", "arrow", "parquet"):
+        output = tmp_path / f"report.{format}"
+        generate_reminders_report(test_db, "2000-01-01", "2099-12-31", str(output), lambda _msg: None, format=format)
+        rows[format] = sorted(report_rows(output, format), key=lambda row: row["reminder_id"])
+
+    assert [row["reminder_id"] for row in rows["csv"]] == ["report-delivered", "report-failed", "report-orphan", "report-scheduled"]
+    assert rows["csv"][0]["delivered_at"] is not None
+    for format in ("csv.gz", "arrow", "parquet"):
+        assert rows[format] == rows["csv"]
+
+def test_incremental_rollups_match_a_rebuild(test_db):
+    """Rollups kept up through a failed send and its successful retry equal the ones rebuilt from the reminders"""
+    from app.services.reminder_service import dispatch_due_reminders
+    from app.sms import DispatchThrottle
+
+    insert_due_reminders(test_db, "rollup", 3)
+    dispatch_due_reminders(
+        test_db, lambda _msg: None, provider=FailingNumbersProvider({"+15550000001"}), throttle=DispatchThrottle()
+    )
+    assert sorted(rollup_counts(test_db).values()) == [1, 2]
+    assert_rollups_match_rebuild(test_db)
+
+    test_db.reminders.update_one(
+        {"id": "rollup-reminder-1", "status": "failed"},
+        {"$set": {"scheduled_for": datetime.utcnow() - timedelta(minutes=1)}},
+    )
+    dispatch_due_reminders(test_db, lambda _msg: None, provider=FailingNumbersProvider(), throttle=DispatchThrottle())
+
+    assert test_db.reminders.count_documents({"status": "delivered"}) == 3
+    assert [key[2] for key in rollup_counts(test_db)] == ["delivered"]
+    assert sum(rollup_counts(test_db).values()) == 3
+    assert_rollups_match_rebuild(test_db)
+
+def test_dispatcher_polls_without_change_streams(test_db, monkeypatch):
+    """On a server without change streams the daemon polls, and dispatches a reminder added while it idles"""
+    import threading
+    import time
+    from functools import partial
+
+    from pymongo.errors import OperationFailure
+
+    from app.services import daemon_service
+    from app.sms import DispatchThrottle
+
+    def standalone(*_args, **_kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+    test_db.dispatch_members.delete_many({})
+    monkeypatch.setattr(type(test_db.reminders), "watch", standalone)
+    monkeypatch.setattr(
+        daemon_service,
+        "dispatch_due_reminders",
+        partial(daemon_service.dispatch_due_reminders, provider=FailingNumbersProvider(), throttle=DispatchThrottle()),
+    )
+    stop = threading.Event()
+    messages = []
+    daemon = threading.Thread(
+        target=daemon_service.serve_dispatcher,
+        args=(test_db, messages.append),
+        kwargs={"poll_interval_seconds": 0.05, "stop_event": stop},
+    )
+    daemon.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not messages and time.monotonic() < deadline:
+            time.sleep(0.01)
+        insert_due_reminders(test_db, "poll", 1)
+        while test_db.reminders.find_one({"id": "poll-reminder-0", "status": "delivered"}) is None:
+            assert time.monotonic() < deadline, "reminder was not dispatched while polling"
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        daemon.join(5)
+
+    assert not daemon.is_alive()
+    assert messages[0] == "🛰️  Dispatcher running (polling every 0.05s, 1 workers)"
+    assert messages[-1] == "🛑 Dispatcher stopped"
+    assert test_db.dispatch_members.count_documents({}) == 0
+
+def test_expired_dispatch_lease_is_reaped(test_db):
+    """A reminder claimed by a worker that died goes back to the queue as it was"""
+    from app.services.reminder_service import _Claim, reap_expired_leases
+
+    dispatched_at = datetime.utcnow() - timedelta(days=1)
+    test_db.reminders.insert_one({
+        "id": "lease-test",
+        "appointment_id": "lease-appointment",
+        "offset_days": 2,
+        "scheduled_for": datetime.utcnow() - timedelta(minutes=1),
+        "status": "failed",
+        "attempts": 1,
+        "dispatched_at": dispatched_at,
+    })
+
+    claim = _Claim(timedelta(seconds=300))
+    assert claim.acquire(test_db, ["lease-test"]) == {"lease-test"}
+    assert reap_expired_leases(test_db, timedelta(seconds=300)) == 0
+
+    test_db.reminders.update_one({"id": "lease-test"}, {"$set": {"lease_expires_at": datetime.utcnow()}})
+    assert reap_expired_leases(test_db, timedelta(seconds=300)) == 1
+
+    reminder = test_db.reminders.find_one({"id": "lease-test"})
+    assert reminder["status"] == "failed"
+    assert reminder["attempts"] == 2
+    assert abs(reminder["dispatched_at"] - dispatched_at) < timedelta(milliseconds=1)
+    assert "claim_token" not in reminder
+    assert not claim.ack(test_db, "lease-test", {"status": "delivered"})
+
+def test_unrenderable_reminder_is_dead_lettered(test_db, monkeypatch):
+    """A claimed reminder whose message does not render is dead-lettered, not left claimed"""
+    from app.services import reminder_service
+    from app.sms import DispatchThrottle, SimulatedProvider
+
+    def broken_render(*_args):
+        raise ValueError("bad template")
+
+    monkeypatch.setattr(reminder_service, "_render_message", broken_render)
+    insert_due_reminders(test_db, "render", 1)
+
+    reminder_service.dispatch_due_reminders(
+        test_db, lambda _msg: None, provider=SimulatedProvider(failure_rate=0), throttle=DispatchThrottle()
+    )
+
+    reminder = test_db.reminders.find_one({"id": "render-reminder-0"})
+    assert reminder["status"] == "dead"
+    assert "claim_token" not in reminder
+    assert test_db.dead_letters.count_documents({"reminder_id": "render-reminder-0"}) == 1
+
+def test_dead_letter_is_dropped_when_the_lease_was_lost(test_db, monkeypatch):
+    """A worker that lost its lease before marking a reminder dead leaves no dead letter behind"""
+    from app.services import reminder_service
+    from app.sms import DispatchThrottle, SimulatedProvider
+
+    def broken_render(*_args):
+        raise ValueError("bad template")
+
+    monkeypatch.setattr(reminder_service, "_render_message", broken_render)
+    monkeypatch.setattr(reminder_service._Claim, "ack", lambda self, db, reminder_id, fields: False)
+    insert_due_reminders(test_db, "lost", 1)
+
+    reminder_service.dispatch_due_reminders(
+        test_db, lambda _msg: None, provider=SimulatedProvider(failure_rate=0), throttle=DispatchThrottle()
+    )
+
+    assert test_db.dead_letters.count_documents({}) == 0
+
+def test_replaying_dead_letters_requeues_only_dead_reminders(test_db):
+    """Replay re-queues dead reminders and leaves letters of reminders that are no longer dead alone"""
+    from app.services.dead_letter_service import replay_dead_letters
+
+    insert_due_reminders(test_db, "replay", 2)
+    test_db.reminders.update_one({"id": "replay-reminder-0"}, {"$set": {"status": "dead", "attempts": 5, "dead_at": datetime.utcnow()}})
+    test_db.reminders.update_one({"id": "replay-reminder-1"}, {"$set": {"status": "delivered", "attempts": 1}})
+    for i in range(2):
+        test_db.dead_letters.insert_one({"id": f"letter-{i}", "reminder_id": f"replay-reminder-{i}", "appointment_id": f"replay-{i}", "replayed_at": None})
+
+    messages = []
+    replay_dead_letters(test_db, messages.append, replay_all=True)
+
+    assert messages[-1] == "🔁 Replayed 1 dead letters, skipped 1"
+    reminder = test_db.reminders.find_one({"id": "replay-reminder-0"})
+    assert (reminder["status"], reminder["attempts"], "dead_at" in reminder) == ("failed", 0, False)
+    assert test_db.dead_letters.find_one({"id": "letter-0"})["replayed_at"] is not None
+    assert test_db.dead_letters.find_one({"id": "letter-1"})["replayed_at"] is None
+    assert test_db.events.count_documents({"type": "reminder_replayed", "entity_id": "replay-reminder-0"}) == 1
+
+def test_history_pages_through_events_sharing_a_seq(test_db):
+    """Events with equal seq (two writers in the same microsecond) are each shown once"""
+    from app.services.history_service import show_appointment_history
+
+    test_db.patients.insert_one({"id": "history-patient", "full_name": "History Test", "phone_e164": "+15552223333"})
+    test_db.appointments.insert_one({
+        "id": "history-appointment",
+        "patient_id": "history-patient",
+        "start_at": datetime(2025, 1, 1),
+        "provider": "Dr. History",
+        "location": "Test Clinic",
+        "status": "scheduled",
+    })
+    test_db.events.insert_many([
+        {
+            "id": f"history-event-{i}",
+            "seq": 1000 + i // 2,
+            "occurred_at": datetime(2025, 1, 1),
+            "type": "error",
+            "appointment_id": "history-appointment",
+            "payload": {"error": f"event {i}"},
+        }
+        for i in range(5)
+    ])
+
+    seen = []
+    after = None
+    while True:
+        lines = []
+        show_appointment_history(test_db, "history-appointment", lines.append, limit=1, after=after)
+        seen.extend(line.split("Error: ")[1] for line in lines if "Error: " in line)
+        cursors = [line.split("--after ")[1] for line in lines if "--after " in line]
+        if not cursors:
+            break
+        after = cursors[0]
+
+    assert seen == [f"event {i}" for i in range(5)]
+
+    lines = []
+    show_appointment_history(test_db, "history-appointment", lines.append, after="1000")
+    assert lines == ["❌ Invalid cursor '1000'. Pass the SEQ:ID printed after the previous page"]
+
+def test_list_appointments_pages_by_id(test_db):
+    """Walking appointments with --after visits each one once"""
+    from app.services.appointment_service import list_appointments
+
+    test_db.patients.insert_one({"id": "page-patient", "full_name": "Page Test", "phone_e164": "+15553334444"})
+    test_db.appointments.insert_many([
+        {
+            "id": f"page-{i:02d}",
+            "patient_id": "page-patient",
+            "start_at": datetime(2025, 1, 1) + timedelta(days=i),
+            "provider": "Dr. Page",
+            "location": "Test Clinic",
+            "status": "scheduled",
+        }
+        for i in range(5)
+    ])
+
+    seen = []
+    after = None
+    while True:
+        lines = []
+        list_appointments(test_db, lines.append, limit=2, after=after, format="jsonl")
+        if not lines:
+            break
+        seen.extend(json.loads(line) for line in lines)
+        after = seen[-1]["id"]
+
+    assert [appointment["id"] for appointment in seen] == [f"page-{i:02d}" for i in range(5)]
+    assert all(appointment["patient_name"] == "Page Test" for appointment in seen)
+
+def test_import_appointments_writes_rejects(test_db, tmp_path):
+    """Valid rows are imported; the rest land in the reject file with their error"""
+    from app.services.import_service import import_appointments
+
+    test_db.patients.insert_one({"id": "import-patient", "full_name": "Import Test", "phone_e164": "+15557778888"})
+    source = tmp_path / "appointments.csv"
+    source.write_text(
+        "patient_id,start_at,provider,location\n"
+        "import-patient,2025-02-20T15:00:00Z,Dr. Import,Test Clinic\n"
+        "missing-patient,2025-02-20T15:00:00Z,Dr. Import,Test Clinic\n"
+        "import-patient,not-a-date,Dr. Import,Test Clinic\n"
+    )
+
+    import_appointments(test_db, str(source), lambda _msg: None)
+
+    assert test_db.appointments.count_documents({"patient_id": "import-patient"}) == 1
+    with open(tmp_path / "appointments.rejects.csv", newline="") as rejects:
+        rows = list(csv.DictReader(rejects))
+    assert [row["row"] for row in rows] == ["2", "3"]
+    assert rows[0]["error"] == "Patient missing-patient not found"
+
+    # Importing the fixed file leaves no stale rejects behind.
+    source.write_text(
+        "patient_id,start_at,provider,location\n"
+        "import-patient,2025-02-21T15:00:00Z,Dr. Import,Test Clinic\n"
+    )
+    import_appointments(test_db, str(source), lambda _msg: None)
+    assert not (tmp_path / "appointments.rejects.csv").exists()
+
+def test_cancel_and_reschedule_update_pending_reminders(test_db, tmp_path):
+    """A cancel reply cancels pending reminders; a reschedule re-times them"""
+    from app.services.appointment_service import reschedule_appointment
+    from app.services.reply_service import process_replies
+
+    start_at = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0) + timedelta(days=10)
+    for i in range(2):
+        test_db.patients.insert_one({"id": f"move-patient-{i}", "full_name": "Move Test", "phone_e164": f"+1555666000{i}"})
+        test_db.appointments.insert_one({
+            "id": f"move-{i}",
+            "patient_id": f"move-patient-{i}",
+            "start_at": start_at,
+            "provider": "Dr. Move",
+            "location": "Test Clinic",
+            "status": "scheduled",
+            "version": 1,
+        })
+        test_db.reminders.insert_one({
+            "id": f"move-reminder-{i}",
+            "appointment_id": f"move-{i}",
+            "offset_days": 2,
+            "scheduled_for": start_at - timedelta(days=2),
+            "status": "scheduled",
+            "attempts": 0,
+        })
+    replies = tmp_path / "replies.csv"
+    replies.write_text(
+        "from,to,message,received_at\n"
+        f"+15556660000,+15551234567,No I cannot make it,{datetime.utcnow().isoformat()}\n"
+    )
+
+    process_replies(test_db, str(replies), True, lambda _msg: None)
+    reschedule_appointment(test_db, "move-1", (start_at + timedelta(days=5)).isoformat(), lambda _msg: None)
+
+    canceled = test_db.reminders.find_one({"id": "move-reminder-0"})
+    assert (canceled["status"], canceled["cancel_reason"]) == ("canceled", "appointment_canceled")
+    moved = test_db.reminders.find_one({"id": "move-reminder-1"})
+    assert moved["status"] == "scheduled"
+    assert moved["scheduled_for"] - start_at == timedelta(days=3)
+    assert test_db.appointments.find_one({"id": "move-1"})["version"] == 2
+
+def test_cancel_and_reschedule_retract_rollup_outcomes(test_db):
+    """Canceling a failed reminder or re-arming a delivered one takes its outcome out of the rollups"""
+    from app.services.appointment_service import reschedule_appointment
+    from app.services.reminder_service import cancel_pending_reminders, dispatch_due_reminders
+    from app.sms import DispatchThrottle
+
+    insert_due_reminders(test_db, "retract", 2)
+    dispatch_due_reminders(
+        test_db, lambda _msg: None, provider=FailingNumbersProvider({"+15550000000"}), throttle=DispatchThrottle()
+    )
+    assert sorted(key[2] for key in rollup_counts(test_db)) == ["delivered", "failed"]
+
+    assert cancel_pending_reminders(test_db, ["retract-0"], "appointment_canceled") == 1
+    reschedule_appointment(test_db, "retract-1", (datetime.utcnow() + timedelta(days=10)).isoformat(), lambda _msg: None)
+
+    assert test_db.reminders.find_one({"id": "retract-reminder-1"})["status"] == "scheduled"
+    assert rollup_counts(test_db) == {}
+    assert_rollups_match_rebuild(test_db)
+
+def test_failed_report_export_removes_the_partial_file(test_db, tmp_path, monkeypatch):
+    """A write error mid-export is reported and leaves no truncated file behind"""
+    from app.services import report_service
+
+    def full_disk(_writer, _row):
+        raise OSError("No space left on device")
+
+    insert_due_reminders(test_db, "partial", 2)
+    monkeypatch.setattr(report_service._CsvReportWriter, "write", full_disk)
+    output = tmp_path / "report.csv"
+    messages = []
+    report_service.generate_reminders_report(test_db, "2000-01-01", "2099-12-31", str(output), messages.append)
+
+    assert messages[-1] == "❌ Error exporting report: No space left on device"
+    assert not output.exists()
+    assert list(tmp_path.iterdir()) == []
+
+def test_report_interrupted_by_the_database_keeps_the_previous_file(test_db, tmp_path, monkeypatch):
+    """A cursor error mid-export leaves the earlier report in place and no temp file"""
+    from pymongo.errors import PyMongoError
+
+    from app.services import report_service
+
+    insert_due_reminders(test_db, "interrupted", 2)
+    output = tmp_path / "report.csv"
+    output.write_text("previous report\n")
+    collection = type(test_db.reminders)
+    aggregate = collection.aggregate
+
+    def lost_connection(self, pipeline, **kwargs):
+        yield from list(aggregate(self, pipeline, **kwargs))[:1]
+        raise PyMongoError("connection closed")
+
+    monkeypatch.setattr(collection, "aggregate", lost_connection)
+    with pytest.raises(PyMongoError):
+        report_service.generate_reminders_report(test_db, "2000-01-01", "2099-12-31", str(output), print)
+
+    assert output.read_text() == "previous report\n"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["report.csv"]
+
+def test_reply_losing_a_race_changes_nothing(test_db, tmp_path, monkeypatch):
+    """A status change another writer beat is not counted, recorded or acted on"""
+    from app.services import reply_service
+
+    replies = tmp_path / "replies.csv"
+    write_confirmations(test_db, replies, 2)
+    replies.write_text(replies.read_text().replace("Yes I will be there", "No I cannot make it"))
+    test_db.reminders.insert_one({
+        "id": "race-reminder",
+        "appointment_id": "reply-0-1",
+        "offset_days": 2,
+        "scheduled_for": datetime.utcnow() + timedelta(days=1),
+        "status": "scheduled",
+        "attempts": 0,
+    })
+    classify_batch = reply_service.classify_batch
+
+    def reschedule_first_patient(messages):
+        # Another writer moves the appointment after the reply has read it.
+        test_db.appointments.update_one({"id": "reply-0-1"}, {"$inc": {"version": 1}})
+        return classify_batch(messages)
+
+    monkeypatch.setattr(reply_service, "classify_batch", reschedule_first_patient)
+    messages = []
+    reply_service.process_replies(test_db, str(replies), True, messages.append)
+
+    assert "2 processed, 1 status changes" in messages[-1]
+    assert [event["appointment_id"] for event in test_db.events.find({"type": "status_changed"})] == ["reply-1-1"]
+    assert test_db.appointments.find_one({"id": "reply-0-1"})["status"] == "scheduled"
+    assert test_db.reminders.find_one({"id": "race-reminder"})["status"] == "scheduled"
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
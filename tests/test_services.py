@@ -0,0 +1,278 @@
+import threading
+from datetime import datetime, time
+
+import pytest
+from pydantic import ValidationError
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.models.models import Reminder
+from app.services.daemon_service import _start_change_watcher
+from app.services.event_service import EventSink
+from app.services.partition_service import assign_partitions
+from app.services import template_service
+from app.sms.base import SmsMessage
+from app.sms.http_provider import HttpProvider
+from app.sms.stub_server import StubProviderServer
+from app.utils.rate_limit import KeyedTokenBuckets, TokenBucket
+from app.utils.retry import RetryPolicy
+from app.utils.timezones import SendWindow, to_local, to_utc
+from app.utils.classification import classify_batch, classify_reply_intent
+
+
+class _FakeCollection:
+    def __init__(self, *documents):
+        self.documents = [dict(document) for document in documents]
+        self.batches = []
+        self.projections = []
+
+    def find_one(self, query, projection=None):
+        self.projections.append(projection)
+        for document in self.documents:
+            if all(document.get(key) == value for key, value in query.items()):
+                return dict(document)
+        return None
+
+    def insert_many(self, documents, ordered=True):
+        self.batches.append(list(documents))
+
+
+class _FakeDb:
+    def __init__(self, **collections):
+        for name, collection in collections.items():
+            setattr(self, name, collection)
+
+    def __getattr__(self, name):
+        collection = _FakeCollection()
+        setattr(self, name, collection)
+        return collection
+
+
+def test_template_renderer_is_cached_until_updated_at_changes():
+    template_service.invalidate_template_cache()
+    templates = _FakeCollection({"id": "t1", "name": "greeting", "body": "Hi {{ patient.first_name }}", "updated_at": datetime(2025, 1, 1)})
+    db = _FakeDb(templates=templates)
+
+    def body_reads():
+        return sum(1 for projection in templates.projections if projection and "body" in projection)
+
+    first = template_service.get_template_renderer(db, "greeting")
+    assert template_service.get_template_renderer(db, "greeting") is first
+    assert body_reads() == 1
+    assert first.variables == {"patient"}
+
+    templates.documents[0].update(body="Bye {{ patient.first_name }}", updated_at=datetime(2025, 1, 2))
+    second = template_service.get_template_renderer(db, "greeting")
+    assert second is not first
+    assert body_reads() == 2
+    assert second.render({"patient": {"first_name": "Ada"}}) == "Bye Ada"
+    assert template_service.get_template_renderer(db, "missing") is None
+
+
+def test_legacy_placeholders_are_rewritten_as_jinja():
+    body = "Hi {patient.first_name}, see {appointment.provider} at {{ appointment.location }}"
+    assert template_service.to_jinja_source(body) == (
+        "Hi {{ patient.first_name }}, see {{ appointment.provider }} at {{ appointment.location }}"
+    )
+    assert template_service.to_jinja_source("Call {patient.phone}") == "Call {patient.phone}"
+    assert template_service.validate_template_body(body) is None
+    assert template_service.validate_template_body("Call {patient.phone}") == (
+        "Unknown template placeholders: {patient.phone}"
+    )
+    assert template_service.validate_template_body("Hi {{ doctor.name }}") == "Unknown template variables: doctor"
+
+
+@pytest.mark.parametrize(
+    "message, intent",
+    [
+        ("Yes I will be there", "confirmed"),
+        ("No I cannot make it", "cancel"),
+        ("Need to reschedule", "reschedule"),
+        ("OK, see you then!", "confirmed"),
+        ("Can’t make it, sorry", "cancel"),
+        ("yes no", "unknown"),
+        ("", "unknown"),
+    ],
+)
+def test_classify_reply_intent(message, intent):
+    assert classify_reply_intent(message) == intent
+
+
+def test_classify_matches_whole_words_only():
+    """Phrases must not match inside longer words"""
+    assert classify_reply_intent("I know") == "unknown"  # "no" in "know"
+    assert classify_reply_intent("Will do") == "unknown"  # "ill" in "will"
+    assert classify_reply_intent("Tokens") == "unknown"  # "ok" in "tokens"
+
+
+def test_classify_batch_preserves_order():
+    messages = ["Yes", "Stop", "Please move it", "hello"]
+    assert classify_batch(messages) == ["confirmed", "cancel", "reschedule", "unknown"]
+
+
+def test_event_sink_sync_writes_immediately():
+    db = _FakeDb()
+    sink = EventSink(db, synchronous=True)
+    sink.emit_many([{"id": "1"}, {"id": "2"}])
+    assert db.events.batches == [[{"id": "1"}, {"id": "2"}]]
+
+
+def test_event_sink_async_batches_and_flushes_on_close():
+    db = _FakeDb()
+    sink = EventSink(db, batch_size=3, flush_interval=60)
+    for i in range(4):
+        sink.emit({"id": str(i)})
+    sink.close()
+    written = [event["id"] for batch in db.events.batches for event in batch]
+    assert written == ["0", "1", "2", "3"]
+    assert len(db.events.batches) <= 2
+
+
+def test_token_bucket_reserves_in_arrival_order():
+    now = [0.0]
+    bucket = TokenBucket(rate=10, capacity=2, clock=lambda: now[0])
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1)
+    assert bucket.reserve(2) == pytest.approx(0.3)
+    assert not bucket.try_acquire()
+    now[0] = 1.0
+    assert bucket.try_acquire(2)
+
+
+def test_http_provider_batches_against_stub_server():
+    server = StubProviderServer(("127.0.0.1", 0), latency=0, failure_rate=0, max_batch_size=2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    provider = HttpProvider(server.url, max_batch_size=2)
+    try:
+        messages = [SmsMessage(f"+1555000000{i}", "Hi", f"r{i}") for i in range(5)]
+        results = provider.send_batch(messages)
+    finally:
+        provider.close()
+        server.shutdown()
+        server.server_close()
+
+    assert [result.reference for result in results] == ["r0", "r1", "r2", "r3", "r4"]
+    assert all(result.success and result.provider_message_id for result in results)
+    assert server.counters["requests"] == 3
+
+
+def test_keyed_token_buckets_throttle_each_key_separately():
+    buckets = KeyedTokenBuckets(rate=1 / 60, capacity=1)
+    assert buckets.try_acquire("+15550000001") == 0
+    assert buckets.try_acquire("+15550000001") == pytest.approx(60, rel=0.01)
+    assert buckets.try_acquire("+15550000002") == 0
+
+
+def test_retry_policy_backs_off_exponentially_up_to_the_cap():
+    policy = RetryPolicy(max_attempts=4, base_delay=10, max_delay=60)
+    for attempts, ceiling in [(1, 10), (2, 20), (3, 40), (6, 60)]:
+        delays = [policy.delay(attempts) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling / 2
+    assert not policy.exhausted(3)
+    assert policy.exhausted(4)
+
+
+def test_assign_partitions_is_disjoint_and_moves_only_a_leavers_partitions():
+    members = ["node-a", "node-b", "node-c", "node-d"]
+    owned = assign_partitions(members, 64)
+    assert sorted(p for partitions in owned.values() for p in partitions) == list(range(64))
+    assert all(partitions for partitions in owned.values())
+
+    remaining = assign_partitions(members[:3], 64)
+    for member in members[:3]:
+        assert set(owned[member]) <= set(remaining[member])
+
+
+class _FakeChangeStream:
+    def __init__(self, *changes):
+        self.changes = list(changes)
+        self.closed = False
+
+    def try_next(self):
+        change = self.changes.pop(0) if self.changes else None
+        if isinstance(change, Exception):
+            raise change
+        return change
+
+    def close(self):
+        self.closed = True
+
+
+class _WatchedCollection:
+    def __init__(self, *streams):
+        self.streams = list(streams)
+
+    def watch(self, pipeline, max_await_time_ms=None):
+        if not self.streams:
+            raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+        return self.streams.pop(0)
+
+
+def test_change_watcher_is_not_started_without_change_streams():
+    wake, stop = threading.Event(), threading.Event()
+    assert _start_change_watcher(_FakeDb(reminders=_WatchedCollection()), wake, stop, print) is None
+    assert not wake.is_set()
+
+
+def test_change_watcher_wakes_the_dispatcher_when_its_stream_is_interrupted():
+    interrupted = _FakeChangeStream(None, PyMongoError("connection reset"))
+    wake, stop = threading.Event(), threading.Event()
+    messages = []
+    watcher = _start_change_watcher(_FakeDb(reminders=_WatchedCollection(interrupted)), wake, stop, messages.append)
+
+    assert wake.wait(5)
+    stop.set()
+    watcher.join(5)
+    assert not watcher.is_alive()
+    assert interrupted.closed
+    assert messages == ["  ⚠️  Change stream interrupted: connection reset"]
+
+
+def test_local_time_conversions_follow_dst_changes():
+    # New York springs forward on 2025-03-09 at 02:00 local (07:00 UTC).
+    assert to_local(datetime(2025, 3, 9, 6, 30), "America/New_York") == datetime(2025, 3, 9, 1, 30)
+    assert to_local(datetime(2025, 3, 9, 7, 30), "America/New_York") == datetime(2025, 3, 9, 3, 30)
+    assert to_utc(datetime(2025, 3, 10, 9, 0), "America/New_York") == datetime(2025, 3, 10, 13, 0)
+    assert to_utc(datetime(2025, 3, 8, 9, 0), "America/New_York") == datetime(2025, 3, 8, 14, 0)
+    assert to_local(datetime(2025, 1, 1, 12, 0), None) == datetime(2025, 1, 1, 12, 0)
+
+
+def test_send_window_moves_sends_out_of_quiet_hours():
+    window = SendWindow(start=time(9), end=time(20))
+    assert window.send_time(datetime(2025, 1, 1, 3, 0), "a:1") == datetime(2025, 1, 1, 9, 0)
+    assert window.send_time(datetime(2025, 1, 1, 14, 0), "a:1") == datetime(2025, 1, 1, 14, 0)
+    assert window.send_time(datetime(2025, 1, 1, 23, 0), "a:1") == datetime(2025, 1, 1, 19, 59)
+    assert window.next_open(datetime(2025, 1, 1, 14, 0), "a:1") is None
+    assert window.next_open(datetime(2025, 1, 1, 21, 0), "a:1") == datetime(2025, 1, 2, 9, 0)
+    # Never moved to or past the appointment: the evening before instead.
+    assert window.send_time(datetime(2025, 1, 2, 7, 0), "a:0", deadline=datetime(2025, 1, 2, 8, 0)) == datetime(2025, 1, 1, 19, 59)
+    assert window.send_time(datetime(2025, 1, 2, 7, 0), "a:0", deadline=datetime(2025, 1, 2, 9, 30)) == datetime(2025, 1, 2, 9, 0)
+    assert SendWindow().unrestricted
+
+    spread = SendWindow(start=time(9), end=time(20), spread=True)
+    times = {spread.send_time(datetime(2025, 1, 1, 3, 0), f"a{i}:1") for i in range(100)}
+    assert len(times) > 90
+    assert all(time(9) <= moment.time() < time(20) for moment in times)
+
+
+def test_reminder_model_round_trips_stored_documents():
+    scheduled_for = datetime(2025, 3, 1, 9)
+    doc = {"_id": "oid", "id": "r1", "appointment_id": "a1", "offset_days": 2, "scheduled_for": scheduled_for}
+
+    reminder = Reminder.from_doc(doc)
+    assert not hasattr(reminder, "__dict__")
+    assert (reminder.status, reminder.attempts) == ("scheduled", 0)
+    assert reminder.to_doc() == {
+        "id": "r1",
+        "appointment_id": "a1",
+        "offset_days": 2,
+        "scheduled_for": scheduled_for,
+        "status": "scheduled",
+        "attempts": 0,
+    }
+    assert Reminder.validate({"id": "r1", "offset_days": "2"}).offset_days == 2
+    with pytest.raises(ValidationError):
+        Reminder.validate({"id": "r1", "offset_days": "soon"})
+    with pytest.raises(ValueError):
+        Reminder.projection("id", "phone_e164")
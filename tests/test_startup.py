@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+CHECK_STARTUP = os.path.join(os.path.dirname(__file__), "..", "scripts", "check_startup.py")
+
+# Modules the CLI must not import before a command runs; see app/cli/main.py.
+HEAVY_MODULES = ("pymongo", "bson", "jinja2", "pendulum", "httpx", "pyarrow", "app.services", "app.db", "app.sms")
+
+
+def test_cli_import_loads_no_services_or_drivers():
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, app.cli.main; print('\\n'.join(sys.modules))"],
+        cwd=os.path.join(os.path.dirname(__file__), ".."),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = [
+        module
+        for module in result.stdout.splitlines()
+        if any(module == heavy or module.startswith(heavy + ".") for heavy in HEAVY_MODULES)
+    ]
+    assert loaded == []
+
+
+def test_help_starts_within_import_budget():
+    result = subprocess.run(
+        [sys.executable, CHECK_STARTUP, "400"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+def test_report_command_imports_only_the_selected_report():
+    script = (
+        "import sys\n"
+        "from typer.testing import CliRunner\n"
+        "from app.cli.main import app\n"
+        "result = CliRunner().invoke(app, ['report', 'stats', '--from', '2025-01-01', '--to', '2025-01-31', '--by', 'patient'])\n"
+        "print(result.exit_code)\n"
+        "print('\\n'.join(sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=os.path.join(os.path.dirname(__file__), ".."),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    exit_code, *modules = result.stdout.splitlines()
+    assert exit_code == "1"
+    assert "app.services.stats_service" in modules
+    assert "app.services.report_service" not in modules